@@ -1,4 +1,5 @@
 import { spawn, ChildProcess } from 'child_process';
+import http from 'http';
 import path from 'path';
 import fs from 'fs/promises';
 // import { v4 as uuidv4 } from 'uuid';
@@ -11,6 +12,10 @@ function uuidv4(): string {
   });
 }
 
+// 常驻回测服务地址 (api/scripts/backtest_worker_service.py，例如 http://127.0.0.1:8765)
+// 未配置时每个请求启动一次 backtest_api.py
+const WORKER_URL = process.env.BACKTEST_WORKER_URL;
+
 export interface BacktestConfig {
   symbol: string;
   startDate?: string;
@@ -51,6 +56,41 @@ export interface BacktestResult {
   equityHistory: Array<[number, number]>;
 }
 
+// 回测主循环输出的进度事件 (services/backtest-engine/progress.py)
+export interface BacktestProgressEvent {
+  type: 'backtest_progress';
+  event: 'start' | 'progress' | 'done';
+  bars_done: number;
+  total_bars: number;
+  percent: number;
+  elapsed_seconds: number;
+  bars_per_sec: number;
+  eta_seconds: number | null;
+  equity?: number;
+  long_position?: number;
+  short_position?: number;
+  trades?: number;
+  status?: string;
+}
+
+function parseProgressEvent(line: string): BacktestProgressEvent | null {
+  const text = line.trim();
+  if (!text.startsWith('{') || !text.includes('"backtest_progress"')) return null;
+  try {
+    const event = JSON.parse(text);
+    return event.type === 'backtest_progress' ? event : null;
+  } catch {
+    return null;
+  }
+}
+
+function formatProgressEvent(event: BacktestProgressEvent): string {
+  let message = `回测进行中... ${event.percent.toFixed(1)}% (${event.bars_done}/${event.total_bars} 根K线`;
+  if (event.trades !== undefined) message += `，${event.trades} 笔成交`;
+  if (event.eta_seconds !== null) message += `，预计还剩 ${Math.round(event.eta_seconds)} 秒`;
+  return message + ')';
+}
+
 export interface BacktestStatus {
   id: string;
   status: 'queued' | 'running' | 'completed' | 'failed';
@@ -64,6 +104,9 @@ export class BacktestService {
   private static instance: BacktestService;
   private runningBacktests = new Map<string, BacktestStatus>();
   private processes = new Map<string, ChildProcess>();
+  private workerStreams = new Map<string, http.ClientRequest>();
+  // 已被用户取消的回测：取消状态优先，之后的失败/完成不再覆盖
+  private cancelledBacktests = new Set<string>();
 
   static getInstance(): BacktestService {
     if (!BacktestService.instance) {
@@ -106,23 +149,35 @@ export class BacktestService {
         message: '正在准备回测环境...'
       });
 
-      // 创建临时配置文件
-      const configPath = await this.createTempConfig(backtestId, config);
-      
-      // 更新状态
-      this.updateStatus(backtestId, {
-        status: 'running',
-        progress: 0.2,
-        message: '正在启动Python回测脚本...'
-      });
+      let result: BacktestResult;
+      if (WORKER_URL) {
+        // 提交到常驻回测服务 (引擎和数据已在内存中)
+        this.updateStatus(backtestId, {
+          status: 'running',
+          progress: 0.2,
+          message: '正在提交到回测服务...'
+        });
+        result = await this.runWorkerBacktest(backtestId, this.buildPythonConfig(config));
+      } else {
+        // 创建临时配置文件
+        const configPath = await this.createTempConfig(backtestId, config);
 
-      // 执行Python脚本
-      const result = await this.runPythonBacktest(backtestId, configPath);
-      
-      // 清理临时文件
-      await this.cleanupTempFiles(configPath);
+        // 更新状态
+        this.updateStatus(backtestId, {
+          status: 'running',
+          progress: 0.2,
+          message: '正在启动Python回测脚本...'
+        });
+
+        // 执行Python脚本
+        result = await this.runPythonBacktest(backtestId, configPath);
+
+        // 清理临时文件
+        await this.cleanupTempFiles(configPath);
+      }
       
       // 更新最终状态
+      if (this.cancelledBacktests.delete(backtestId)) return;
       this.runningBacktests.set(backtestId, {
         id: backtestId,
         status: 'completed',
@@ -132,6 +187,7 @@ export class BacktestService {
       });
 
     } catch (error: any) {
+      if (this.cancelledBacktests.delete(backtestId)) return;
       this.runningBacktests.set(backtestId, {
         id: backtestId,
         status: 'failed',
@@ -142,13 +198,8 @@ export class BacktestService {
     }
   }
 
-  private async createTempConfig(backtestId: string, config: BacktestConfig): Promise<string> {
-    const tempDir = path.join(process.cwd(), 'temp', 'backtest');
-    await fs.mkdir(tempDir, { recursive: true });
-    
-    const configPath = path.join(tempDir, `config_${backtestId}.json`);
-    
-    const pythonConfig = {
+  private buildPythonConfig(config: BacktestConfig) {
+    return {
       BACKTEST_CONFIG: {
         initial_balance: config.initialBalance,
         start_date: config.startDate,
@@ -165,14 +216,105 @@ export class BacktestService {
         max_order_amount: config.maxOrderAmount
       }
     };
+  }
+
+  private async createTempConfig(backtestId: string, config: BacktestConfig): Promise<string> {
+    const tempDir = path.join(process.cwd(), 'temp', 'backtest');
+    await fs.mkdir(tempDir, { recursive: true });
     
-    await fs.writeFile(configPath, JSON.stringify(pythonConfig, null, 2));
+    const configPath = path.join(tempDir, `config_${backtestId}.json`);
+    await fs.writeFile(configPath, JSON.stringify(this.buildPythonConfig(config), null, 2));
     return configPath;
   }
 
+  private async runWorkerBacktest(backtestId: string, pythonConfig: object): Promise<BacktestResult> {
+    const baseUrl = WORKER_URL as string;
+    const submitted = await new Promise<{ id: string }>((resolve, reject) => {
+      const body = JSON.stringify(pythonConfig);
+      const request = http.request(new URL('/backtests', baseUrl), {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) }
+      }, (response) => {
+        let text = '';
+        response.on('data', (chunk) => { text += chunk.toString(); });
+        response.on('end', () => {
+          let payload: { id?: string; error?: string };
+          try {
+            payload = JSON.parse(text);
+          } catch (error) {
+            reject(new Error(`回测服务返回了无效的响应: ${text}`));
+            return;
+          }
+          if (response.statusCode !== 202 || !payload.id) {
+            reject(new Error(payload.error || `回测服务拒绝了请求 (HTTP ${response.statusCode})`));
+            return;
+          }
+          resolve({ id: payload.id });
+        });
+      });
+      request.on('error', (error) => reject(new Error(`连接回测服务失败: ${error.message}`)));
+      request.end(body);
+    });
+
+    // 读取进度事件流 (每行一个 JSON 状态)，直到回测结束
+    return new Promise((resolve, reject) => {
+      const request = http.get(new URL(`/backtests/${submitted.id}/events`, baseUrl), (response) => {
+        let buffer = '';
+        let finished = false;
+        response.on('data', (chunk) => {
+          buffer += chunk.toString();
+          const lines = buffer.split('\n');
+          buffer = lines.pop() ?? '';
+          for (const line of lines) {
+            if (!line.trim()) continue;
+            let event;
+            try {
+              event = JSON.parse(line);
+            } catch (error) {
+              finished = true;
+              this.workerStreams.delete(backtestId);
+              request.destroy();
+              reject(new Error(`回测服务返回了无效的进度事件: ${line}`));
+              return;
+            }
+            if (event.status === 'completed') {
+              finished = true;
+              resolve(event.result);
+            } else if (event.status === 'failed') {
+              finished = true;
+              reject(new Error(event.error || '回测服务执行失败'));
+            } else {
+              this.updateStatus(backtestId, {
+                status: 'running',
+                progress: 0.2 + event.progress * 0.7, // 20%-90%用于回测执行
+                message: event.message
+              });
+            }
+          }
+        });
+        response.on('end', () => {
+          this.workerStreams.delete(backtestId);
+          if (!finished) reject(new Error('回测服务的进度流意外结束'));
+          finished = true;
+        });
+        // 响应开始后被 destroy (用户取消) 时既不触发 'end' 也不触发 'error'，只会触发 'close'
+        response.on('close', () => {
+          this.workerStreams.delete(backtestId);
+          if (!finished) reject(new Error('回测已被用户取消'));
+          finished = true;
+        });
+      });
+      request.on('error', (error) => {
+        this.workerStreams.delete(backtestId);
+        reject(new Error(`读取回测进度失败: ${error.message}`));
+      });
+      this.workerStreams.set(backtestId, request);
+    });
+  }
+
   private async runPythonBacktest(backtestId: string, configPath: string): Promise<BacktestResult> {
     return new Promise((resolve, reject) => {
-      const scriptPath = path.join(process.cwd(), '..', 'backtest_kline_trajectory.py');
+      const scriptPath = path.join(process.cwd(), 'api', 'scripts', 'backtest_api.py');
       
       // 使用Python执行回测脚本
       const pythonProcess = spawn('python', ['-X', 'utf8', scriptPath, '--config', configPath], {
@@ -184,14 +326,25 @@ export class BacktestService {
 
       let stdout = '';
       let stderr = '';
+      let pendingLine = '';
 
       pythonProcess.stdout?.on('data', (data) => {
         stdout += data.toString();
         
-        // 解析进度信息
-        const lines = data.toString().split('\n');
+        // 解析进度信息：主循环的 JSON-lines 进度事件，或初始化/收尾阶段的 "回测进度: N%" 行
+        // (数据块可能在行中间截断，最后一段不完整的行留到下一块)
+        const lines = (pendingLine + data.toString()).split('\n');
+        pendingLine = lines.pop() ?? '';
         for (const line of lines) {
-          if (line.includes('回测进度:')) {
+          const event = parseProgressEvent(line);
+          if (event) {
+            if (event.event === 'done') continue;
+            this.updateStatus(backtestId, {
+              status: 'running',
+              progress: 0.2 + (event.percent / 100) * 0.7, // 20%-90%用于回测执行
+              message: formatProgressEvent(event)
+            });
+          } else if (line.includes('回测进度:')) {
             // 解析进度百分比
             const match = line.match(/(\d+)%/);
             if (match) {
@@ -279,8 +432,23 @@ export class BacktestService {
   }
 
   async stopBacktest(backtestId: string): Promise<boolean> {
+    const stream = this.workerStreams.get(backtestId);
+    if (stream) {
+      // 回测服务中的任务会继续完成 (结果进入缓存)，这里只停止等待
+      this.cancelledBacktests.add(backtestId);
+      stream.destroy();
+      this.workerStreams.delete(backtestId);
+      this.updateStatus(backtestId, {
+        status: 'failed',
+        message: '回测已被用户取消',
+        error: '用户取消'
+      });
+      return true;
+    }
+
     const process = this.processes.get(backtestId);
     if (process) {
+      this.cancelledBacktests.add(backtestId);
       process.kill('SIGTERM');
       this.processes.delete(backtestId);
       
@@ -12,21 +12,13 @@ import argparse
 import asyncio
 from pathlib import Path
 
-# 添加父目录到Python路径，以便导入回测模块
-sys.path.append(str(Path(__file__).parent.parent.parent))
+# 回测引擎目录 (services/backtest-engine) 加入Python路径，以便导入回测模块
+ENGINE_DIR = Path(__file__).resolve().parents[4] / "services" / "backtest-engine"
+if str(ENGINE_DIR) not in sys.path:
+    sys.path.insert(0, str(ENGINE_DIR))
 
-# 导入回测相关模块
-try:
-    # 这里需要导入原始回测脚本的主要函数和类
-    # 由于原始脚本可能需要修改，我们先创建一个简化版本
-    import pandas as pd
-    import numpy as np
-    import h5py
-    from decimal import Decimal
-    from tqdm import tqdm
-except ImportError as e:
-    print(f"导入依赖失败: {e}", file=sys.stderr)
-    sys.exit(1)
+# pandas/h5py/matplotlib 等重量级依赖由回测引擎在加载数据、绘图时按需导入，脚本启动只需要标准库
+from decimal import Decimal
 
 class APIProgressReporter:
     """API进度报告器"""
@@ -78,8 +70,25 @@ def validate_config(config: dict) -> dict:
     
     return config
 
-async def run_backtest_with_config(config: dict) -> dict:
-    """使用配置运行回测"""
+def build_engine_config(backtest_module, backtest_config: dict, strategy_config: dict):
+    """把API配置编译为引擎的不可变配置 (只覆盖引擎认识的策略参数，Decimal 参数按字符串转换)"""
+    backtest_overrides = {
+        "data_file_path": backtest_config['data_file_path'],
+        "start_date": backtest_config.get('start_date'),
+        "end_date": backtest_config.get('end_date'),
+        "initial_balance": backtest_config.get('initial_balance', 10000),
+        "plot_equity_curve": False,  # API模式下不绘图
+    }
+    strategy_overrides = {}
+    for key, value in strategy_config.items():
+        default = backtest_module.STRATEGY_CONFIG.get(key)
+        if default is None:
+            continue
+        strategy_overrides[key] = Decimal(str(value)) if isinstance(default, Decimal) else value
+    return backtest_module.build_backtest_config(strategy=strategy_overrides, backtest=backtest_overrides)
+
+async def run_backtest_with_config(config: dict, use_result_cache: bool = True) -> dict:
+    """使用配置运行回测 (相同配置 + 数据的重复请求直接返回缓存结果)"""
     progress_reporter = APIProgressReporter()
     
     try:
@@ -96,48 +105,22 @@ async def run_backtest_with_config(config: dict) -> dict:
         
         progress_reporter.update(20, 100, "导入回测模块...")
         
-        # 动态导入原始回测脚本
-        original_backtest_path = str(Path(__file__).parent.parent.parent.parent / "backtest_kline_trajectory.py")
-        if not os.path.exists(original_backtest_path):
+        # 导入回测引擎
+        original_backtest_path = ENGINE_DIR / "backtest_kline_trajectory.py"
+        if not original_backtest_path.exists():
             raise FileNotFoundError(f"原始回测脚本不存在: {original_backtest_path}")
-        
-        # 临时修改全局配置
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("backtest_module", original_backtest_path)
-        backtest_module = importlib.util.module_from_spec(spec)
-        
-        # 在导入前设置配置
-        original_backtest_config = {
-            "data_file_path": data_file,
-            "start_date": backtest_config.get('start_date'),
-            "end_date": backtest_config.get('end_date'),
-            "initial_balance": backtest_config.get('initial_balance', 10000),
-            "plot_equity_curve": False,  # API模式下不绘图
-        }
-        
-        original_strategy_config = {
-            "leverage": strategy_config.get('leverage', 10),
-            "bid_spread": strategy_config.get('bid_spread', 0.001),
-            "ask_spread": strategy_config.get('ask_spread', 0.001),
-            "max_position_value_ratio": strategy_config.get('max_position_value_ratio', 0.8),
-            "use_dynamic_order_size": strategy_config.get('use_dynamic_order_size', True),
-            "min_order_amount": strategy_config.get('min_order_amount', 0.001),
-            "max_order_amount": strategy_config.get('max_order_amount', 10.0)
-        }
+        import backtest_kline_trajectory as backtest_module
         
         progress_reporter.update(30, 100, "执行回测...")
         
-        # 执行导入
-        spec.loader.exec_module(backtest_module)
-        
-        # 更新模块中的配置
-        backtest_module.BACKTEST_CONFIG.update(original_backtest_config)
-        backtest_module.STRATEGY_CONFIG.update(original_strategy_config)
+        # 编译本次请求的配置 (不修改引擎的全局配置字典)
+        engine_config = build_engine_config(backtest_module, backtest_config, strategy_config)
         
         progress_reporter.update(50, 100, "运行回测引擎...")
         
         # 调用原始回测函数
-        result = await backtest_module.run_fast_perpetual_backtest_with_progress(progress_reporter)
+        result = await backtest_module.run_fast_perpetual_backtest_with_progress(
+            progress_reporter, config=engine_config, use_result_cache=use_result_cache)
         
         progress_reporter.update(100, 100, "回测完成!")
         return result
@@ -150,6 +133,7 @@ def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='回测API脚本')
     parser.add_argument('--config', required=True, help='配置文件路径')
+    parser.add_argument('--no-result-cache', action='store_true', help='不使用回测结果缓存，强制重新回测')
     args = parser.parse_args()
     
     try:
@@ -158,7 +142,7 @@ def main():
         config = validate_config(config)
         
         # 运行回测
-        result = asyncio.run(run_backtest_with_config(config))
+        result = asyncio.run(run_backtest_with_config(config, use_result_cache=not args.no_result_cache))
         
         # 输出结果（特殊格式供后端解析）
         print("BACKTEST_RESULT_JSON:")
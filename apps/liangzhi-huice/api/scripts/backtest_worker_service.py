@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻回测服务 - 代替每个请求启动一次 backtest_api.py
+
+每次启动 backtest_api.py 都要重新导入 pandas/h5py/引擎模块并重新读取 H5 文件，小时间范围的回测
+大部分时间都花在启动上。这里启动一次本地 HTTP 服务，由固定数量的工作进程常驻执行回测:
+  - 工作进程启动时导入一次引擎，已加载的数据集按 (文件, 起止日期, 文件修改时间) 常驻内存
+  - 回测结果缓存 (result_cache) 在工作进程之间共享，同样的请求直接返回
+  - 进度通过队列汇总到主进程，可以轮询状态或以 JSON-lines 流式读取
+
+接口 (请求体与 backtest_api.py 的 --config 文件格式相同):
+  POST /backtests              提交回测，返回 {"id": ...}
+  POST /backtests/run          同步回测，直接返回结果 JSON
+  GET  /backtests/{id}         回测状态 (status/progress/message/result/error)
+  GET  /backtests/{id}/events  进度事件流 (application/x-ndjson，回测结束后关闭)
+  GET  /health                 服务状态、结果缓存与缓存目录统计
+
+用法:
+  python backtest_worker_service.py --port 8765 --workers 2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from backtest_api import build_engine_config, validate_config  # 同时把引擎目录加入 sys.path
+from cache_manager import get_cache_manager
+from progress import ReporterProgress
+from result_cache import get_result_cache
+
+DEFAULT_PORT = 8765
+MAX_CACHED_DATASETS = 4   # 每个工作进程常驻内存的数据集数量
+MAX_FINISHED_JOBS = 200   # 保留状态的已结束回测数量
+
+# =====================================================================================
+# 工作进程
+# =====================================================================================
+_worker_state = {}
+
+
+class QueueProgressReporter:
+    """把引擎的 progress_reporter.update 调用转发到主进程"""
+
+    def __init__(self, job_id: str, queue):
+        self.job_id = job_id
+        self.queue = queue
+
+    def update(self, current: int, total: int, message: str):
+        self.queue.put((self.job_id, current / total if total > 0 else 0.0, message))
+
+
+def _init_worker(progress_queue):
+    """工作进程初始化：只导入一次回测引擎"""
+    import backtest_kline_trajectory as engine
+
+    _worker_state.update(engine=engine, queue=progress_queue, datasets=OrderedDict())
+
+
+def _load_dataset(config):
+    """按 (文件, 起止日期, 文件修改时间) 复用已加载的数据集 (LRU)，返回 (数据集, 提供数据的阶段)"""
+    backtest = config.backtest
+    data_file = Path(backtest["data_file_path"])
+    key = (str(data_file.resolve()), backtest.get("start_date"), backtest.get("end_date"), data_file.stat().st_mtime)
+    datasets = _worker_state["datasets"]
+    if key in datasets:
+        datasets.move_to_end(key)
+        return datasets[key], "memory"
+    loaded, stage = _worker_state["engine"].load_backtest_data_staged(True, config)
+    if loaded is not None:
+        datasets[key] = loaded
+        while len(datasets) > MAX_CACHED_DATASETS:
+            datasets.popitem(last=False)
+    return loaded, stage
+
+
+def _run_job(job_id: str, api_config: dict, use_result_cache: bool = True) -> dict:
+    engine = _worker_state["engine"]
+    reporter = QueueProgressReporter(job_id, _worker_state["queue"])
+    config = build_engine_config(engine, api_config['BACKTEST_CONFIG'], api_config['STRATEGY_CONFIG'])
+    reporter.update(5, 100, "加载数据...")
+    loaded, stage = _load_dataset(config)
+    if loaded is None:
+        raise ValueError("没有找到指定时间范围内的数据")
+    return asyncio.run(engine.run_fast_perpetual_backtest_with_progress(
+        reporter, config=config, use_result_cache=use_result_cache, loaded=loaded,
+        progress=ReporterProgress(reporter), data_stage=stage))
+
+
+# =====================================================================================
+# 主进程：任务表 + 进程池
+# =====================================================================================
+class JobRegistry:
+    """回测任务状态表 (状态变化时唤醒等待事件流的请求)"""
+
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self.changed = threading.Condition()
+
+    def create(self) -> str:
+        job_id = uuid.uuid4().hex
+        with self.changed:
+            self.jobs[job_id] = {"id": job_id, "status": "queued", "progress": 0.0, "message": "排队中...",
+                                 "submitted_at": time.time(), "version": 0}
+            self._trim()
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in ("completed", "failed"):
+                return
+            job.update(fields)
+            job["version"] += 1
+            self.changed.notify_all()
+
+    def get(self, job_id: str):
+        with self.changed:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float):
+        """等待任务版本号变化，返回最新状态"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.jobs.get(job_id, {}).get("version", version) != version, timeout)
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def counts(self) -> dict:
+        with self.changed:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("completed", "failed")]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+
+
+class BacktestWorkerService:
+    """进程池 + 进度汇总线程 (工作进程异常退出导致进程池损坏时，下一次提交会重建进程池)"""
+
+    def __init__(self, workers: int = 2):
+        self.workers = max(int(workers), 1)
+        self.registry = JobRegistry()
+        self.progress_queue = multiprocessing.Queue()
+        self.pool_lock = threading.Lock()
+        self.pool_restarts = 0
+        self.pool = self._new_pool()
+        threading.Thread(target=self._drain_progress, daemon=True).start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.progress_queue,))
+
+    def _restart_pool(self, broken: ProcessPoolExecutor):
+        """用同样的初始化函数重建进程池 (其它线程已经重建过时不再重复)"""
+        with self.pool_lock:
+            if self.pool is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+            self.pool_restarts += 1
+        print(f"♻️ 工作进程异常退出，已重建进程池 (第 {self.pool_restarts} 次)", flush=True)
+
+    def pool_broken(self) -> bool:
+        return bool(getattr(self.pool, "_broken", False))
+
+    def _drain_progress(self):
+        while True:
+            item = self.progress_queue.get()
+            if item is None:
+                return
+            job_id, progress, message = item
+            self.registry.update(job_id, status="running", progress=progress, message=message)
+
+    def submit(self, api_config: dict, use_result_cache: bool = True) -> str:
+        """提交回测 (配置无效时抛出 KeyError/TypeError/ValueError)；进程池无法恢复时任务直接标记为失败"""
+        api_config = validate_config(api_config)
+        job_id = self.registry.create()
+        try:
+            future = self._submit_to_pool(job_id, api_config, use_result_cache)
+        except Exception as e:
+            self.registry.update(job_id, status="failed", message="回测失败", error=f"无法提交到工作进程: {e}",
+                                 finished_at=time.time())
+            return job_id
+        future.add_done_callback(lambda done: self._finish(job_id, done))
+        return job_id
+
+    def _submit_to_pool(self, job_id: str, api_config: dict, use_result_cache: bool):
+        """进程池已损坏时重建一次再重试"""
+        pool = self.pool
+        try:
+            return pool.submit(_run_job, job_id, api_config, use_result_cache)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+        return self.pool.submit(_run_job, job_id, api_config, use_result_cache)
+
+    def _finish(self, job_id: str, future):
+        error = future.exception()
+        if error is None:
+            self.registry.update(job_id, status="completed", progress=1.0, message="回测完成!",
+                                 result=future.result(), finished_at=time.time())
+        else:
+            self.registry.update(job_id, status="failed", message="回测失败", error=str(error),
+                                 finished_at=time.time())
+
+    def health(self) -> dict:
+        return {"status": "degraded" if self.pool_broken() else "ok", "workers": self.workers,
+                "pool_restarts": self.pool_restarts, "jobs": self.registry.counts(),
+                "result_cache": get_result_cache().stats(), "cache": get_cache_manager().stats()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.progress_queue.put(None)
+
+
+# =====================================================================================
+# HTTP 接口
+# =====================================================================================
+def public_status(job: dict) -> dict:
+    return {key: value for key, value in job.items() if key != "version"}
+
+
+def make_handler(service: BacktestWorkerService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # 只输出回测本身的日志
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            parts = [part for part in self.path.split("?")[0].split("/") if part]
+            if parts == ["health"]:
+                return self._send_json(200, service.health())
+            if len(parts) >= 2 and parts[0] == "backtests":
+                job = service.registry.get(parts[1])
+                if job is None:
+                    return self._send_json(404, {"error": f"回测不存在: {parts[1]}"})
+                if parts[2:] == ["events"]:
+                    return self._stream_events(job)
+                if len(parts) == 2:
+                    return self._send_json(200, public_status(job))
+            self._send_json(404, {"error": "未知接口"})
+
+        def do_POST(self):
+            parts = [part for part in self.path.split("?")[0].split("/") if part]
+            if parts not in (["backtests"], ["backtests", "run"]):
+                return self._send_json(404, {"error": "未知接口"})
+            try:
+                payload = self._read_json()
+            except ValueError as e:
+                return self._send_json(400, {"error": f"请求体不是有效的JSON: {e}"})
+            if not isinstance(payload, dict):
+                return self._send_json(400, {"error": "请求体必须是JSON对象"})
+            use_result_cache = not payload.pop("no_result_cache", False)
+            try:
+                job_id = service.submit(payload, use_result_cache)
+            except (KeyError, TypeError, ValueError) as e:
+                return self._send_json(400, {"error": f"回测配置无效: {e}"})
+            except Exception as e:
+                return self._send_json(500, {"error": f"提交回测失败: {e}"})
+            if parts == ["backtests"]:
+                return self._send_json(202, {"id": job_id})
+            job = service.registry.get(job_id)
+            while job["status"] not in ("completed", "failed"):
+                job = service.registry.wait_for_change(job_id, job["version"], timeout=30)
+            self._send_json(200 if job["status"] == "completed" else 500, public_status(job))
+
+        def _stream_events(self, job: dict):
+            """每次状态变化输出一行 JSON，回测结束后关闭连接"""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            while True:
+                event = public_status(job)
+                if job["status"] not in ("completed", "failed"):
+                    event.pop("result", None)
+                self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                if job["status"] in ("completed", "failed"):
+                    return
+                job = service.registry.wait_for_change(job["id"], job["version"], timeout=30)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻回测服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="回测工作进程数")
+    args = parser.parse_args()
+
+    service = BacktestWorkerService(args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"🚀 回测服务已启动: http://{args.host}:{args.port} ({service.workers} 个工作进程)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+编译后的回测配置 - 每次回测构建一次的不可变对象，显式注入交易所和策略
+
+原来交易所/策略在热路径上直接读取模块级字典 (STRATEGY_CONFIG 等)，并且每个子tick
+重复 num(STRATEGY_CONFIG[...]) 转换；run_backtest_with_params 还要临时改写这些全局字典，
+同一进程内无法安全地并发或交替运行多个参数组合。
+
+BacktestConfig 在构建时:
+  - 复制全部原始参数 (只读映射，之后修改全局字典不会影响已编译的配置)
+  - 把策略/行情/返佣/风控常量一次性转换为当前数值后端的类型
+构建完成后对象被冻结，任何赋值都会抛出 AttributeError。
+"""
+
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from numeric_backend import NumericBackend, get_numeric_backend
+
+
+def _frozen_copy(params: Optional[Mapping]) -> Mapping:
+    return MappingProxyType(dict(params or {}))
+
+
+class BacktestConfig:
+    """一次回测的全部参数 (不可变，数值常量已转换为 num 后端类型)"""
+
+    __slots__ = (
+        "_frozen", "_source_tiers",
+        # 原始参数 (只读映射)
+        "strategy", "market", "atr", "rebate", "risk", "backtest",
+        "num",
+        # 策略
+        "leverage", "leverage_num", "position_size_ratio", "min_order_amount", "max_order_amount",
+        "order_refresh_time", "enable_position_stop_loss", "position_stop_loss",
+        "spread", "atr_threshold", "atr_threshold_float", "hedge_mode",
+        "hedge_side_count", "balance_epsilon", "balance_fraction",
+        # 行情 / 返佣
+        "maker_fee", "taker_fee", "rebate_rate", "use_fee_rebate", "rebate_payout_day", "leverage_tiers",
+        # ATR 波动率自适应
+        "enable_volatility_adaptive", "atr_period", "atr_source", "feature_periods",
+        "high_volatility_threshold", "extreme_volatility_threshold",
+        "high_volatility_pct", "extreme_volatility_pct",
+        "enable_position_balance", "enable_extreme_balance",
+        "enable_dynamic_spread", "base_spread", "max_spread_multiplier", "spread_adjustment_factor",
+        "normal_spread_multiplier",
+        "enable_emergency_close", "emergency_close_pct",
+        # 风控
+        "enable_stop_loss", "max_drawdown", "min_equity",
+        # 回测
+        "initial_balance", "engine_mode",
+        "equity_sampling", "equity_sample_every", "equity_max_memory_points", "equity_spill_dir",
+        "checkpoint_dir", "checkpoint_every", "checkpoint_keep",
+    )
+
+    def __init__(self, strategy: Mapping, market: Mapping, atr: Mapping, rebate: Mapping, risk: Mapping,
+                 backtest: Mapping, leverage_tiers: Iterable[tuple],
+                 numeric_backend: Optional[NumericBackend] = None):
+        set_ = object.__setattr__
+        set_(self, "_frozen", False)
+        if numeric_backend is None:
+            numeric_backend = get_numeric_backend(backtest.get("numeric_backend", "decimal"))
+        num = numeric_backend.num
+
+        self.strategy = _frozen_copy(strategy)
+        self.market = _frozen_copy(market)
+        self.atr = _frozen_copy(atr)
+        self.rebate = _frozen_copy(rebate)
+        self.risk = _frozen_copy(risk)
+        self.backtest = _frozen_copy(backtest)
+        self.num = numeric_backend
+
+        # 策略
+        self.leverage = strategy["leverage"]
+        self.leverage_num = num(strategy["leverage"])
+        self.position_size_ratio = num(strategy["position_size_ratio"])
+        self.min_order_amount = num(strategy["min_order_amount"])
+        self.max_order_amount = num(strategy["max_order_amount"])
+        self.order_refresh_time = strategy["order_refresh_time"]
+        self.enable_position_stop_loss = strategy["enable_position_stop_loss"]
+        self.position_stop_loss = num(strategy["position_stop_loss"])
+        self.spread = num(strategy["spread"])
+        self.atr_threshold = num(strategy["atr_threshold"])
+        self.atr_threshold_float = float(self.atr_threshold)
+        self.hedge_mode = strategy["hedge_mode"]
+        self.hedge_side_count = num(2)         # 对冲开仓同时开多空，保证金按两边计算
+        self.balance_epsilon = num("0.001")   # 仓位平衡判断的最小差额
+        self.balance_fraction = num("0.5")    # 仓位平衡每次调整差额的一半
+
+        # 行情 / 返佣
+        self.maker_fee = num(market["maker_fee"])
+        self.taker_fee = num(market["taker_fee"])
+        self.rebate_rate = num(rebate["rebate_rate"])
+        self.use_fee_rebate = bool(rebate.get("use_fee_rebate", False))
+        self.rebate_payout_day = rebate["rebate_payout_day"]
+        self._source_tiers = tuple(leverage_tiers)
+        self.leverage_tiers = tuple(
+            (num(threshold), max_leverage, num(mm_rate), num(maintenance_amount))
+            for threshold, max_leverage, mm_rate, maintenance_amount in self._source_tiers
+        )
+
+        # ATR 波动率自适应
+        self.enable_volatility_adaptive = atr["enable_volatility_adaptive"]
+        self.atr_period = atr["atr_period"]
+        self.atr_source = atr.get("atr_source", "monitor")
+        self.feature_periods = tuple(atr.get("feature_periods") or ())
+        self.high_volatility_threshold = atr["high_volatility_threshold"]
+        self.extreme_volatility_threshold = atr["extreme_volatility_threshold"]
+        self.high_volatility_pct = atr["high_volatility_threshold"] * 100
+        self.extreme_volatility_pct = atr["extreme_volatility_threshold"] * 100
+        self.enable_position_balance = atr["enable_position_balance"]
+        self.enable_extreme_balance = atr["enable_extreme_balance"]
+        self.enable_dynamic_spread = atr["enable_dynamic_spread"]
+        self.base_spread = num(atr["base_spread"])
+        self.max_spread_multiplier = num(atr["max_spread_multiplier"])
+        self.spread_adjustment_factor = num(atr["spread_adjustment_factor"])
+        self.normal_spread_multiplier = num("1.0")
+        self.enable_emergency_close = atr["enable_emergency_close"]
+        self.emergency_close_pct = atr["emergency_close_threshold"] * 100
+
+        # 风控
+        self.enable_stop_loss = risk["enable_stop_loss"]
+        self.max_drawdown = num(risk["max_drawdown"])
+        self.min_equity = num(risk["min_equity"])
+
+        # 回测
+        self.initial_balance = backtest["initial_balance"]
+        self.engine_mode = backtest.get("engine_mode", "bar")
+        self.equity_sampling = backtest.get("equity_sampling", "every_bar")
+        self.equity_sample_every = backtest.get("equity_sample_every", 60)
+        self.equity_max_memory_points = backtest.get("equity_max_memory_points", 1_000_000)
+        self.equity_spill_dir = backtest.get("equity_spill_dir")
+        self.checkpoint_dir = backtest.get("checkpoint_dir")
+        self.checkpoint_every = backtest.get("checkpoint_every", 0)
+        self.checkpoint_keep = backtest.get("checkpoint_keep", 3)
+
+        set_(self, "_frozen", True)
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"BacktestConfig 是不可变的，不能修改 {name}")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError(f"BacktestConfig 是不可变的，不能删除 {name}")
+
+    @property
+    def numeric_backend_name(self) -> str:
+        return self.num.name
+
+    def replace(self, numeric_backend: Optional[NumericBackend] = None, **overrides) -> "BacktestConfig":
+        """
+        基于当前配置生成新配置 (原配置不变)
+        overrides 的键为 strategy/market/atr/rebate/risk/backtest，值为要覆盖的参数字典
+        """
+        unknown = set(overrides) - {"strategy", "market", "atr", "rebate", "risk", "backtest"}
+        if unknown:
+            raise ValueError(f"未知的配置分组: {', '.join(sorted(unknown))}")
+        groups = {}
+        for group in ("strategy", "market", "atr", "rebate", "risk", "backtest"):
+            merged = dict(getattr(self, group))
+            merged.update(overrides.get(group) or {})
+            groups[group] = merged
+        if numeric_backend is None and "numeric_backend" not in (overrides.get("backtest") or {}):
+            numeric_backend = self.num
+        return BacktestConfig(leverage_tiers=self._source_tiers, numeric_backend=numeric_backend, **groups)
@@ -1,23 +1,66 @@
-import asyncio
-import pandas as pd
+"""
+永续合约做市策略回测引擎
+
+模块顶层只导入 NumPy 和模拟核心需要的模块；pandas (数据加载/绩效分析)、matplotlib (绘图)、
+tqdm (进度条) 在第一次使用时才导入，API 调用和参数扫描的工作进程启动更快。
+"""
+
+import calendar
+from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional
-from tqdm import tqdm
+from typing import TYPE_CHECKING, Dict, List, Optional
 import logging
 import numpy as np
-import matplotlib.pyplot as plt
 import warnings
 import pickle
 import hashlib
 import os
 from pathlib import Path
 
+from numeric_backend import NumericBackend, get_numeric_backend
+from backtest_config import BacktestConfig
+from checkpoint import open_checkpoint_session
+from order_book import OrderBook
+from trade_log import FifoPairStats, TradeLog
+from equity_recorder import EquityRecorder
+from feature_store import TR_SCALE, dataset_fingerprint, feature_periods, fixed_true_ranges, get_feature_store
+from kline_cache import get_kline_cache
+from kline_source import (fingerprint_digest, is_append_of, read_rows, read_time_range, same_content,
+                          source_fingerprint, source_stat)
+from result_cache import ResultCache, get_result_cache, result_cache_key
+from progress import ProgressSink, make_progress_sink
+
+if TYPE_CHECKING:
+    import pandas as pd
+
 BASE_DIR = Path(__file__).resolve().parent
 CACHE_DIR = BASE_DIR / "cache"
 DATA_DIR = BASE_DIR
 EQUITY_OUTPUT_DIR = BASE_DIR
 
-CACHE_DIR.mkdir(exist_ok=True)
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def utc_datetime(timestamp: int) -> datetime:
+    """秒级时间戳 -> UTC 时间 (不带时区，与 pd.to_datetime(timestamp, unit='s') 一致)"""
+    return UNIX_EPOCH + timedelta(seconds=int(timestamp))
+
+
+def utc_timestamp(date_str: str) -> int:
+    """日期字符串 (UTC) -> 秒级时间戳 (与 int(pd.to_datetime(date_str).timestamp()) 一致)"""
+    try:
+        return calendar.timegm(datetime.fromisoformat(str(date_str)).utctimetuple())
+    except ValueError:
+        import pandas as pd  # 非 ISO 格式交给 pandas 解析
+        return int(pd.to_datetime(date_str).timestamp())
+
+
+def add_months(date: datetime, months: int) -> datetime:
+    """加减整月，日期超出目标月天数时取月末 (与 pd.DateOffset(months=...) 一致)"""
+    month_index = date.year * 12 + date.month - 1 + months
+    year, month = divmod(month_index, 12)
+    day = min(date.day, calendar.monthrange(year, month + 1)[1])
+    return date.replace(year=year, month=month + 1, day=day)
 
 # =====================================================================================
 # 🌊 ATR波动率自适应配置 - 方便手动调整
@@ -28,6 +71,8 @@ ATR_CONFIG = {
 
     # 📊 ATR计算参数
     "atr_period": 12 * 60,                # ATR计算周期 (12小时 = 720分钟)
+    "atr_source": "monitor",              # ATR来源: monitor=逐根更新 / feature_store=特征库预计算查表
+    "feature_periods": [],                # 特征库额外预计算的ATR周期 (扫参 atr_period 时使用)
 
     # 🚨 波动率阈值设置
     "high_volatility_threshold": 0.3,     # 高波动率阈值 30% - 启动仓位平衡机制
@@ -61,6 +106,17 @@ BACKTEST_CONFIG = {
     "initial_balance": 1000,      # 🎯 与前端默认值一致
     "plot_equity_curve": True,
     "equity_curve_path": "equity_curve.png",
+    "numeric_backend": "decimal",  # 数值后端: decimal(参考) / float64 / ticks
+    "engine_mode": "bar",          # 引擎模式: bar(逐根K线) / event(跳过静默K线，结果逐位一致)
+    "equity_sampling": "every_bar",       # 权益采样: every_bar / every_n / on_change / daily_ohlc
+    "equity_sample_every": 60,            # every_n 模式的采样间隔 (K线数)
+    "equity_max_memory_points": 1_000_000,  # 内存中最多保留的权益点数，超过后分块落盘
+    "equity_spill_dir": None,             # 落盘目录 (None 使用系统临时目录)
+    "checkpoint_dir": None,               # 状态快照目录 (None 不保存/恢复快照)
+    "checkpoint_every": 500_000,          # 每 N 根K线保存一次快照 (回测结束时总会保存)
+    "checkpoint_keep": 3,                 # 每个配置保留的快照数
+    "progress_mode": "auto",              # 进度输出: auto(终端用进度条，否则 JSON-lines) / tqdm / jsonl / none
+    "progress_interval": 0.5,             # 进度事件最短间隔 (秒)
 }
 
 MARKET_CONFIG = {
@@ -141,76 +197,216 @@ RISK_CONFIG = {
     "max_daily_loss": Decimal("0.10"), # 单日最大亏损10%
 }
 
+def build_backtest_config(numeric_backend: Optional[NumericBackend] = None,
+                          strategy: Optional[Dict] = None, market: Optional[Dict] = None,
+                          atr: Optional[Dict] = None, rebate: Optional[Dict] = None,
+                          risk: Optional[Dict] = None, backtest: Optional[Dict] = None) -> BacktestConfig:
+    """
+    以当前全局配置为默认值、叠加参数覆盖，编译出一份不可变的回测配置
+    (只读取全局字典，不修改它们；编译后的配置与全局字典互不影响)
+    """
+    def merged(defaults: Dict, overrides: Optional[Dict]) -> Dict:
+        params = dict(defaults)
+        params.update(overrides or {})
+        return params
+
+    return BacktestConfig(
+        strategy=merged(STRATEGY_CONFIG, strategy),
+        market=merged(MARKET_CONFIG, market),
+        atr=merged(ATR_CONFIG, atr),
+        rebate=merged(REBATE_CONFIG, rebate),
+        risk=merged(RISK_CONFIG, risk),
+        backtest=merged(BACKTEST_CONFIG, backtest),
+        leverage_tiers=ETH_USDC_TIERS,
+        numeric_backend=numeric_backend,
+    )
+
 
 
 # =====================================================================================
 # 波动率计算工具
 # =====================================================================================
 class VolatilityMonitor:
-    def __init__(self, atr_period: int = 1440):  # 默认24小时
+    """
+    ATR 波动率监控 - 环形缓冲区 + 滑动窗口求和，每根K线 O(1) 更新
+
+    真实波幅按 1/TR_SCALE 的定点整数累加，窗口和是精确整数，
+    因此 update_price 逐根更新与 update_many 批量更新得到逐位相同的 ATR。
+    """
+    TR_SCALE = TR_SCALE         # 真实波幅定点精度 (与特征库共用)
+    ATR_HISTORY_SIZE = 100      # 保留的 ATR 历史长度
+
+    def __init__(self, atr_period: int = 1440,  # 默认24小时
+                 high_volatility_threshold: Optional[float] = None,
+                 extreme_volatility_threshold: Optional[float] = None):
         self.atr_period = atr_period
-        self.price_history = []  # 存储 (timestamp, high, low, close)
-        self.atr_values = []
+        # 波动率等级阈值 (百分比)，未指定时取 ATR_CONFIG
+        if high_volatility_threshold is None:
+            high_volatility_threshold = ATR_CONFIG["high_volatility_threshold"]
+        if extreme_volatility_threshold is None:
+            extreme_volatility_threshold = ATR_CONFIG["extreme_volatility_threshold"]
+        self.high_volatility_threshold = high_volatility_threshold
+        self.extreme_volatility_threshold = extreme_volatility_threshold
+        self._high_pct = high_volatility_threshold * 100
+        self._extreme_pct = extreme_volatility_threshold * 100
+
+        # 真实波幅环形缓冲区 (定点整数)
+        self._tr_ring = [0] * atr_period
+        self._tr_pos = 0
+        self._tr_count = 0
+        self._tr_sum = 0
+
+        # ATR 历史环形缓冲区
+        self._atr_ring = [0.0] * self.ATR_HISTORY_SIZE
+        self._atr_pos = 0
+        self._atr_count = 0
+
+        # 最新一根K线
+        self.last_timestamp = None
+        self.current_close = None
+        self.current_atr = None
+
+    @property
+    def atr_values(self) -> List[float]:
+        """最近的 ATR 值 (旧 -> 新)，最多 ATR_HISTORY_SIZE 个"""
+        size = self.ATR_HISTORY_SIZE
+        start = (self._atr_pos - self._atr_count) % size
+        return [self._atr_ring[(start + k) % size] for k in range(self._atr_count)]
+
+    def _push_atr(self, atr: float):
+        self._atr_ring[self._atr_pos] = atr
+        self._atr_pos = (self._atr_pos + 1) % self.ATR_HISTORY_SIZE
+        if self._atr_count < self.ATR_HISTORY_SIZE:
+            self._atr_count += 1
 
     def update_price(self, timestamp: int, high: float, low: float, close: float):
         """更新价格数据并计算ATR"""
-        self.price_history.append((timestamp, high, low, close))
-
-        # 保持历史数据在指定周期内
-        if len(self.price_history) > self.atr_period + 1:
-            self.price_history.pop(0)
-
-        # 计算ATR
-        if len(self.price_history) >= 2:
-            self._calculate_atr()
-
-    def _calculate_atr(self):
-        """计算平均真实波幅 (ATR)"""
-        if len(self.price_history) < 2:
-            return
+        prev_close = self.current_close
+        if prev_close is not None:
+            # 真实波幅 = max(high-low, |high-prev_close|, |low-prev_close|)
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            fixed = round(true_range * self.TR_SCALE)
 
-        true_ranges = []
-        for i in range(1, len(self.price_history)):
-            current = self.price_history[i]
-            previous = self.price_history[i-1]
+            pos = self._tr_pos
+            if self._tr_count == self.atr_period:
+                self._tr_sum -= self._tr_ring[pos]  # 移出窗口最旧的真实波幅
+            else:
+                self._tr_count += 1
+            self._tr_ring[pos] = fixed
+            self._tr_sum += fixed
+            self._tr_pos = (pos + 1) % self.atr_period
 
-            # 真实波幅 = max(high-low, |high-prev_close|, |low-prev_close|)
-            tr1 = current[1] - current[2]  # high - low
-            tr2 = abs(current[1] - previous[3])  # |high - prev_close|
-            tr3 = abs(current[2] - previous[3])  # |low - prev_close|
+            # ATR (简单移动平均)：整数除法结果为正确舍入的 float
+            self.current_atr = self._tr_sum / (self._tr_count * self.TR_SCALE)
+            self._push_atr(self.current_atr)
 
-            true_range = max(tr1, tr2, tr3)
-            true_ranges.append(true_range)
+        self.last_timestamp = timestamp
+        self.current_close = close
 
-        # 计算ATR (简单移动平均)
-        if true_ranges:
-            atr = sum(true_ranges) / len(true_ranges)
-            self.atr_values.append(atr)
+    def get_state(self) -> dict:
+        """导出环形缓冲区和最新K线 (定点真实波幅保存为 int64 数组)"""
+        return {
+            "tr_ring": np.array(self._tr_ring, dtype=np.int64), "tr_pos": self._tr_pos,
+            "tr_count": self._tr_count, "tr_sum": self._tr_sum,
+            "atr_ring": np.array(self._atr_ring, dtype=np.float64), "atr_pos": self._atr_pos,
+            "atr_count": self._atr_count,
+            "last_timestamp": self.last_timestamp, "current_close": self.current_close,
+            "current_atr": self.current_atr,
+        }
 
-            # 保持ATR历史在合理范围内
-            if len(self.atr_values) > 100:
-                self.atr_values.pop(0)
+    def set_state(self, state: dict):
+        if len(state["tr_ring"]) != self.atr_period:
+            raise ValueError(f"快照的 ATR 周期 {len(state['tr_ring'])} 与当前监控 {self.atr_period} 不一致")
+        self._tr_ring = state["tr_ring"].tolist()
+        self._tr_pos, self._tr_count, self._tr_sum = state["tr_pos"], state["tr_count"], state["tr_sum"]
+        self._atr_ring = state["atr_ring"].tolist()
+        self._atr_pos, self._atr_count = state["atr_pos"], state["atr_count"]
+        self.last_timestamp = state["last_timestamp"]
+        self.current_close = state["current_close"]
+        self.current_atr = state["current_atr"]
+
+    def preview_atr(self, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+        """
+        计算依次喂入这些K线后每根K线的 ATR，不修改监控状态
+        (第一根K线之前没有收盘价时，该K线 ATR 为 nan)
+        """
+        return self._window_atrs(highs, lows, closes)[1]
+
+    def update_many(self, timestamps: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                    closes: np.ndarray) -> np.ndarray:
+        """批量更新，结果与逐根调用 update_price 逐位一致，返回每根K线的 ATR"""
+        if len(closes) == 0:
+            return np.empty(0)
+        all_fixed, atrs = self._window_atrs(highs, lows, closes)
+
+        # 用窗口内最后 atr_period 个真实波幅重建环形缓冲区
+        count = min(len(all_fixed), self.atr_period)
+        if count:
+            tail = all_fixed[len(all_fixed) - count:].tolist()
+            self._tr_ring = tail + [0] * (self.atr_period - count)
+            self._tr_pos = count % self.atr_period
+            self._tr_count = count
+            self._tr_sum = sum(tail)
+
+        valid = atrs[~np.isnan(atrs)]
+        for atr in valid[-self.ATR_HISTORY_SIZE:].tolist():
+            self._push_atr(atr)
+        if len(valid):
+            self.current_atr = float(valid[-1])
+
+        self.last_timestamp = timestamps[-1]
+        self.current_close = closes[-1]
+        return atrs
+
+    def _window_atrs(self, highs, lows, closes):
+        """返回 (窗口内旧真实波幅 + 新真实波幅 的定点数组, 每根新K线的 ATR)"""
+        highs = np.asarray(highs, dtype=np.float64)
+        lows = np.asarray(lows, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+
+        atrs = np.full(len(closes), np.nan)
+        if self.current_close is None:
+            # 第一根K线只提供前收盘价
+            first_offset = 1
+            prev_closes = closes[:-1]
+        else:
+            first_offset = 0
+            prev_closes = np.concatenate(([self.current_close], closes[:-1]))
+        highs, lows = highs[first_offset:], lows[first_offset:]
+
+        new_fixed = fixed_true_ranges(highs, lows, prev_closes)
+
+        start = (self._tr_pos - self._tr_count) % self.atr_period
+        old_fixed = np.array([self._tr_ring[(start + k) % self.atr_period] for k in range(self._tr_count)],
+                             dtype=np.int64)
+        all_fixed = np.concatenate((old_fixed, new_fixed))
+        if len(new_fixed) == 0:
+            return all_fixed, atrs
+
+        prefix = np.concatenate(([0], np.cumsum(all_fixed)))
+        ends = self._tr_count + np.arange(1, len(new_fixed) + 1)
+        widths = np.minimum(ends, self.atr_period)
+        # 窗口和 < 2^53 时 int64 -> float64 无损，除法与 Python 整数除法同为正确舍入
+        atrs[first_offset:] = (prefix[ends] - prefix[ends - widths]) / (widths * self.TR_SCALE)
+        return all_fixed, atrs
 
     def get_current_atr_percentage(self) -> float:
         """获取当前ATR相对于价格的百分比"""
-        if not self.atr_values or not self.price_history:
+        if self.current_atr is None:
             return 0.0
 
-        current_atr = self.atr_values[-1]
-        current_price = self.price_history[-1][3]  # close price
-
-        return (current_atr / current_price) * 100 if current_price > 0 else 0.0
+        current_price = self.current_close
+        return (self.current_atr / current_price) * 100 if current_price > 0 else 0.0
 
     def get_volatility_level(self) -> str:
         """获取当前波动率等级"""
-        atr_pct = self.get_current_atr_percentage()
-
-        high_threshold = ATR_CONFIG["high_volatility_threshold"] * 100
-        extreme_threshold = ATR_CONFIG["extreme_volatility_threshold"] * 100
+        return self.volatility_level_for(self.get_current_atr_percentage())
 
-        if atr_pct >= extreme_threshold:
+    def volatility_level_for(self, atr_pct: float) -> str:
+        """ATR 百分比对应的波动率等级"""
+        if atr_pct >= self._extreme_pct:
             return "EXTREME"
-        elif atr_pct >= high_threshold:
+        elif atr_pct >= self._high_pct:
             return "HIGH"
         else:
             return "NORMAL"
@@ -219,47 +415,193 @@ class VolatilityMonitor:
         """判断是否应该减少风险敞口"""
         return self.get_volatility_level() in ["HIGH", "EXTREME"]
 
+class PrecomputedVolatilityMonitor(VolatilityMonitor):
+    """
+    特征库版波动率监控：ATR 来自 feature_store 预计算数组，update 只移动游标
+    (数组与 VolatilityMonitor 逐根计算的结果逐位一致)
+    """
+
+    def __init__(self, atr_period: int, atrs: np.ndarray, **thresholds):
+        super().__init__(atr_period, **thresholds)
+        self._atrs = atrs
+        self._bar_index = 0
+
+    def update_price(self, timestamp: int, high: float, low: float, close: float):
+        atr = self._atrs[self._bar_index]
+        self._bar_index += 1
+        if atr == atr:  # 非 nan
+            self.current_atr = float(atr)
+            self._push_atr(self.current_atr)
+        self.last_timestamp = timestamp
+        self.current_close = close
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state["bar_index"] = self._bar_index
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self._bar_index = state["bar_index"]
+
+    def preview_atr(self, highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+        return self._atrs[self._bar_index:self._bar_index + len(closes)]
+
+    def update_many(self, timestamps: np.ndarray, highs: np.ndarray, lows: np.ndarray,
+                    closes: np.ndarray) -> np.ndarray:
+        if len(closes) == 0:
+            return np.empty(0)
+        atrs = self.preview_atr(highs, lows, closes)
+        self._bar_index += len(closes)
+        valid = atrs[~np.isnan(atrs)]
+        for atr in valid[-self.ATR_HISTORY_SIZE:].tolist():
+            self._push_atr(atr)
+        if len(valid):
+            self.current_atr = float(valid[-1])
+        self.last_timestamp = timestamps[-1]
+        self.current_close = closes[-1]
+        return atrs
+
+class VolatilitySnapshot:
+    """
+    每根K线的波动率状态快照：在波动率监控更新时计算一次，子tick内的所有策略检查直接读取
+    atr_ratio 为 get_current_atr 使用的 ATR/收盘价 (已按数值后端转换)
+    """
+    __slots__ = ("level", "atr_percentage", "should_reduce_exposure", "atr_ratio")
+
+    def __init__(self, level: str, atr_percentage: float, should_reduce_exposure: bool, atr_ratio):
+        self.level = level
+        self.atr_percentage = atr_percentage
+        self.should_reduce_exposure = should_reduce_exposure
+        self.atr_ratio = atr_ratio
+
+    @classmethod
+    def from_monitor(cls, monitor: Optional[VolatilityMonitor], num: NumericBackend) -> "VolatilitySnapshot":
+        if not monitor:
+            return cls("NORMAL", 0.0, False, num.zero)
+
+        atr_percentage = monitor.get_current_atr_percentage()
+        level = monitor.volatility_level_for(atr_percentage)
+
+        current_atr, current_close = monitor.current_atr, monitor.current_close
+        if current_atr is None or not current_close or current_close <= 0:
+            atr_ratio = num.zero
+        else:
+            atr_ratio = num.num(current_atr / current_close)  # 例如0.30表示30%
+        return cls(level, atr_percentage, level in ("HIGH", "EXTREME"), atr_ratio)
+
+    def as_dict(self) -> dict:
+        return {
+            "level": self.level,
+            "atr_percentage": self.atr_percentage,
+            "should_reduce_exposure": self.should_reduce_exposure,
+        }
+
 # =====================================================================================
 # 高性能永续合约交易所模拟器
 # =====================================================================================
 class FastPerpetualExchange:
-    def __init__(self, initial_balance: float):
+    def __init__(self, initial_balance: float, numeric_backend: Optional[NumericBackend] = None,
+                 config: Optional[BacktestConfig] = None):
+        # 🚀 编译后的不可变配置：未传入时按当前全局配置编译一份 (之后修改全局字典不影响本实例)
+        if config is None:
+            config = build_backtest_config(numeric_backend)
+        elif numeric_backend is not None and numeric_backend is not config.num:
+            raise ValueError("numeric_backend 与 config.num 不一致，请只通过 config 指定数值后端")
+        self.config = config
+        # 🚀 数值后端：所有金额/价格都通过它构造，热路径上不再重复 Decimal(str(...))
+        self.num = config.num
+        num = self.num.num
+
+        # 预转换常量 (编译配置时已转换)
+        self.maker_fee = config.maker_fee
+        self.taker_fee = config.taker_fee
+        self.rebate_rate = config.rebate_rate
+        self.leverage_tiers = config.leverage_tiers
+
         # 账户余额
-        self.balance = Decimal(str(initial_balance))
-        self.margin_balance = Decimal(str(initial_balance))
+        self.balance = num(initial_balance)
+        self.margin_balance = num(initial_balance)
 
         # 仓位信息
-        self.long_position = Decimal("0")
-        self.short_position = Decimal("0")
-        self.long_entry_price = Decimal("0")
-        self.short_entry_price = Decimal("0")
+        self.long_position = self.num.zero
+        self.short_position = self.num.zero
+        self.long_entry_price = self.num.zero
+        self.short_entry_price = self.num.zero
 
         # 🚀 当前有效杠杆 (用于交易记录)
-        self.current_leverage = STRATEGY_CONFIG["leverage"]
+        self.current_leverage = config.leverage
         
         # 市场信息
-        self.current_price = Decimal("0")
+        self.current_price = self.num.zero
         
-        # 简化的订单管理 - 只保留必要信息
-        self.active_buy_orders = []
-        self.active_sell_orders = []
-        self.trade_history = []
-        self.equity_history = []
+        # 🚀 持久化订单簿 (有序价位 + FIFO)，撮合只检查最优价位
+        self.order_book = OrderBook()
+        self.trade_history = TradeLog()  # 🚀 列式成交记录 (读取时仍表现为字典列表)
+        self.pair_stats = FifoPairStats()  # 🚀 成交时在线配对开平仓，结束后无需再扫描成交记录
+        # 🚀 数组版权益记录 (可采样、超阈值落盘)
+        self.equity_history = EquityRecorder(
+            mode=config.equity_sampling,
+            every_n=config.equity_sample_every,
+            max_memory_points=config.equity_max_memory_points,
+            spill_dir=config.equity_spill_dir,
+        )
         self.order_id_counter = 1
-        self.total_fees_paid = Decimal("0")
+        self.total_fees_paid = self.num.zero
         # 删除资金费率相关代码，因为数据中没有资金费率
 
         # 新增：返佣机制相关属性
-        if REBATE_CONFIG.get("use_fee_rebate", False):
+        if config.use_fee_rebate:
             self.last_payout_date = None # 用于跟踪上一次返佣的日期
-            self.current_cycle_fees = Decimal("0")
+            self.current_cycle_fees = self.num.zero
 
         # 🚀 新增：波动率监控
-        if ATR_CONFIG["enable_volatility_adaptive"]:
-            self.volatility_monitor = VolatilityMonitor(ATR_CONFIG["atr_period"])
+        if config.enable_volatility_adaptive:
+            self.volatility_monitor = VolatilityMonitor(
+                config.atr_period,
+                high_volatility_threshold=config.high_volatility_threshold,
+                extreme_volatility_threshold=config.extreme_volatility_threshold,
+            )
         else:
             self.volatility_monitor = None
+        # 🚀 每根K线的波动率快照 (监控更新时重算一次，策略子tick只读)
+        self.volatility_stats = {"snapshot_builds": 0, "snapshot_reads": 0}
+        self.refresh_volatility_state()
         
+    # 快照中直接保存的标量状态
+    STATE_FIELDS = ("balance", "margin_balance", "long_position", "short_position", "long_entry_price",
+                    "short_entry_price", "current_leverage", "current_price", "order_id_counter",
+                    "total_fees_paid", "last_payout_date", "current_cycle_fees")
+
+    def get_state(self) -> dict:
+        """导出可恢复的交易所状态 (余额/仓位/挂单/成交记录/权益曲线/波动率监控)"""
+        state = {name: getattr(self, name) for name in self.STATE_FIELDS if hasattr(self, name)}
+        state.update({
+            "order_book": self.order_book.get_state(),
+            "trade_history": self.trade_history.get_state(),
+            "pair_stats": self.pair_stats.get_state(),
+            "equity_history": self.equity_history.get_state(),
+            "volatility_monitor": self.volatility_monitor.get_state() if self.volatility_monitor else None,
+            "volatility_stats": dict(self.volatility_stats),
+        })
+        return state
+
+    def set_state(self, state: dict):
+        """恢复 get_state 导出的状态 (须使用相同的配置，特征库模式下先调用 use_precomputed_atr)"""
+        for name in self.STATE_FIELDS:
+            if name in state:
+                setattr(self, name, state[name])
+        self.order_book.set_state(state["order_book"])
+        self.trade_history.set_state(state["trade_history"])
+        self.pair_stats.set_state(state["pair_stats"])
+        self.equity_history.set_state(state["equity_history"])
+        if (state["volatility_monitor"] is None) != (self.volatility_monitor is None):
+            raise ValueError("快照与当前配置的波动率监控设置不一致")
+        if self.volatility_monitor:
+            self.volatility_monitor.set_state(state["volatility_monitor"])
+        self.refresh_volatility_state()
+        self.volatility_stats = dict(state["volatility_stats"])
+
     def get_equity(self) -> Decimal:
         """获取当前总权益"""
         return self.balance + self.get_unrealized_pnl()
@@ -270,16 +612,16 @@ class FastPerpetualExchange:
         current_max_leverage = self.get_current_max_leverage()
 
         # 🚀 优先选择高杠杆：使用当前档位允许的最高杠杆，但不超过初始设置
-        effective_leverage = min(current_max_leverage, STRATEGY_CONFIG["leverage"])
+        effective_leverage = min(current_max_leverage, self.config.leverage)
 
         if effective_leverage == 0:
-            return Decimal("0")
+            return self.num.zero
 
         # 🚀 保证金计算：总持仓价值 / 有效杠杆
         long_value = self.long_position * self.long_entry_price
         short_value = self.short_position * self.short_entry_price
         total_position_value = long_value + short_value
-        return total_position_value / Decimal(str(effective_leverage))
+        return total_position_value / self.num.num(effective_leverage)
 
     def get_available_margin(self) -> Decimal:
         """获取可用保证金"""
@@ -290,12 +632,12 @@ class FastPerpetualExchange:
         total_position_value = self.get_position_value()  # 现在是总持仓价值
 
         # 🚀 优先选择高杠杆：从最高杠杆开始检查
-        for threshold, max_leverage, mm_rate, fixed_amount in ETH_USDC_TIERS:
+        for threshold, max_leverage, mm_rate, fixed_amount in self.leverage_tiers:
             if total_position_value <= threshold:
                 return threshold, max_leverage, mm_rate, fixed_amount
 
         # 默认返回最低档位 (超出所有限制时)
-        return ETH_USDC_TIERS[-1]
+        return self.leverage_tiers[-1]
 
     def get_current_max_leverage(self) -> int:
         """获取当前仓位价值对应的最大杠杆倍数"""
@@ -306,7 +648,7 @@ class FastPerpetualExchange:
         """🚀 更新当前有效杠杆 (用于交易记录)"""
         old_leverage = self.current_leverage
         current_max_leverage = self.get_current_max_leverage()
-        new_leverage = min(current_max_leverage, STRATEGY_CONFIG["leverage"])
+        new_leverage = min(current_max_leverage, self.config.leverage)
 
         # 🚀 杠杆变化时记录 (用于调试)
         if new_leverage != old_leverage:
@@ -321,13 +663,13 @@ class FastPerpetualExchange:
         """
         net_position_value = self.get_net_position_value()  # 使用净持仓价值
 
-        for threshold, max_leverage, mm_rate, maintenance_amount in ETH_USDC_TIERS:
+        for threshold, max_leverage, mm_rate, maintenance_amount in self.leverage_tiers:
             # max_leverage在此处不使用，但保留用于阶梯保证金表的完整性
             _ = max_leverage  # 明确标记为未使用但保留
             if net_position_value <= threshold:
                 # 🚀 修正：使用减号，符合币安公式
                 return net_position_value * mm_rate - maintenance_amount
-        return Decimal("0")  # 默认情况
+        return self.num.zero  # 默认情况
 
     def check_and_handle_liquidation(self, timestamp: int) -> bool:
         """检查并处理爆仓事件。如果发生爆仓，则返回 True。"""
@@ -347,7 +689,7 @@ class FastPerpetualExchange:
             # 🚀 修复：安全的时间戳转换
             try:
                 if timestamp <= 2147483647 and timestamp >= 0:
-                    time_str = pd.to_datetime(timestamp, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+                    time_str = utc_datetime(timestamp).strftime('%Y-%m-%d %H:%M:%S')
                 else:
                     time_str = f"时间戳:{timestamp}"
             except:
@@ -360,11 +702,10 @@ class FastPerpetualExchange:
             print("!"*70)
 
             # 清空所有挂单
-            self.active_buy_orders.clear()
-            self.active_sell_orders.clear()
+            self.order_book.clear()
 
             # 强平所有仓位 (按当前市价，付Taker费)
-            taker_fee_rate = MARKET_CONFIG["taker_fee"]
+            taker_fee_rate = self.taker_fee
             
             # 平多仓
             if self.long_position > 0:
@@ -372,11 +713,11 @@ class FastPerpetualExchange:
                 fee = self.long_position * liquidation_price * taker_fee_rate
                 self.balance += pnl - fee
                 self.total_fees_paid += fee
-                if REBATE_CONFIG.get("use_fee_rebate", False):
+                if self.config.use_fee_rebate:
                     self.current_cycle_fees += fee
                     self.process_fee_rebate(timestamp)  # 爆仓时也要检查返佣
-                self.long_position = Decimal("0")
-                self.long_entry_price = Decimal("0")
+                self.long_position = self.num.zero
+                self.long_entry_price = self.num.zero
 
             # 平空仓
             if self.short_position > 0:
@@ -384,14 +725,14 @@ class FastPerpetualExchange:
                 fee = self.short_position * liquidation_price * taker_fee_rate
                 self.balance += pnl - fee
                 self.total_fees_paid += fee
-                if REBATE_CONFIG.get("use_fee_rebate", False):
+                if self.config.use_fee_rebate:
                     self.current_cycle_fees += fee
                     self.process_fee_rebate(timestamp)  # 爆仓时也要检查返佣
-                self.short_position = Decimal("0")
-                self.short_entry_price = Decimal("0")
+                self.short_position = self.num.zero
+                self.short_entry_price = self.num.zero
             
             # 账户清零 (模拟爆仓后资金归零)
-            self.balance = Decimal("0")
+            self.balance = self.num.zero
             
             return True
         
@@ -399,6 +740,52 @@ class FastPerpetualExchange:
 
     def get_net_position(self) -> Decimal:
         return self.long_position - self.short_position
+
+    def liquidation_price_bounds(self) -> Optional[tuple]:
+        """🚀 事件驱动引擎用：返回不会触发爆仓的价格开区间 (lo, hi)，任何价格都会爆仓时返回 None
+
+        权益 = K + N·p，维持保证金在每个档位内是 |N|·p 的线性函数，
+        因此 (权益 - 维持保证金) 对价格单调，可以逐档位解出爆仓价。
+        """
+        if self.long_position == 0 and self.short_position == 0:
+            return 0.0, float("inf")
+
+        # K/N 在当前数值后端内计算后再转 float，避免大额相减的精度损失
+        k = float(self.balance - self.long_position * self.long_entry_price + self.short_position * self.short_entry_price)
+        n = float(self.long_position - self.short_position)
+        tiers = [(float(th), float(mm_rate), float(amount)) for th, _, mm_rate, amount in self.leverage_tiers]
+
+        if n == 0:
+            # 净持仓为0: 维持保证金恒为第一档的 -速算额，权益与价格无关
+            return (0.0, float("inf")) if k + tiers[0][2] > 0 else None
+
+        lo, hi = 0.0, float("inf")
+        lower_value = 0.0
+        abs_n = abs(n)
+        for threshold, mm_rate, amount in tiers:
+            p_lower, p_upper = lower_value / abs_n, threshold / abs_n
+            if n > 0:
+                # f(p) = K + a + N(1-r)p 单调递增，p <= root 时爆仓
+                root = -(k + amount) / (abs_n * (1 - mm_rate))
+                if root > p_lower:
+                    lo = max(lo, min(root, p_upper))
+            else:
+                # f(p) = K + a - |N|(1+r)p 单调递减，p >= root 时爆仓
+                root = (k + amount) / (abs_n * (1 + mm_rate))
+                if root <= p_upper:
+                    hi = min(hi, max(root, p_lower))
+            lower_value = threshold
+        return lo, hi
+
+    def best_bid_price(self) -> Optional[float]:
+        """最高买单价 (买单在 low <= price 时成交)"""
+        best = self.order_book.best_bid()
+        return None if best is None else float(best)
+
+    def best_ask_price(self) -> Optional[float]:
+        """最低卖单价 (卖单在 high >= price 时成交)"""
+        best = self.order_book.best_ask()
+        return None if best is None else float(best)
     
     def get_position_value(self) -> Decimal:
         """🚀 币安标准：计算总持仓价值 (多仓价值 + 空仓价值) - 用于杠杆选择"""
@@ -412,7 +799,7 @@ class FastPerpetualExchange:
         return abs(net_pos) * self.current_price  # 净持仓价值，用于爆仓风险评估
     
     def get_unrealized_pnl(self) -> Decimal:
-        pnl = Decimal("0")
+        pnl = self.num.zero
         if self.long_position > 0:
             pnl += self.long_position * (self.current_price - self.long_entry_price)
         if self.short_position > 0:
@@ -422,89 +809,105 @@ class FastPerpetualExchange:
     def get_margin_ratio(self) -> Decimal:
         position_value = self.get_position_value()
         if position_value == 0:
-            return Decimal("999")
+            return self.num.num(999)
         equity = self.margin_balance + self.get_unrealized_pnl()
         return equity / position_value
     
     def set_current_price(self, price: float):
-        self.current_price = Decimal(str(price))
+        self.current_price = self.num.price(price)
 
     def update_volatility_monitor(self, timestamp: int, high: float, low: float, close: float):
         """更新波动率监控数据"""
         if self.volatility_monitor:
             self.volatility_monitor.update_price(timestamp, high, low, close)
+            self.refresh_volatility_state()
+
+    def update_volatility_monitor_bulk(self, timestamps: np.ndarray, highs: np.ndarray,
+                                       lows: np.ndarray, closes: np.ndarray):
+        """批量更新波动率监控数据 (与逐根调用 update_volatility_monitor 逐位一致)"""
+        if self.volatility_monitor:
+            self.volatility_monitor.update_many(timestamps, highs, lows, closes)
+            self.refresh_volatility_state()
+
+    def use_precomputed_atr(self, atrs: np.ndarray):
+        """改用特征库预计算的 ATR 数组 (须在喂入第一根K线之前调用)"""
+        if self.volatility_monitor:
+            monitor = self.volatility_monitor
+            self.volatility_monitor = PrecomputedVolatilityMonitor(
+                monitor.atr_period, atrs,
+                high_volatility_threshold=monitor.high_volatility_threshold,
+                extreme_volatility_threshold=monitor.extreme_volatility_threshold,
+            )
+            self.refresh_volatility_state()
+
+    def refresh_volatility_state(self):
+        """重新计算波动率快照 (只在波动率监控更新后调用)"""
+        self.volatility_state = VolatilitySnapshot.from_monitor(self.volatility_monitor, self.num)
+        self.volatility_stats["snapshot_builds"] += 1
+
+    def get_volatility_state(self) -> VolatilitySnapshot:
+        """读取当前K线的波动率快照"""
+        self.volatility_stats["snapshot_reads"] += 1
+        return self.volatility_state
+
+    def get_volatility_stats(self) -> dict:
+        """快照计数：每次读取原本都要重新计算一次 ATR 百分比和波动率等级"""
+        builds = self.volatility_stats["snapshot_builds"]
+        reads = self.volatility_stats["snapshot_reads"]
+        return {"snapshot_builds": builds, "snapshot_reads": reads,
+                "recomputations_avoided": max(reads - builds, 0)}
 
     def get_volatility_info(self) -> dict:
         """获取当前波动率信息"""
-        if not self.volatility_monitor:
-            return {"level": "NORMAL", "atr_percentage": 0.0, "should_reduce_exposure": False}
-
-        return {
-            "level": self.volatility_monitor.get_volatility_level(),
-            "atr_percentage": self.volatility_monitor.get_current_atr_percentage(),
-            "should_reduce_exposure": self.volatility_monitor.should_reduce_exposure()
-        }
+        return self.get_volatility_state().as_dict()
     
-    def place_orders_batch(self, orders: List[tuple]):
-        self.active_buy_orders.clear()
-        self.active_sell_orders.clear()
-        
-        for side, amount, price in orders:
-            if side in ['buy_long', 'buy_short']:
-                self.active_buy_orders.append((price, amount, side))
-            else:
-                self.active_sell_orders.append((price, amount, side))
-        
-        # 排序以优化匹配
-        self.active_buy_orders.sort(key=lambda x: x[0], reverse=True) # 买单价格从高到低
-        self.active_sell_orders.sort(key=lambda x: x[0]) # 卖单价格从低到高
+    @property
+    def active_buy_orders(self) -> List[tuple]:
+        """买单列表 (price, amount, side)，价格从高到低"""
+        return self.order_book.side_orders(is_bid=True)
 
-    def fast_order_matching(self, high: Decimal, low: Decimal, timestamp: int) -> int:
-        """🚀 超高速订单匹配 - 向量化优化版本"""
-        filled_count = 0
-
-        # 🚀 向量化优化：批量处理买单
-        if self.active_buy_orders:
-            # 使用列表推导式，比传统循环快30-50%
-            filled_buy_orders = [(price, amount, side) for price, amount, side in self.active_buy_orders if low <= price]
-            remaining_buy_orders = [(price, amount, side) for price, amount, side in self.active_buy_orders if low > price]
+    @property
+    def active_sell_orders(self) -> List[tuple]:
+        """卖单列表 (price, amount, side)，价格从低到高"""
+        return self.order_book.side_orders(is_bid=False)
 
-            # 批量执行成交订单
-            for price, amount, side in filled_buy_orders:
-                self.execute_fast_trade(side, amount, price, timestamp)
-                filled_count += 1
+    def place_orders_batch(self, orders: List[tuple]):
+        """用一批新订单替换整个订单簿"""
+        self.order_book.replace(orders)
 
-            self.active_buy_orders = remaining_buy_orders
+    def place_order(self, side: str, amount: Decimal, price: Decimal) -> int:
+        """增量挂单 (不影响其它挂单)，返回订单号"""
+        return self.order_book.add(side, amount, price)
 
-        # 🚀 向量化优化：批量处理卖单
-        if self.active_sell_orders:
-            filled_sell_orders = [(price, amount, side) for price, amount, side in self.active_sell_orders if high >= price]
-            remaining_sell_orders = [(price, amount, side) for price, amount, side in self.active_sell_orders if high < price]
+    def cancel_order(self, order_id: int) -> bool:
+        return self.order_book.cancel(order_id)
 
-            # 批量执行成交订单
-            for price, amount, side in filled_sell_orders:
-                self.execute_fast_trade(side, amount, price, timestamp)
-                filled_count += 1
+    def amend_order(self, order_id: int, price: Optional[Decimal] = None, amount: Optional[Decimal] = None) -> bool:
+        """改单：只改数量保留排队位置，改价格重新排队"""
+        return self.order_book.amend(order_id, price, amount)
 
-            self.active_sell_orders = remaining_sell_orders
+    def fast_order_matching(self, high: Decimal, low: Decimal, timestamp: int) -> int:
+        """🚀 订单匹配 - 只检查最优价位，成本与成交笔数成正比"""
+        fills = self.order_book.match(high, low)
+        for price, amount, side in fills:
+            self.execute_fast_trade(side, amount, price, timestamp)
+        return len(fills)
 
-        return filled_count
-    
     def execute_fast_trade(self, side: str, amount: Decimal, price: Decimal, timestamp: int):
         """快速交易执行 - 修复手续费计算逻辑"""
         # 🔧 修复关键错误：手续费应该基于开仓价值，而不是保证金
         position_value = amount * price  # 实际开仓价值
-        fee = position_value * MARKET_CONFIG["maker_fee"]  # 基于开仓价值计算手续费
+        fee = position_value * self.maker_fee  # 基于开仓价值计算手续费
         self.balance -= fee
         self.total_fees_paid += fee
 
         # 🚀 修复：返佣应该在交易发生时计算，基于实际产生的手续费
-        if REBATE_CONFIG.get("use_fee_rebate", False):
+        if self.config.use_fee_rebate:
             self.current_cycle_fees += fee
             # 在交易时检查是否需要发放返佣
             self.process_fee_rebate(timestamp)
         
-        pnl = Decimal("0")
+        pnl = self.num.zero
         
         if side == "buy_long":
             if self.long_position == 0:
@@ -530,7 +933,7 @@ class FastPerpetualExchange:
             self.balance += pnl
             self.long_position -= trade_amount
             if self.long_position == 0:
-                self.long_entry_price = Decimal("0")
+                self.long_entry_price = self.num.zero
                 
         elif side == "buy_short" and self.short_position > 0:
             trade_amount = min(amount, self.short_position)
@@ -538,16 +941,13 @@ class FastPerpetualExchange:
             self.balance += pnl
             self.short_position -= trade_amount
             if self.short_position == 0:
-                self.short_entry_price = Decimal("0")
+                self.short_entry_price = self.num.zero
 
         # 🚀 更新当前杠杆 (用于交易记录)
         self.update_current_leverage()
 
-        trade_record = {
-            "timestamp": timestamp, "side": side, "amount": amount,
-            "price": price, "fee": fee, "pnl": pnl, "leverage": self.current_leverage
-        }
-        self.trade_history.append(trade_record)
+        self.trade_history.append(timestamp, side, amount, price, fee, pnl, self.current_leverage)
+        self.pair_stats.on_fill(side, amount, price, timestamp)
         self.order_id_counter += 1
 
     # 删除资金费率处理函数，因为数据中没有资金费率
@@ -555,7 +955,32 @@ class FastPerpetualExchange:
     def record_equity(self, timestamp: int):
         """🚀 高性能权益记录 - 减少重复计算"""
         equity = self.balance + self.get_unrealized_pnl()
-        self.equity_history.append((timestamp, equity))
+        self.equity_history.record(timestamp, equity)
+
+    def record_equity_bulk(self, timestamps: np.ndarray, closes: np.ndarray):
+        """🚀 批量记录一段无成交K线的权益 (仓位与余额在这段时间内不变)
+
+        float 后端用 NumPy 按与 get_unrealized_pnl 相同的运算顺序向量化计算，结果逐位一致；
+        decimal 后端逐根计算以保持参考模式的精度。收盘后 current_price 停在最后一根的收盘价。
+        """
+        if len(timestamps) == 0:
+            return
+        valid = (timestamps >= 0) & (timestamps <= 2147483647)
+        if isinstance(self.num.zero, float):
+            prices = self.num.price_array(closes)
+            pnl = np.zeros(len(prices))
+            if self.long_position > 0:
+                pnl = pnl + self.long_position * (prices - self.long_entry_price)
+            if self.short_position > 0:
+                pnl = pnl + self.short_position * (self.short_entry_price - prices)
+            equities = self.balance + pnl
+            self.equity_history.record_many(timestamps[valid], equities[valid])
+            self.current_price = float(prices[-1])
+        else:
+            for timestamp, close, ok in zip(timestamps, closes, valid):
+                self.current_price = self.num.price(close)
+                if ok:
+                    self.record_equity(timestamp)
 
     def record_equity_batch(self, timestamp: int, cached_unrealized_pnl: Optional[Decimal] = None):
         """🚀 批量权益记录 - 使用缓存的未实现盈亏"""
@@ -563,11 +988,11 @@ class FastPerpetualExchange:
             equity = self.balance + cached_unrealized_pnl
         else:
             equity = self.balance + self.get_unrealized_pnl()
-        self.equity_history.append((timestamp, equity))
+        self.equity_history.record(timestamp, equity)
 
     def process_fee_rebate(self, timestamp: int):
         """处理手续费返佣机制"""
-        if not REBATE_CONFIG.get("use_fee_rebate", False):
+        if not self.config.use_fee_rebate:
             return
 
         # 🚀 优化：避免时间戳溢出，添加边界检查
@@ -575,10 +1000,10 @@ class FastPerpetualExchange:
             return
 
         try:
-            current_date = pd.to_datetime(timestamp, unit='s')
+            current_date = utc_datetime(timestamp)
         except (ValueError, OverflowError, Exception):
             return  # 跳过无效时间戳
-        payout_day = REBATE_CONFIG["rebate_payout_day"]
+        payout_day = self.config.rebate_payout_day
 
         # 初始化 last_payout_date
         if self.last_payout_date is None:
@@ -586,24 +1011,24 @@ class FastPerpetualExchange:
             start_date_payout = current_date.replace(day=payout_day, hour=0, minute=0, second=0, microsecond=0)
             if current_date < start_date_payout:
                 # 如果开始日期在当月发放日之前，则上一个发放日是上个月的
-                self.last_payout_date = start_date_payout - pd.DateOffset(months=1)
+                self.last_payout_date = add_months(start_date_payout, -1)
             else:
                 # 如果开始日期在当月发放日之后，则上一个发放日就是当月的
                 self.last_payout_date = start_date_payout
             return
 
         # 计算下一个发放日
-        next_payout_date = self.last_payout_date + pd.DateOffset(months=1)
+        next_payout_date = add_months(self.last_payout_date, 1)
 
         if current_date >= next_payout_date:
-            rebate_amount = self.current_cycle_fees * REBATE_CONFIG["rebate_rate"]
+            rebate_amount = self.current_cycle_fees * self.rebate_rate
             
             if rebate_amount > 0:
                 self.balance += rebate_amount
                 # 移除返佣打印信息，保持回测过程简洁
 
                 # 重置周期手续费
-                self.current_cycle_fees = Decimal("0")
+                self.current_cycle_fees = self.num.zero
             
             # 更新上次发放日期为本次的发放日
             self.last_payout_date = next_payout_date
@@ -613,7 +1038,7 @@ class FastPerpetualExchange:
         """以当前市价强制平掉所有仓位（非爆仓用）。"""
         if self.long_position == 0 and self.short_position == 0:
             return
-        taker_fee = MARKET_CONFIG["taker_fee"]
+        taker_fee = self.taker_fee
         price = self.current_price
 
         if self.long_position > 0:
@@ -621,27 +1046,27 @@ class FastPerpetualExchange:
             fee = self.long_position * price * taker_fee
             self.balance += pnl - fee
             self.total_fees_paid += fee
-            if REBATE_CONFIG.get("use_fee_rebate", False):
+            if self.config.use_fee_rebate:
                 self.current_cycle_fees += fee
                 self.process_fee_rebate(timestamp)  # 平仓时检查返佣
-            self.long_position = Decimal("0")
-            self.long_entry_price = Decimal("0")
+            self.long_position = self.num.zero
+            self.long_entry_price = self.num.zero
         if self.short_position > 0:
             pnl = self.short_position * (self.short_entry_price - price)
             fee = self.short_position * price * taker_fee
             self.balance += pnl - fee
             self.total_fees_paid += fee
-            if REBATE_CONFIG.get("use_fee_rebate", False):
+            if self.config.use_fee_rebate:
                 self.current_cycle_fees += fee
                 self.process_fee_rebate(timestamp)  # 平仓时检查返佣
-            self.short_position = Decimal("0")
-            self.short_entry_price = Decimal("0")
+            self.short_position = self.num.zero
+            self.short_entry_price = self.num.zero
         
         print("\n" + "-"*70)
         # 🚀 修复：安全的时间戳转换
         try:
             if timestamp <= 2147483647 and timestamp >= 0:
-                time_str = pd.to_datetime(timestamp, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+                time_str = utc_datetime(timestamp).strftime('%Y-%m-%d %H:%M:%S')
             else:
                 time_str = f"时间戳:{timestamp}"
         except:
@@ -655,9 +1080,22 @@ class FastPerpetualExchange:
 # 高性能永续合约做市策略
 # =====================================================================================
 class FastPerpetualStrategy:
-    def __init__(self, exchange: FastPerpetualExchange):
+    def __init__(self, exchange: FastPerpetualExchange, config: Optional[BacktestConfig] = None):
         self.exchange = exchange
+        # 与交易所共用同一份编译配置和数值后端
+        if config is None:
+            config = exchange.config
+        elif config.num is not exchange.num:
+            raise ValueError("策略配置与交易所的数值后端不一致")
+        self.config = config
+        self.num = exchange.num
         self.last_order_time = 0
+
+    def get_state(self) -> dict:
+        return {"last_order_time": self.last_order_time}
+
+    def set_state(self, state: dict):
+        self.last_order_time = state["last_order_time"]
         
     def calculate_dynamic_order_size(self, current_price: Decimal) -> Decimal:
         """计算对冲网格策略的开仓量
@@ -667,40 +1105,38 @@ class FastPerpetualStrategy:
         - 125倍杠杆下，保证金 = 权益 / 125 = 8U
         - 开仓价值 = 保证金 × 125 = 1000U
         """
+        config = self.config
         current_equity = self.exchange.get_equity()
-        leverage = STRATEGY_CONFIG["leverage"]
+        leverage = config.leverage_num
 
         # 🎯 对冲网格策略：每次开仓使用全部权益
-        position_size_ratio = STRATEGY_CONFIG["position_size_ratio"]  # 100%
+        position_size_ratio = config.position_size_ratio  # 100%
         target_position_value = current_equity * position_size_ratio
 
         # 计算所需保证金
-        required_margin = target_position_value / Decimal(str(leverage))
+        required_margin = target_position_value / leverage
         available_margin = self.exchange.get_available_margin()
 
         # 如果保证金不足，按可用保证金计算
         if required_margin > available_margin:
-            target_position_value = available_margin * Decimal(str(leverage))
+            target_position_value = available_margin * leverage
 
         # 基于开仓价值计算下单数量
         order_amount = target_position_value / current_price
 
         # 确保最小下单量符合市场要求
-        min_amount = STRATEGY_CONFIG["min_order_amount"]
-        max_amount = STRATEGY_CONFIG["max_order_amount"]
-
-        return max(min_amount, min(max_amount, order_amount))
+        return max(config.min_order_amount, min(config.max_order_amount, order_amount))
     
     def should_place_orders(self, timestamp: int) -> bool:
-        return (timestamp - self.last_order_time) >= STRATEGY_CONFIG["order_refresh_time"]
+        return (timestamp - self.last_order_time) >= self.config.order_refresh_time
     
     def check_position_stop_loss(self, current_price: Decimal) -> List[tuple]:
         """检查单笔仓位止损"""
-        if not STRATEGY_CONFIG["enable_position_stop_loss"]:
+        if not self.config.enable_position_stop_loss:
             return []
 
         orders = []
-        stop_loss_pct = STRATEGY_CONFIG["position_stop_loss"]
+        stop_loss_pct = self.config.position_stop_loss
 
         # 检查多仓止损
         if self.exchange.long_position > 0:
@@ -720,37 +1156,37 @@ class FastPerpetualStrategy:
 
     def calculate_adaptive_spread(self, current_price: Decimal) -> tuple:
         """根据波动率计算自适应价差"""
-        base_spread = Decimal(str(ATR_CONFIG["base_spread"]))
+        config = self.config
+        base_spread = config.base_spread
 
         # 🔧 检查动态网格间距开关
-        if not ATR_CONFIG["enable_dynamic_spread"] or not ATR_CONFIG["enable_volatility_adaptive"] or not self.exchange.volatility_monitor:
+        if not config.enable_dynamic_spread or not config.enable_volatility_adaptive or not self.exchange.volatility_monitor:
             return base_spread, base_spread
 
-        volatility_info = self.exchange.get_volatility_info()
-        volatility_level = volatility_info["level"]
+        volatility_level = self.exchange.get_volatility_state().level
 
         # 根据波动率等级调整价差
         if volatility_level == "EXTREME":
-            multiplier = Decimal(str(ATR_CONFIG["max_spread_multiplier"]))
+            multiplier = config.max_spread_multiplier
         elif volatility_level == "HIGH":
-            multiplier = Decimal(str(ATR_CONFIG["spread_adjustment_factor"]))
+            multiplier = config.spread_adjustment_factor
         else:
-            multiplier = Decimal("1.0")
+            multiplier = config.normal_spread_multiplier
 
         adaptive_spread = base_spread * multiplier
         return adaptive_spread, adaptive_spread
 
     def check_position_balance(self, current_price: Decimal) -> List[tuple]:
         """检查仓位平衡，在高波动期减少净敞口"""
-        if not ATR_CONFIG["enable_volatility_adaptive"] or not self.exchange.volatility_monitor:
+        config = self.config
+        if not config.enable_volatility_adaptive or not self.exchange.volatility_monitor:
             return []
 
-        volatility_info = self.exchange.get_volatility_info()
-        atr_percentage = volatility_info["atr_percentage"]
+        atr_percentage = self.exchange.get_volatility_state().atr_percentage
 
         # � 紧急平仓机制 (优先级最高)
-        if ATR_CONFIG["enable_emergency_close"]:
-            emergency_threshold = ATR_CONFIG["emergency_close_threshold"] * 100
+        if config.enable_emergency_close:
+            emergency_threshold = config.emergency_close_pct
             if atr_percentage >= emergency_threshold:
                 # 紧急情况：强制平掉所有仓位
                 orders = []
@@ -763,10 +1199,10 @@ class FastPerpetualStrategy:
                 return orders
 
         # 🎯 极端波动强制平衡机制 - 仅在极端波动时生成强制平衡订单
-        if not ATR_CONFIG["enable_extreme_balance"]:
+        if not config.enable_extreme_balance:
             return []
 
-        extreme_threshold = ATR_CONFIG["extreme_volatility_threshold"] * 100
+        extreme_threshold = config.extreme_volatility_pct
         if atr_percentage < extreme_threshold:
             return []  # 未达到极端波动阈值
 
@@ -793,15 +1229,15 @@ class FastPerpetualStrategy:
 
     def should_filter_signal(self, signal_type: str) -> bool:
         """判断是否应该过滤某个交易信号 - 仅在ATR > 30%时过滤"""
-        if not ATR_CONFIG["enable_volatility_adaptive"] or not self.exchange.volatility_monitor:
+        config = self.config
+        if not config.enable_volatility_adaptive or not self.exchange.volatility_monitor:
             return False
 
-        if not ATR_CONFIG["enable_position_balance"]:
+        if not config.enable_position_balance:
             return False
 
-        volatility_info = self.exchange.get_volatility_info()
-        atr_percentage = volatility_info["atr_percentage"]
-        high_threshold = ATR_CONFIG["high_volatility_threshold"] * 100
+        atr_percentage = self.exchange.get_volatility_state().atr_percentage
+        high_threshold = config.high_volatility_pct
 
         if atr_percentage < high_threshold:
             return False  # ATR未达到高波动阈值，不过滤任何信号
@@ -836,10 +1272,10 @@ class FastPerpetualStrategy:
 
         # 2. 获取当前ATR状态
         current_atr = self.get_current_atr()
-        atr_threshold = STRATEGY_CONFIG["atr_threshold"]
+        atr_threshold = self.config.atr_threshold
 
         # 3. 计算价差（统一使用一个价差参数）
-        spread = STRATEGY_CONFIG["spread"]  # 0.4%
+        spread = self.config.spread  # 0.4%
 
         # 4. 获取当前仓位信息
         long_pos = self.exchange.long_position
@@ -854,7 +1290,7 @@ class FastPerpetualStrategy:
             return self.generate_balance_orders(current_price, net_position, spread)
 
         # 6. 正常模式：对冲开仓（同时开多空）
-        if STRATEGY_CONFIG["hedge_mode"]:
+        if self.config.hedge_mode:
             return self.generate_hedge_orders(current_price, spread, available_margin)
 
         # 7. 兜底：返回空订单
@@ -867,12 +1303,12 @@ class FastPerpetualStrategy:
 
         # 计算开仓量
         order_amount = self.calculate_dynamic_order_size(current_price)
-        leverage = STRATEGY_CONFIG["leverage"]
+        leverage = self.config.leverage_num
 
         # 计算所需保证金（开多+开空需要双倍保证金）
         position_value = order_amount * current_price
-        required_margin_per_side = position_value / Decimal(str(leverage))
-        total_required_margin = required_margin_per_side * Decimal("2")  # 双向开仓
+        required_margin_per_side = position_value / leverage
+        total_required_margin = required_margin_per_side * self.config.hedge_side_count  # 双向开仓
 
         # 检查保证金是否足够
         if available_margin < total_required_margin:
@@ -883,8 +1319,8 @@ class FastPerpetualStrategy:
         orders.append(("sell_short", order_amount, current_price)) # 开空
 
         # 🎯 同时挂限价平仓单
-        long_close_price = current_price * (Decimal("1") + spread)  # 多头止盈价
-        short_close_price = current_price * (Decimal("1") - spread) # 空头止盈价
+        long_close_price = self.num.price(current_price * (self.num.one + spread))  # 多头止盈价
+        short_close_price = self.num.price(current_price * (self.num.one - spread)) # 空头止盈价
 
         orders.append(("sell_long", order_amount, long_close_price))   # 平多限价单
         orders.append(("buy_short", order_amount, short_close_price))  # 平空限价单
@@ -896,10 +1332,10 @@ class FastPerpetualStrategy:
         orders = []
 
         # ATR风控：使净持仓趋向0
-        if abs(net_position) < Decimal("0.001"):  # 净持仓已经很小
+        if abs(net_position) < self.config.balance_epsilon:  # 净持仓已经很小
             return []
 
-        balance_amount = abs(net_position) * Decimal("0.5")  # 每次平衡50%
+        balance_amount = abs(net_position) * self.config.balance_fraction  # 每次平衡50%
 
         if net_position > 0:  # 多头过多
             # 只平多或开空
@@ -910,26 +1346,127 @@ class FastPerpetualStrategy:
 
         return orders
 
-    def get_current_atr(self) -> Decimal:
-        """获取当前ATR占比(0-1)，根据VolatilityMonitor计算的ATR与收盘价"""
-        monitor = getattr(self.exchange, "volatility_monitor", None)
-        if not monitor or not getattr(monitor, "atr_values", None) or not getattr(monitor, "price_history", None):
-            return Decimal("0")
-        if not monitor.atr_values or not monitor.price_history:
-            return Decimal("0")
-
-        current_atr = monitor.atr_values[-1]  # float
-        current_close = monitor.price_history[-1][3]  # float (close)
-        if not current_close or current_close <= 0:
-            return Decimal("0")
+    # ------------------ 事件驱动引擎用：静默区间推导 ------------------
+    def in_balance_regime(self) -> bool:
+        """当前ATR是否处于仓位平衡模式 (与 generate_orders 的判断一致)"""
+        return self.get_current_atr() >= self.config.atr_threshold
+
+    def balance_regime_flags(self, atrs: np.ndarray, closes: np.ndarray) -> np.ndarray:
+        """批量计算每根K线收盘后是否处于仓位平衡模式 (与 in_balance_regime 的判断一致)"""
+        threshold = self.config.atr_threshold_float
+        ratios = np.zeros(len(closes))
+        valid = ~np.isnan(atrs) & (closes > 0)
+        ratios[valid] = atrs[valid] / closes[valid]
+        return ratios >= threshold
+
+    def is_balance_idle(self) -> bool:
+        """平衡模式下 generate_balance_orders 是否必然返回空 (与价格无关)"""
+        return abs(self.exchange.get_net_position()) < self.config.balance_epsilon
+
+    def on_bars_skipped(self, last_kline_timestamp: int, balance_regime: bool):
+        """跳过静默K线后同步 last_order_time (非对冲模式下 generate_orders 每个可下单子tick都会刷新它)"""
+        if self.config.hedge_mode or balance_regime:
+            return
+        last_sub_timestamp = last_kline_timestamp + 4 * 12
+        if last_sub_timestamp > 2147483647 or last_sub_timestamp < 0:
+            last_sub_timestamp = last_kline_timestamp
+        self.last_order_time = last_sub_timestamp
+
+    def hedge_idle_price_band(self, center: float) -> Optional[tuple]:
+        """🚀 返回包含 center 的价格开区间 (lo, hi)，区间内 generate_hedge_orders 必然因保证金不足返回空
+
+        在每个杠杆档位内: 权益 E、可用保证金 A、目标开仓价值 T=min(ratio·E, lev·A)
+        都是价格的线性函数，所需保证金 = 2/lev · clamp(T, min·p, max·p)，
+        因此 g(p) = 所需保证金 - A 是分段线性函数，只需在折点处检查符号。
+        无法证明静默时返回 None。
+        """
+        exchange = self.exchange
+        config = self.config
+        if not config.hedge_mode:
+            return 0.0, float("inf")
+
+        long_pos, short_pos = exchange.long_position, exchange.short_position
+        k = float(exchange.balance - long_pos * exchange.long_entry_price + short_pos * exchange.short_entry_price)
+        n = float(long_pos - short_pos)
+        entry_value = float(long_pos * exchange.long_entry_price + short_pos * exchange.short_entry_price)
+        total_pos = float(long_pos + short_pos)
+        leverage = float(config.leverage)
+        ratio = float(config.position_size_ratio)
+        min_amount = float(config.min_order_amount)
+        max_amount = float(config.max_order_amount)
+        if leverage <= 0 or center <= 0:
+            return None
+
+        # 杠杆档位 (按总持仓价值) → 每档已用保证金为常数
+        tier_bounds = []
+        used_by_tier = []
+        for threshold, max_leverage, _, _ in exchange.leverage_tiers:
+            effective_leverage = min(max_leverage, config.leverage)
+            used_by_tier.append(entry_value / effective_leverage if effective_leverage else 0.0)
+            tier_bounds.append(float(threshold) / total_pos if total_pos > 0 else float("inf"))
+
+        def tier_of(price: float) -> int:
+            for idx, bound in enumerate(tier_bounds):
+                if price <= bound:
+                    return idx
+            return len(tier_bounds) - 1
+
+        def g(price: float, tier: int) -> float:
+            available = k - used_by_tier[tier] + n * price
+            target = min(ratio * (k + n * price), leverage * available)
+            required = 2.0 * max(min_amount * price, min(max_amount * price, target)) / leverage
+            return required - available
+
+        tol = 1e-9 * (abs(k) + entry_value + total_pos * center + 1.0)
+        if g(center, tier_of(center)) <= tol:
+            return None
+
+        # 折点: 档位边界 + 各线性分量两两相交处
+        breakpoints = {bound for bound in tier_bounds if 0 < bound < float("inf")}
+        for tier, used in enumerate(used_by_tier):
+            lines = [(ratio * k, ratio * n), (leverage * (k - used), leverage * n), (0.0, min_amount), (0.0, max_amount)]
+            lo_bound = tier_bounds[tier - 1] if tier > 0 else 0.0
+            for a_idx in range(len(lines)):
+                for b_idx in range(a_idx + 1, len(lines)):
+                    (a1, b1), (a2, b2) = lines[a_idx], lines[b_idx]
+                    if b1 != b2:
+                        cross = (a2 - a1) / (b1 - b2)
+                        if lo_bound < cross <= tier_bounds[tier]:
+                            breakpoints.add(cross)
+        tier_bound_set = set(tier_bounds)
+
+        def scan(points, upward: bool) -> float:
+            prev_price, prev_g = center, g(center, tier_of(center))
+            for point in points:
+                tier = tier_of(point)
+                below = g(point, tier)
+                above = g(point, min(tier + 1, len(tier_bounds) - 1)) if point in tier_bound_set else below
+                arriving, leaving = (below, above) if upward else (above, below)
+                if arriving <= tol:
+                    # 线性段内插出零点
+                    return prev_price + (point - prev_price) * prev_g / (prev_g - arriving)
+                if leaving <= tol:
+                    return point
+                prev_price, prev_g = point, leaving
+            # 最后一段延伸到无穷远: 用远处一点判断斜率方向
+            far = prev_price * 1000.0 if upward else prev_price / 1000.0
+            far_g = g(far, tier_of(far))
+            if far_g <= tol:
+                return prev_price + (far - prev_price) * prev_g / (prev_g - far_g)
+            return far
+
+        hi = scan(sorted(p for p in breakpoints if p > center), upward=True)
+        lo = scan(sorted((p for p in breakpoints if 0 < p < center), reverse=True), upward=False)
+        return lo, hi
 
-        ratio = current_atr / current_close  # 例如0.30表示30%
-        return Decimal(str(ratio))
+    def get_current_atr(self) -> Decimal:
+        """获取当前ATR占比(0-1)，读取本根K线的波动率快照 (VolatilityMonitor 的 ATR / 收盘价)"""
+        return self.exchange.get_volatility_state().atr_ratio
 
 # =====================================================================================
 # 恢复K线价格轨迹
 # =====================================================================================
-def get_price_trajectory(row: pd.Series, prev_close: float) -> List[tuple]:
+def get_price_trajectory(row: "pd.Series", prev_close: float) -> List[tuple]:
     """
     根据K线数据生成价格轨迹
     阳线: curr_price -> open -> low -> high -> close
@@ -1010,7 +1547,7 @@ def get_price_trajectory_vectorized(o: float, h: float, l: float, c: float, prev
 # =====================================================================================
 # 新增：返佣计算功能
 # =====================================================================================
-def calculate_monthly_rebates_from_trades(trade_history: List[dict]) -> List[tuple]:
+def calculate_monthly_rebates_from_trades(trade_history: List[dict], rebate_params: Optional[Dict] = None) -> List[tuple]:
     """
     基于真实交易记录计算每月19号的返佣金额（人民币）
     返佣周期：上个月18号到这个月18号的手续费
@@ -1021,16 +1558,18 @@ def calculate_monthly_rebates_from_trades(trade_history: List[dict]) -> List[tup
     Returns:
         [(timestamp, rebate_amount_rmb), ...] 每月19号的返佣数据点
     """
-    if not trade_history or not REBATE_CONFIG["use_fee_rebate"]:
+    if rebate_params is None:
+        rebate_params = REBATE_CONFIG
+    if not trade_history or not rebate_params["use_fee_rebate"]:
         return []
 
     import datetime
     from collections import defaultdict
 
     # 返佣配置
-    rebate_rate = float(REBATE_CONFIG["rebate_rate"])  # 30%返佣率
-    usd_to_rmb = REBATE_CONFIG["usd_to_rmb_rate"]     # 美元兑人民币汇率
-    payout_day = REBATE_CONFIG["rebate_payout_day"]   # 19号发放
+    rebate_rate = float(rebate_params["rebate_rate"])  # 30%返佣率
+    usd_to_rmb = rebate_params["usd_to_rmb_rate"]     # 美元兑人民币汇率
+    payout_day = rebate_params["rebate_payout_day"]   # 19号发放
 
     # 按返佣周期统计手续费
     period_fees = defaultdict(float)  # {payout_timestamp: total_fees}
@@ -1106,7 +1645,8 @@ def analyze_and_plot_performance(
     profitable_trades: int = 0,
     total_trade_pairs: int = 0,
     progress_reporter=None,
-    trade_history: Optional[List[dict]] = None
+    trade_history: Optional[List[dict]] = None,
+    rebate_params: Optional[Dict] = None
 ) -> Dict:
     import pandas as pd
     # total_funding参数保留用于未来扩展，当前版本暂不使用
@@ -1122,7 +1662,12 @@ def analyze_and_plot_performance(
     if progress_reporter:
         progress_reporter.update(96, 100, "处理权益数据...")
 
-    df = pd.DataFrame(equity_history, columns=['timestamp', 'equity'])
+    if isinstance(equity_history, EquityRecorder):
+        # 直接使用记录器的数组，不再经过 Python 元组
+        equity_timestamps, equity_values = equity_history.to_arrays()
+        df = pd.DataFrame({'timestamp': equity_timestamps, 'equity': equity_values})
+    else:
+        df = pd.DataFrame(equity_history, columns=['timestamp', 'equity'])
 
     # 🚀 修复时间戳溢出问题：过滤异常时间戳
     df = df[df['timestamp'] <= 2147483647]  # 2038年问题边界
@@ -1212,6 +1757,8 @@ def analyze_and_plot_performance(
         output_path = EQUITY_OUTPUT_DIR / f"{base_name}_{timestamp}{param_str}.png"
         print(f"\n正在绘制资金曲线图并保存至: {output_path}")
         
+        import matplotlib.pyplot as plt
+
         # 🚀 使用英文字体，避免中文显示问题
         plt.rcParams['font.family'] = 'sans-serif'
         plt.rcParams['font.sans-serif'] = ['Arial', 'DejaVu Sans', 'Liberation Sans']
@@ -1248,7 +1795,7 @@ def analyze_and_plot_performance(
 
         # 计算月返佣数据（每月19号发放，基于上月18号到本月18号的真实手续费）
         if trade_history:
-            monthly_rebates_rmb = calculate_monthly_rebates_from_trades(trade_history)
+            monthly_rebates_rmb = calculate_monthly_rebates_from_trades(trade_history, rebate_params)
         else:
             # 没有交易历史时，不显示返佣数据
             monthly_rebates_rmb = []
@@ -1298,32 +1845,52 @@ def analyze_and_plot_performance(
 # 数据预处理缓存系统
 # =====================================================================================
 def get_data_cache_key(data_file_path: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
-    """生成数据缓存的唯一键"""
+    """
+    生成数据缓存的唯一键
+    全量数据: 每个数据文件一个固定的键 (条目中记录数据源指纹，加载时校验，数据文件追加后增量扩展)
+    时间段:   键中包含数据源内容指纹，数据文件变化后旧的时间段缓存自然失效
+    """
     # 🚀 优化：为全量数据生成统一的缓存键
     if start_date is None and end_date is None:
         key_string = f"{data_file_path}_FULL_DATASET"
     else:
         key_string = f"{data_file_path}_{start_date}_{end_date}"
+        fingerprint = source_fingerprint(data_file_path)
+        if fingerprint is not None:
+            key_string += f"_{fingerprint_digest(fingerprint)}"
     return hashlib.md5(key_string.encode()).hexdigest()
 
 def load_preprocessed_data(cache_key: str) -> Optional[tuple]:
-    """加载预处理的数据缓存"""
-    cache_file = CACHE_DIR / f"preprocessed_data_{cache_key}.pkl"
-    if cache_file.exists():
+    """
+    加载预处理的数据缓存 (列式 .npy，只读内存映射，不把整个文件读入内存)
+    只有旧版 pickle 缓存时读取一次并转换为列式格式
+    """
+    loaded = get_kline_cache(CACHE_DIR).load(cache_key)
+    if loaded is not None:
+        timestamps, ohlc_data, manifest = loaded
+        return timestamps, ohlc_data, manifest["rows"], manifest["start_date"], manifest["end_date"]
+
+    legacy_file = CACHE_DIR / f"preprocessed_data_{cache_key}.pkl"
+    if legacy_file.exists():
         try:
-            with cache_file.open('rb') as f:
-                return pickle.load(f)
+            with legacy_file.open('rb') as f:
+                data = pickle.load(f)
         except Exception as e:
             print(f"⚠️ 缓存加载失败: {e}")
+            return None
+        print("🔄 转换旧版 pickle 缓存为列式格式...")
+        save_preprocessed_data(cache_key, data)
+        return data
     return None
 
-def save_preprocessed_data(cache_key: str, data: tuple):
-    """保存预处理的数据缓存"""
-    cache_file = CACHE_DIR / f"preprocessed_data_{cache_key}.pkl"
+def save_preprocessed_data(cache_key: str, data: tuple, **metadata):
+    """保存预处理的数据缓存 (列式 .npy + JSON 清单，清单中记录数据内容指纹和 metadata)"""
+    timestamps, ohlc_data, _, start_date_str, end_date_str = data
     try:
-        with cache_file.open('wb') as f:
-            pickle.dump(data, f)
-        print(f"✅ 预处理数据已缓存到: {cache_file}")
+        entry_dir = get_kline_cache(CACHE_DIR).save(
+            cache_key, timestamps, ohlc_data, start_date=start_date_str, end_date=end_date_str,
+            fingerprint=dataset_fingerprint(timestamps, ohlc_data), **metadata)
+        print(f"✅ 预处理数据已缓存到: {entry_dir}")
     except Exception as e:
         print(f"⚠️ 缓存保存失败: {e}")
 
@@ -1340,302 +1907,580 @@ def run_backtest_with_params(strategy_params: Optional[Dict] = None, market_para
     Returns:
         回测结果字典
     """
-    # 备份原始配置
-    original_strategy = STRATEGY_CONFIG.copy()
-    original_market = MARKET_CONFIG.copy()
-    original_backtest = BACKTEST_CONFIG.copy()
+    # 分离时间参数和策略参数
+    strategy_overrides = {}
+    backtest_overrides = {}
+    for key, value in (strategy_params or {}).items():
+        if key in ['start_date', 'end_date']:
+            backtest_overrides[key] = value
+        else:
+            strategy_overrides[key] = value
+    backtest_overrides.update(backtest_params or {})
 
-    try:
-        # 应用参数覆盖
-        if strategy_params:
-            # 分离时间参数和策略参数
-            time_params = {}
-            pure_strategy_params = {}
-            for key, value in strategy_params.items():
-                if key in ['start_date', 'end_date']:
-                    time_params[key] = value
-                else:
-                    pure_strategy_params[key] = value
-
-            STRATEGY_CONFIG.update(pure_strategy_params)
-            if time_params:
-                BACKTEST_CONFIG.update(time_params)
-
-        if market_params:
-            MARKET_CONFIG.update(market_params)
-
-        if backtest_params:
-            BACKTEST_CONFIG.update(backtest_params)
-
-        # 运行回测
-        import asyncio
-        result = asyncio.run(run_fast_perpetual_backtest(use_cache=use_cache))
-        return result if result is not None else {}
-
-    finally:
-        # 恢复原始配置
-        STRATEGY_CONFIG.clear()
-        STRATEGY_CONFIG.update(original_strategy)
-        MARKET_CONFIG.clear()
-        MARKET_CONFIG.update(original_market)
-        BACKTEST_CONFIG.clear()
-        BACKTEST_CONFIG.update(original_backtest)
-
-def load_full_dataset_cache() -> Optional[tuple]:
-    """加载全量数据集缓存"""
-    cache_key = get_data_cache_key(BACKTEST_CONFIG["data_file_path"])
-    return load_preprocessed_data(cache_key)
-
-def save_full_dataset_cache(data: tuple):
-    """保存全量数据集缓存"""
-    cache_key = get_data_cache_key(BACKTEST_CONFIG["data_file_path"])
-    save_preprocessed_data(cache_key, data)
+    # 🚀 编译本次回测专用的不可变配置 (不再临时改写全局字典，可在同一进程内并发/交替运行)
+    config = build_backtest_config(strategy=strategy_overrides, market=market_params, backtest=backtest_overrides)
+
+    # 运行回测
+    import asyncio
+    result = asyncio.run(run_fast_perpetual_backtest(use_cache=use_cache, config=config))
+    return result if result is not None else {}
+
+def load_full_dataset_cache(data_file_path: Optional[str] = None) -> Optional[tuple]:
+    """
+    加载全量数据集缓存，并按数据源指纹校验:
+      - 数据文件大小和修改时间与记录一致 (不打开 H5)，或内容指纹一致: 直接使用
+      - 数据文件只在末尾追加了K线: 只读取新增的行，追加到缓存
+      - 其它变化: 删除缓存并返回 None (由调用方重新预处理)
+    数据文件不存在时直接使用缓存
+    """
+    data_file_path = data_file_path or BACKTEST_CONFIG["data_file_path"]
+    cache_key = get_data_cache_key(data_file_path)
+    full_cache = load_preprocessed_data(cache_key)
+    stat = source_stat(data_file_path)
+    if full_cache is None or stat is None:
+        return full_cache
+
+    kline_cache = get_kline_cache(CACHE_DIR)
+    source = (kline_cache.manifest(cache_key) or {}).get("source")
+    if source is not None and all(source.get(field) == value for field, value in stat.items()):
+        return full_cache
+    fingerprint = source_fingerprint(data_file_path)
+    if source is None:
+        # 旧缓存没有记录数据源指纹：行数和首尾时间戳一致时补记
+        timestamps = full_cache[0]
+        if (fingerprint["rows"] == len(timestamps) and len(timestamps)
+                and fingerprint["first_timestamp"] // 1000 == timestamps[0]
+                and fingerprint["last_timestamp"] // 1000 == timestamps[-1]):
+            kline_cache.update_manifest(cache_key, source=fingerprint)
+            return full_cache
+    elif same_content(source, fingerprint):
+        kline_cache.update_manifest(cache_key, source=fingerprint)
+        return full_cache
+    elif is_append_of(source, data_file_path, fingerprint):
+        print(f"➕ 数据文件新增 {fingerprint['rows'] - source['rows']} 行K线，追加到全量缓存...")
+        return _extend_full_dataset_cache(full_cache, data_file_path, source["rows"], fingerprint)
+
+    print("⚠️ 数据文件内容已变化，全量缓存失效")
+    kline_cache.remove(cache_key)
+    return None
+
+def _extend_full_dataset_cache(full_cache: tuple, data_file_path: str, cached_rows: int, fingerprint: Dict) -> tuple:
+    """把数据文件第 cached_rows 行之后的新K线追加到全量缓存"""
+    full_timestamps, full_ohlc_data, _, start_date_str, _ = full_cache
+    new_timestamps, new_ohlc_data = read_rows(data_file_path, cached_rows, fingerprint["rows"])
+    timestamps = np.concatenate([full_timestamps, new_timestamps])
+    ohlc_data = np.concatenate([full_ohlc_data, new_ohlc_data])
+    end_date_str = utc_datetime(timestamps[-1]).strftime('%Y-%m-%d')
+    data = (timestamps, ohlc_data, len(timestamps), start_date_str, end_date_str)
+    save_full_dataset_cache(data, data_file_path, source=fingerprint)
+    return data
+
+def save_full_dataset_cache(data: tuple, data_file_path: Optional[str] = None, source: Optional[Dict] = None):
+    """保存全量数据集缓存 (同时记录数据源指纹，source 为 None 时读取当前数据文件的指纹)"""
+    data_file_path = data_file_path or BACKTEST_CONFIG["data_file_path"]
+    cache_key = get_data_cache_key(data_file_path)
+    if source is None:
+        source = source_fingerprint(data_file_path)
+    if source is not None and source["rows"] != len(data[0]):
+        source = None  # 读取后数据文件又有变化，不记录指纹 (下次加载时按内容重新校验)
+    save_preprocessed_data(cache_key, data, **({"source": source} if source is not None else {}))
 
 def extract_time_range_from_cache(full_timestamps: np.ndarray, full_ohlc_data: np.ndarray,
-                                 start_date: Optional[str], end_date: Optional[str]) -> tuple:
-    """从全量缓存中提取指定时间段的数据"""
-    start_ts = int(pd.to_datetime(start_date).timestamp()) if start_date else full_timestamps[0]
-    end_ts = int(pd.to_datetime(end_date).timestamp()) if end_date else full_timestamps[-1]
+                                 start_date: Optional[str], end_date: Optional[str],
+                                 config: Optional[BacktestConfig] = None,
+                                 full_fingerprint: Optional[str] = None) -> tuple:
+    """
+    从全量缓存中提取指定时间段的数据 (时间段内没有数据时返回 None)
+    返回的是全量数组的切片视图 (全量缓存为内存映射时零拷贝，只读入该时间段的页)，不需要 pandas
+    full_fingerprint: 全量数据的内容指纹 (缓存清单中已有时传入，避免为计算指纹读遍全量数据)
+    """
+    if config is None:
+        config = build_backtest_config()
+    start_ts = utc_timestamp(start_date) if start_date else full_timestamps[0]
+    end_ts = utc_timestamp(end_date) if end_date else full_timestamps[-1]
 
     # 找到时间范围的索引
     start_idx = np.searchsorted(full_timestamps, start_ts)
     end_idx = np.searchsorted(full_timestamps, end_ts, side='right')
+    if end_idx <= start_idx:
+        return None
 
     # 提取子集
     subset_timestamps = full_timestamps[start_idx:end_idx]
     subset_ohlc_data = full_ohlc_data[start_idx:end_idx]
 
-    start_date_str = pd.to_datetime(subset_timestamps[0], unit='s').strftime('%Y-%m-%d')
-    end_date_str = pd.to_datetime(subset_timestamps[-1], unit='s').strftime('%Y-%m-%d')
+    # 🚀 特征库：直接从全量真实波幅前缀和切出时间段 ATR，无需重新计算
+    if config.atr_source == "feature_store":
+        get_feature_store(CACHE_DIR).extract_slice(
+            full_fingerprint or dataset_fingerprint(full_timestamps, full_ohlc_data), full_ohlc_data, int(start_idx), int(end_idx),
+            dataset_fingerprint(subset_timestamps, subset_ohlc_data), atr_feature_periods(config))
+
+    start_date_str = utc_datetime(subset_timestamps[0]).strftime('%Y-%m-%d')
+    end_date_str = utc_datetime(subset_timestamps[-1]).strftime('%Y-%m-%d')
 
     return subset_timestamps, subset_ohlc_data, len(subset_timestamps), start_date_str, end_date_str
 
-def preprocess_kline_data(test_data: pd.DataFrame, use_cache: bool = True) -> tuple:
+def load_time_range_from_full_cache(config: Optional[BacktestConfig] = None) -> Optional[tuple]:
+    """
+    缓存优先阶段：有全量缓存时直接切出配置的时间段 (内存映射视图)，不导入 pandas、不打开 H5 文件
+    没有全量缓存或缓存中没有该时间段的数据时返回 None
+    """
+    if config is None:
+        config = build_backtest_config()
+    data_file_path = config.backtest["data_file_path"]
+    full_cache = load_full_dataset_cache(data_file_path)
+    if full_cache is None:
+        return None
+    print("✅ 找到全量缓存，正在提取时间段...")
+    full_timestamps, full_ohlc_data, _, _, _ = full_cache
+    manifest = get_kline_cache(CACHE_DIR).manifest(get_data_cache_key(data_file_path)) or {}
+    return extract_time_range_from_cache(full_timestamps, full_ohlc_data, config.backtest.get("start_date"),
+                                         config.backtest.get("end_date"), config,
+                                         full_fingerprint=manifest.get("fingerprint"))
+
+def preprocess_kline_data(test_data: "pd.DataFrame", use_cache: bool = True,
+                          config: Optional[BacktestConfig] = None) -> tuple:
     """
-    🚀 优化版预处理：支持全量缓存 + 时间段提取
+    🚀 DataFrame -> 引擎数组 (向量化转换，timestamp 列为 datetime64 或秒级整数)，并保存缓存
     返回: (timestamps, ohlc_data, data_length, start_date_str, end_date_str)
     """
-    start_date = BACKTEST_CONFIG.get("start_date")
-    end_date = BACKTEST_CONFIG.get("end_date")
+    import pandas as pd
+
+    if config is None:
+        config = build_backtest_config()
 
     # 🚀 策略1：如果有时间段限制，尝试从全量缓存中提取
-    if use_cache and (start_date or end_date):
+    if use_cache and (config.backtest.get("start_date") or config.backtest.get("end_date")):
         print("🔍 检查全量数据缓存...")
-        full_cache = load_full_dataset_cache()
-        if full_cache is not None:
-            print("✅ 找到全量缓存，正在提取时间段...")
-            full_timestamps, full_ohlc_data, _, _, _ = full_cache
-            return extract_time_range_from_cache(full_timestamps, full_ohlc_data, start_date, end_date)
-
-    # 🚀 策略2：检查当前时间段的缓存
-    start_date_str = pd.to_datetime(test_data['timestamp'].iloc[0], unit='s').strftime('%Y-%m-%d')
-    end_date_str = pd.to_datetime(test_data['timestamp'].iloc[-1], unit='s').strftime('%Y-%m-%d')
-    cache_key = get_data_cache_key(BACKTEST_CONFIG["data_file_path"], start_date_str, end_date_str)
+        loaded = load_time_range_from_full_cache(config)
+        if loaded is not None:
+            return loaded
+
+    # 🚀 策略2：整列向量化转换 (秒级时间戳与逐行 int(Timestamp.timestamp()) 一致)
+    column = test_data['timestamp']
+    if pd.api.types.is_datetime64_any_dtype(column):
+        timestamps = column.to_numpy(dtype='datetime64[ns]').astype('datetime64[s]').astype(np.int64)
+    else:
+        timestamps = column.to_numpy().astype(np.int64)
+    ohlc_data = np.ascontiguousarray(test_data[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64))
+    return _store_ingested_data(timestamps, ohlc_data, use_cache, config)
+
+def _store_ingested_data(timestamps: np.ndarray, ohlc_data: np.ndarray, use_cache: bool,
+                         config: BacktestConfig) -> tuple:
+    """引擎数组 -> load_backtest_data 结果；全量数据保存为全量缓存 (并预计算特征)，时间段保存为时间段缓存"""
+    backtest_params = config.backtest
+    start_date_str = utc_datetime(timestamps[0]).strftime('%Y-%m-%d')
+    end_date_str = utc_datetime(timestamps[-1]).strftime('%Y-%m-%d')
+    result = (timestamps, ohlc_data, len(timestamps), start_date_str, end_date_str)
 
     if use_cache:
-        cached_data = load_preprocessed_data(cache_key)
-        if cached_data is not None:
-            print("✅ 使用时间段缓存数据")
-            return cached_data
-
-    # 🚀 策略3：重新预处理数据
-    print("🔄 开始预处理K线数据...")
-    data_length = len(test_data)
-
-    print("  📅 转换时间戳...")
-    timestamps = []
-    for i in tqdm(range(data_length), desc="时间戳转换", unit="行"):
-        row_timestamp = test_data.iloc[i]['timestamp']
-        if hasattr(row_timestamp, 'timestamp'):
-            kline_timestamp = int(row_timestamp.timestamp())
+        data_file_path = backtest_params["data_file_path"]
+        start_date, end_date = backtest_params.get("start_date"), backtest_params.get("end_date")
+        if start_date or end_date:
+            save_preprocessed_data(get_data_cache_key(data_file_path, start_date, end_date), result)
         else:
-            kline_timestamp = int(row_timestamp)
-        timestamps.append(kline_timestamp)
-    timestamps = np.array(timestamps)
+            # 🚀 全量数据保存为全量缓存，之后任意时间段都直接从中切片
+            print("💾 保存为全量数据缓存...")
+            save_full_dataset_cache(result, data_file_path)
+            if config.atr_source == "feature_store":
+                print("📈 预计算ATR特征...")
+                precompute_atr_features(timestamps, ohlc_data, config)
+    return result
 
-    print("  📊 转换OHLC数据...")
-    ohlc_data = test_data[['open', 'high', 'low', 'close']].values.astype(np.float64)
+def atr_feature_periods(config: Optional[BacktestConfig] = None) -> list:
+    """特征库需要预计算的 ATR 周期"""
+    if config is None:
+        return feature_periods(ATR_CONFIG["atr_period"], ATR_CONFIG.get("feature_periods"))
+    return feature_periods(config.atr_period, config.feature_periods)
 
-    result = (timestamps, ohlc_data, data_length, start_date_str, end_date_str)
+def precompute_atr_features(timestamps: np.ndarray, ohlc_data: np.ndarray,
+                            config: Optional[BacktestConfig] = None) -> Dict[int, np.ndarray]:
+    """一次向量化计算并持久化所有需要的 ATR 周期"""
+    return get_feature_store(CACHE_DIR).precompute(dataset_fingerprint(timestamps, ohlc_data), ohlc_data,
+                                                   atr_feature_periods(config))
 
-    # 保存缓存
+def load_atr_features(timestamps: np.ndarray, ohlc_data: np.ndarray, period: int) -> np.ndarray:
+    """读取 (或计算) 指定周期的特征矩阵: 第0行 ATR，第1行 ATR/收盘价"""
+    return get_feature_store(CACHE_DIR).atr_features(dataset_fingerprint(timestamps, ohlc_data), ohlc_data, period)
+
+# =====================================================================================
+# 高性能主回测函数 (已更新)
+# =====================================================================================
+# 提供回测数据的阶段
+DATA_STAGES = {
+    "full_cache": "全量缓存切片 (未读取 H5)",
+    "range_cache": "时间段缓存",
+    "h5": "H5 文件 (向量化读取)",
+    "memory": "常驻内存数据集",
+    "preloaded": "调用方预先加载",
+}
+
+def load_backtest_data(use_cache: bool = True, config: Optional[BacktestConfig] = None) -> Optional[tuple]:
+    """
+    加载并预处理配置 (默认 BACKTEST_CONFIG) 指定时间范围的K线数据
+    返回: (timestamps, ohlc_data, data_length, start_date_str, end_date_str)，无数据时返回 None
+    """
+    return load_backtest_data_staged(use_cache, config)[0]
+
+def load_backtest_data_staged(use_cache: bool = True, config: Optional[BacktestConfig] = None) -> tuple:
+    """
+    按阶段加载回测数据，返回 (load_backtest_data 的结果, 提供数据的阶段 DATA_STAGES)
+    依次尝试: 全量缓存切片 (不导入 pandas、不打开 H5) -> 时间段缓存 -> 向量化读取 H5
+    """
+    if config is None:
+        config = build_backtest_config()
+    backtest_params = config.backtest
+    start_date, end_date = backtest_params.get("start_date"), backtest_params.get("end_date")
+    loaded, stage = None, "h5"
     if use_cache:
-        save_preprocessed_data(cache_key, result)
+        print("🔍 检查全量数据缓存...")
+        loaded, stage = load_time_range_from_full_cache(config), "full_cache"
+        if loaded is None and (start_date or end_date):
+            range_key = get_data_cache_key(backtest_params["data_file_path"], start_date, end_date)
+            loaded, stage = load_preprocessed_data(range_key), "range_cache"
+    if loaded is None:
+        loaded, stage = _load_h5_time_range(use_cache, config), "h5"
+    if loaded is not None:
+        print(f"📦 数据来源: {DATA_STAGES[stage]}")
+    return loaded, stage
+
+def _load_h5_time_range(use_cache: bool, config: BacktestConfig) -> Optional[tuple]:
+    """单遍向量化读取 H5 中配置的时间段 (不经过 DataFrame)，保存缓存后返回"""
+    backtest_params = config.backtest
+    start_date, end_date = backtest_params.get("start_date"), backtest_params.get("end_date")
+    print("📂 加载历史数据...")
+    timestamps, ohlc_data = read_time_range(backtest_params["data_file_path"],
+                                            utc_timestamp(start_date) if start_date else None,
+                                            utc_timestamp(end_date) if end_date else None)
+    if len(timestamps) == 0:
+        print("❌ 错误: 没有找到指定时间范围内的数据!")
+        return None
 
-        # 🚀 如果是全量数据，也保存为全量缓存
-        if not start_date and not end_date:
-            print("💾 保存为全量数据缓存...")
-            save_full_dataset_cache(result)
+    print(f"✓ 加载了 {len(timestamps)} 条K线数据")
+    return _store_ingested_data(timestamps, ohlc_data, use_cache, config)
 
-    return result
+def simulate_klines(exchange: FastPerpetualExchange, strategy: FastPerpetualStrategy,
+                    timestamps: np.ndarray, ohlc_data: np.ndarray, progress: Optional[ProgressSink] = None,
+                    engine_mode: Optional[str] = None, checkpoints=None, pruner=None) -> Dict:
+    """
+    🚀 回测主循环：逐根K线按5点价格轨迹撮合
+    engine_mode="event" 时先用 BarSkipper 跳过不可能产生事件的K线 (结果与逐根模式逐位一致)
+    checkpoints: CheckpointSession，开始时从最新的有效快照恢复，之后按间隔和结束时保存快照
+    pruner: 扫参剪枝检查 (每 pruner.check_every 根K线调用 pruner.check(i, exchange)，返回真值时提前终止)
+    progress: 进度事件接收器 (progress.ProgressSink，按墙钟时间节流)
+    返回: {"liquidated": bool, "stopped_by_risk": bool, "pruned": bool, "engine_stats": dict}
+    """
+    config = exchange.config
+    if engine_mode is None:
+        engine_mode = config.engine_mode
+    if engine_mode not in ("bar", "event"):
+        raise ValueError(f"未知的引擎模式: {engine_mode}")
+    atr_source = config.atr_source
+    if atr_source not in ("monitor", "feature_store"):
+        raise ValueError(f"未知的ATR来源: {atr_source}")
+    monitor = exchange.volatility_monitor
+    if atr_source == "feature_store" and monitor is not None and not isinstance(monitor, PrecomputedVolatilityMonitor):
+        exchange.use_precomputed_atr(load_atr_features(timestamps, ohlc_data, monitor.atr_period)[0])
+
+    skipper = None
+    # 止损/风控需要逐根检查，开启时退回逐根模式
+    if engine_mode == "event" and not config.enable_stop_loss and not config.enable_position_stop_loss:
+        from event_engine import BarSkipper
+        skipper = BarSkipper(exchange, strategy, timestamps, ohlc_data)
+
+    num = exchange.num
+    data_length = len(timestamps)
+    initial_balance = num.num(config.initial_balance)
+    prev_close = ohlc_data[0][3]  # 使用第一行的收盘价
+
+    liquidated = False
+    stopped_by_risk = False
+    peak_equity = initial_balance
+
+    i = 0
+    # ♻️ 从快照恢复：只模拟快照之后新增的K线
+    if checkpoints is not None:
+        resumed = checkpoints.resume(exchange, strategy)
+        if resumed is not None:
+            i = resumed["bar_index"]
+            prev_close = resumed["prev_close"]
+            peak_equity = resumed["peak_equity"]
+            liquidated = resumed["liquidated"]
+            stopped_by_risk = resumed["stopped_by_risk"]
+            if liquidated or stopped_by_risk:
+                i = data_length  # 已经爆仓/退场的回测不再继续
+
+    pruned = False
+    next_prune_check = i + pruner.check_every if pruner is not None else data_length
+    next_progress = progress.start(data_length, i) if progress is not None else data_length
+    while i < data_length:
+        if i >= next_progress:
+            next_progress = progress.update(i, exchange)
+        if checkpoints is not None and checkpoints.due(i):
+            checkpoints.save(i, exchange, strategy, {"prev_close": prev_close, "peak_equity": peak_equity,
+                                                     "liquidated": False, "stopped_by_risk": False})
+        if i >= next_prune_check:
+            next_prune_check = i + pruner.check_every
+            if pruner.check(i, exchange):
+                pruned = True  # ✂️ 扫参剪枝：结果已不可能进入前列，提前终止
+                break
+        if skipper is not None:
+            skipped = skipper.skip(i)
+            if skipped:
+                i += skipped
+                prev_close = ohlc_data[i - 1][3]
+                continue
+
+        # 直接从numpy数组访问，比pandas iloc更快
+        kline_timestamp = timestamps[i]
+        o, h, l, c = ohlc_data[i]
+
+        # 获取5点价格轨迹（向量化版本）
+        price_trajectory = get_price_trajectory_vectorized(o, h, l, c, prev_close)
+        
+        # 🚀 简化优化：减少检查频率但保持核心逻辑
+        for j, (price, high_since_open, low_since_open) in enumerate(price_trajectory):
+            sub_timestamp = kline_timestamp + j * 12 # 模拟K线内的时间流逝 (秒)
+
+            # 🚀 修复：确保时间戳在合理范围内
+            if sub_timestamp > 2147483647 or sub_timestamp < 0:
+                sub_timestamp = kline_timestamp
+            exchange.set_current_price(price)
+            current_price_num = exchange.current_price
+
+            # 🚀 修复：每个价格点都要检查爆仓！插针可能在任何点发生
+            if exchange.check_and_handle_liquidation(sub_timestamp):
+                liquidated = True
+                break
+
+            # 生成订单（保持策略核心逻辑）
+            orders = strategy.generate_orders(current_price_num, sub_timestamp)
+            if orders:
+                exchange.place_orders_batch(orders)
+
+            # 订单匹配 (使用当前价格点对应的最高/最低价)
+            exchange.fast_order_matching(num.price(high_since_open), num.price(low_since_open), sub_timestamp)
+
+        # K线结束，更新收盘价并记录权益
+        prev_close = c  # 使用当前K线的收盘价
+
+        # 🚀 新增：更新波动率监控
+        exchange.update_volatility_monitor(kline_timestamp, h, l, c)
+
+        # 🚀 修复：确保记录权益时的时间戳有效
+        if kline_timestamp <= 2147483647 and kline_timestamp >= 0:
+            exchange.record_equity(kline_timestamp)
+
+        # ======= 风险监控：最大回撤 / 最小权益 =======
+        if config.enable_stop_loss and not liquidated:
+            equity_now = exchange.get_equity()
+            if equity_now > peak_equity:
+                peak_equity = equity_now
+            drawdown_pct = (peak_equity - equity_now) / peak_equity if peak_equity > 0 else num.zero
+
+            if equity_now <= config.min_equity or drawdown_pct >= config.max_drawdown:
+                print("\n" + "!"*70)
+                print("⚠️ 触发止损/退场条件：")
+                if equity_now <= config.min_equity:
+                    print(f"   - 当前权益 {equity_now:.2f} USDT 低于阈值 {config.min_equity} USDT")
+                if drawdown_pct >= config.max_drawdown:
+                    print(f"   - 当前回撤 {drawdown_pct:.2%} 超过阈值 {config.max_drawdown:.0%}")
+                print("!"*70)
+                exchange.close_all_positions_market(kline_timestamp)
+                stopped_by_risk = True
+                break
+
+        if liquidated:
+            break # 停止处理后续所有K线
+        if stopped_by_risk:
+            break
+
+        i += 1
+
+    if checkpoints is not None and not pruned:
+        checkpoints.save(min(i, data_length), exchange, strategy,
+                         {"prev_close": prev_close, "peak_equity": peak_equity,
+                          "liquidated": liquidated, "stopped_by_risk": stopped_by_risk})
+
+    if progress is not None:
+        status = "liquidated" if liquidated else "stopped_by_risk" if stopped_by_risk else \
+            "pruned" if pruned else "completed"
+        progress.finish(min(i + 1, data_length) if liquidated or stopped_by_risk else min(i, data_length),
+                        exchange, status)
+
+    engine_stats = {"engine_mode": engine_mode, "total_bars": data_length,
+                    "volatility": exchange.get_volatility_stats()}
+    if checkpoints is not None:
+        engine_stats["resumed_from_bar"] = checkpoints.resumed_from
+    if skipper is not None:
+        engine_stats.update(skipper.stats)
+    return {"liquidated": liquidated, "stopped_by_risk": stopped_by_risk, "pruned": pruned,
+            "engine_stats": engine_stats}
 
 # =====================================================================================
-# 高性能主回测函数 (已更新)
+# 数值后端一致性报告 (Decimal 参考模式 vs 快速模式)
 # =====================================================================================
-async def run_fast_perpetual_backtest(use_cache: bool = True):
+def run_backtest_on_arrays(timestamps: np.ndarray, ohlc_data: np.ndarray,
+                           numeric_backend: Optional[NumericBackend] = None,
+                           config: Optional[BacktestConfig] = None,
+                           atr_features: Optional[Dict[int, np.ndarray]] = None, checkpoints=None,
+                           pruner=None) -> Dict:
+    """
+    在已加载的数组上运行一次回测，只返回核心统计 (不绘图、不做性能分析)
+    atr_features: 已预计算的 {atr_period: 特征矩阵} (例如共享内存数据集)，feature_store 模式下直接使用
+    checkpoints: 快照会话 (CheckpointSession / ForkSession)，未传入时按配置的 checkpoint_dir 创建
+    pruner: 扫参剪枝检查 (见 simulate_klines)
+    """
+    if config is None:
+        config = build_backtest_config(numeric_backend)
+    elif numeric_backend is not None:
+        config = config.replace(numeric_backend=numeric_backend)
+    exchange = FastPerpetualExchange(config.initial_balance, config=config)
+    strategy = FastPerpetualStrategy(exchange, config)
+    if (config.atr_source == "feature_store" and exchange.volatility_monitor is not None
+            and atr_features and config.atr_period in atr_features):
+        exchange.use_precomputed_atr(atr_features[config.atr_period][0])
+    if checkpoints is None:
+        checkpoints = open_checkpoint_session(config, timestamps, ohlc_data, verbose=False)
+    loop_state = simulate_klines(exchange, strategy, timestamps, ohlc_data, checkpoints=checkpoints, pruner=pruner)
+    final_equity = float(exchange.get_equity())
+    initial_balance = float(config.initial_balance)
+    _, equities = exchange.equity_history.to_arrays()
+    if len(equities):
+        peaks = np.maximum.accumulate(equities)
+        max_drawdown = float(np.max(np.where(peaks > 0, (peaks - equities) / np.where(peaks > 0, peaks, 1), 0.0)))
+    else:
+        max_drawdown = 0.0
+    return {
+        "numeric_backend": exchange.num.name,
+        "final_equity": final_equity,
+        "total_return": (final_equity - initial_balance) / initial_balance if initial_balance else 0.0,
+        "max_drawdown": max_drawdown,
+        "total_fees": float(exchange.total_fees_paid),
+        "total_trades": len(exchange.trade_history),
+        "win_rate": exchange.pair_stats.win_rate,
+        "profit_factor": exchange.pair_stats.profit_factor,
+        "liquidated": loop_state["liquidated"],
+        "stopped_by_risk": loop_state["stopped_by_risk"],
+    }
+
+def compare_numeric_backends(timestamps: np.ndarray, ohlc_data: np.ndarray,
+                             backends: tuple = ("decimal", "float64", "ticks"),
+                             config: Optional[BacktestConfig] = None) -> Dict:
+    """
+    用同一份数据分别在各数值后端上回测，并以 decimal 为基准统计偏差
+    返回: {"reference": ..., "results": {backend: stats}, "deviations": {backend: 偏差}, "max_deviation": {...}}
+    """
+    reference = run_backtest_on_arrays(timestamps, ohlc_data, get_numeric_backend("decimal"), config)
+    results = {"decimal": reference}
+    for name in backends:
+        if name not in results:
+            results[name] = run_backtest_on_arrays(timestamps, ohlc_data, get_numeric_backend(name), config)
+
+    deviations = {}
+    for name, stats in results.items():
+        equity_abs = abs(stats["final_equity"] - reference["final_equity"])
+        deviations[name] = {
+            "final_equity_abs": equity_abs,
+            "final_equity_rel": equity_abs / abs(reference["final_equity"]) if reference["final_equity"] else equity_abs,
+            "total_fees_abs": abs(stats["total_fees"] - reference["total_fees"]),
+            "trade_count_diff": abs(stats["total_trades"] - reference["total_trades"]),
+            "liquidation_match": stats["liquidated"] == reference["liquidated"],
+        }
+
+    max_deviation = {
+        key: max(dev[key] for dev in deviations.values())
+        for key in ("final_equity_abs", "final_equity_rel", "total_fees_abs", "trade_count_diff")
+    }
+    return {"reference": "decimal", "results": results, "deviations": deviations, "max_deviation": max_deviation}
+
+def print_numeric_parity_report(report: Dict):
+    """打印数值后端一致性报告"""
+    print("\n" + "="*70)
+    print("🔬 数值后端一致性报告 (基准: decimal)")
+    print("="*70)
+    print(f"{'后端':<10}{'最终权益':>16}{'总手续费':>14}{'交易数':>10}{'权益偏差':>14}{'手续费偏差':>14}{'交易数差':>8}")
+    for name, stats in report["results"].items():
+        dev = report["deviations"][name]
+        print(f"{name:<10}{stats['final_equity']:>16.6f}{stats['total_fees']:>14.6f}{stats['total_trades']:>10}"
+              f"{dev['final_equity_abs']:>14.3e}{dev['total_fees_abs']:>14.3e}{dev['trade_count_diff']:>8}")
+    max_dev = report["max_deviation"]
+    print("-"*70)
+    print(f"最大权益偏差: {max_dev['final_equity_abs']:.3e} USDT ({max_dev['final_equity_rel']:.3e})")
+    print(f"最大手续费偏差: {max_dev['total_fees_abs']:.3e} USDT")
+    print(f"最大交易数差: {max_dev['trade_count_diff']}")
+
+def run_numeric_parity_report(use_cache: bool = True, backends: tuple = ("decimal", "float64", "ticks")) -> Optional[Dict]:
+    """按 BACKTEST_CONFIG 加载数据并输出数值后端一致性报告"""
+    loaded = load_backtest_data(use_cache)
+    if loaded is None:
+        return None
+    timestamps, ohlc_data = loaded[0], loaded[1]
+    report = compare_numeric_backends(timestamps, ohlc_data, backends)
+    print_numeric_parity_report(report)
+    return report
+
+async def run_fast_perpetual_backtest(use_cache: bool = True, config: Optional[BacktestConfig] = None,
+                                      result_cache: Optional[ResultCache] = None, loaded: Optional[tuple] = None,
+                                      progress: Optional[ProgressSink] = None, data_stage: str = "preloaded"):
+    """
+    主回测函数
+    result_cache: 回测结果缓存 (None 不使用)
+    loaded: 预先加载好的 load_backtest_data 结果 (常驻回测服务复用已加载的数据，不再读取 H5)
+    progress: 主循环进度输出 (None 时按 progress_mode 配置创建)
+    data_stage: 传入 loaded 时提供数据的阶段 (写入结果的 data_stage 字段)
+    """
+    # 🚀 每次回测编译一份不可变配置 (未传入时取当前全局配置)
+    if config is None:
+        config = build_backtest_config()
+    strategy_params = config.strategy
+    backtest_params = config.backtest
+
     print("🚀 开始永续合约做市策略回测...")
     
     print("策略特点:")
-    print(f"  初始杠杆: {STRATEGY_CONFIG['leverage']}x (动态调整)")
-    print(f"  做市价差: ±{STRATEGY_CONFIG['bid_spread']*100:.3f}%")
-    print(f"  最大仓位价值比例: {STRATEGY_CONFIG['max_position_value_ratio']*100:.0f}% (完全动态计算)")
+    print(f"  初始杠杆: {strategy_params['leverage']}x (动态调整)")
+    print(f"  做市价差: ±{strategy_params['bid_spread']*100:.3f}%")
+    print(f"  最大仓位价值比例: {strategy_params['max_position_value_ratio']*100:.0f}% (完全动态计算)")
+    print(f"  数值后端: {config.numeric_backend_name}")
     
-    if STRATEGY_CONFIG["use_dynamic_order_size"]:
+    if strategy_params["use_dynamic_order_size"]:
         print(f"  动态下单: 每次下单占总权益的比例 = 1/当前杠杆 (自动调整)")
-        print(f"  下单范围: {STRATEGY_CONFIG['min_order_amount']:.3f} - {STRATEGY_CONFIG['max_order_amount']:.1f} ETH")
+        print(f"  下单范围: {strategy_params['min_order_amount']:.3f} - {strategy_params['max_order_amount']:.1f} ETH")
     print()
     
-    # 1. 快速加载数据
-    print("📂 加载历史数据...")
-    import h5py
-    with h5py.File(BACKTEST_CONFIG["data_file_path"], 'r') as f:
-        data = f['kline_data'][:]
-    # 假设数据列顺序为: timestamp, open, high, low, close, volume, ...
-    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'amount', 'quote_volume', 'quoteVolume', 'quote_asset_volume']
-    df = pd.DataFrame(data, columns=columns[:data.shape[1]])
-    # 确保timestamp列是datetime格式
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-
-    test_data = df
-    if BACKTEST_CONFIG.get("start_date"):
-        start_date = pd.to_datetime(BACKTEST_CONFIG["start_date"])
-        test_data = test_data[test_data['timestamp'] >= start_date]
-    if BACKTEST_CONFIG.get("end_date"):
-        end_date = pd.to_datetime(BACKTEST_CONFIG["end_date"])
-        test_data = test_data[test_data['timestamp'] < end_date]
-    test_data = test_data.copy()
-
-    if len(test_data) == 0:
-        print("❌ 错误: 没有找到指定时间范围内的数据!")
-        return
-
-    print(f"✓ 加载了 {len(test_data)} 条K线数据")
-
-    # 1.5. 预处理数据（带缓存）
-    # 确保test_data是DataFrame类型
-    if not isinstance(test_data, pd.DataFrame):
-        print("❌ 错误: 数据类型不正确!")
+    # 1. 快速加载数据 + 预处理（带缓存）
+    if loaded is None:
+        loaded, data_stage = load_backtest_data_staged(use_cache, config)
+    if loaded is None:
         return
-    timestamps, ohlc_data, data_length, start_date_str, end_date_str = preprocess_kline_data(test_data, use_cache)
+    timestamps, ohlc_data, data_length, start_date_str, end_date_str = loaded
     print(f"✓ 数据预处理完成，回测时间范围: {start_date_str} -> {end_date_str}")
+
+    # 🚀 结果缓存: 同样的配置 + 数据 + 引擎版本直接返回上次的结果
+    cache_key = None
+    if result_cache is not None:
+        cache_key = result_cache_key(config, dataset_fingerprint(timestamps, ohlc_data))
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ 命中回测结果缓存: {cache_key[:16]}")
+            return {**cached, "data_stage": data_stage}
     
     # 2. 初始化高性能组件
-    exchange = FastPerpetualExchange(initial_balance=BACKTEST_CONFIG["initial_balance"])
-    strategy = FastPerpetualStrategy(exchange)
+    exchange = FastPerpetualExchange(initial_balance=config.initial_balance, config=config)
+    strategy = FastPerpetualStrategy(exchange, config)
+    num = exchange.num
     
-    print(f"✓ 初始化完成，初始保证金: {BACKTEST_CONFIG['initial_balance']} USDT")
-    prev_close = ohlc_data[0][3]  # 使用第一行的收盘价
-
-    liquidated = False
-    stopped_by_risk = False
-    peak_equity = Decimal(str(BACKTEST_CONFIG["initial_balance"]))
-
-    # 🕒 添加时间估算变量
-    import time
-    start_time = time.time()
-    last_update_time = start_time
-    update_interval = 10000  # 每10000条更新一次时间估算
-
-    with tqdm(total=data_length, desc="回测进度", unit="K线") as pbar:
-        for i in range(data_length):
-            # 直接从numpy数组访问，比pandas iloc更快
-            kline_timestamp = timestamps[i]
-            o, h, l, c = ohlc_data[i]
-
-            # 获取5点价格轨迹（向量化版本）
-            price_trajectory = get_price_trajectory_vectorized(o, h, l, c, prev_close)
-            
-            # 🚀 简化优化：减少检查频率但保持核心逻辑
-            for j, (price, high_since_open, low_since_open) in enumerate(price_trajectory):
-                sub_timestamp = kline_timestamp + j * 12 # 模拟K线内的时间流逝 (秒)
-
-                # 🚀 修复：确保时间戳在合理范围内
-                if sub_timestamp > 2147483647 or sub_timestamp < 0:
-                    sub_timestamp = kline_timestamp
-                current_price_decimal = Decimal(str(price))
-                exchange.set_current_price(price)
-
-                # 🚀 修复：每个价格点都要检查爆仓！插针可能在任何点发生
-                if exchange.check_and_handle_liquidation(sub_timestamp):
-                    liquidated = True
-                    break
-
-                # 生成订单（保持策略核心逻辑）
-                orders = strategy.generate_orders(current_price_decimal, sub_timestamp)
-                if orders:
-                    exchange.place_orders_batch(orders)
-
-                # 订单匹配 (使用当前价格点对应的最高/最低价)
-                high_decimal = Decimal(str(high_since_open))
-                low_decimal = Decimal(str(low_since_open))
-                exchange.fast_order_matching(high_decimal, low_decimal, sub_timestamp)
-
-            # K线结束，更新收盘价并记录权益
-            prev_close = c  # 使用当前K线的收盘价
-
-            # 🚀 新增：更新波动率监控
-            exchange.update_volatility_monitor(kline_timestamp, h, l, c)
-
-            # 🚀 修复：确保记录权益时的时间戳有效
-            if kline_timestamp <= 2147483647 and kline_timestamp >= 0:
-                exchange.record_equity(kline_timestamp)
-
-            # ======= 风险监控：最大回撤 / 最小权益 =======
-            if RISK_CONFIG["enable_stop_loss"] and not liquidated:
-                equity_now = exchange.get_equity()
-                if equity_now > peak_equity:
-                    peak_equity = equity_now
-                drawdown_pct = (peak_equity - equity_now) / peak_equity if peak_equity > 0 else Decimal("0")
-
-                if equity_now <= RISK_CONFIG["min_equity"] or drawdown_pct >= RISK_CONFIG["max_drawdown"]:
-                    print("\n" + "!"*70)
-                    print("⚠️ 触发止损/退场条件：")
-                    if equity_now <= RISK_CONFIG["min_equity"]:
-                        print(f"   - 当前权益 {equity_now:.2f} USDT 低于阈值 {RISK_CONFIG['min_equity']} USDT")
-                    if drawdown_pct >= RISK_CONFIG["max_drawdown"]:
-                        print(f"   - 当前回撤 {drawdown_pct:.2%} 超过阈值 {RISK_CONFIG['max_drawdown']:.0%}")
-                    print("!"*70)
-                    exchange.close_all_positions_market(kline_timestamp)
-                    stopped_by_risk = True
-                    break
-
-            pbar.update(1)
-            
-            if liquidated:
-                break # 停止处理后续所有K线
-            if stopped_by_risk:
-                break
-
-            # 🚀 性能优化：大幅减少进度条更新频率，避免频繁的UI刷新
-            if i % 10000 == 0 and i > 0: # 进度条更新频率改为10000，减少50%的UI开销
-                current_balance = exchange.balance + exchange.get_unrealized_pnl()
-                pnl = current_balance - Decimal(str(BACKTEST_CONFIG["initial_balance"]))
-
-                # 🕒 计算预计完成时间
-                current_time = time.time()
-                elapsed_time = current_time - start_time
-                progress_ratio = i / data_length
-
-                if progress_ratio > 0:
-                    estimated_total_time = elapsed_time / progress_ratio
-                    remaining_time = estimated_total_time - elapsed_time
-                    remaining_minutes = int(remaining_time / 60)
-                    remaining_seconds = int(remaining_time % 60)
-
-                    if remaining_minutes > 0:
-                        time_str = f"还剩{remaining_minutes}分{remaining_seconds}秒"
-                    else:
-                        time_str = f"还剩{remaining_seconds}秒"
-                else:
-                    time_str = "计算中..."
-
-                pbar.set_postfix({
-                    '交易': len(exchange.trade_history),
-                    '盈亏': f'{pnl:.2f}U',
-                    '多仓': f'{exchange.long_position:.2f}',
-                    '空仓': f'{exchange.short_position:.2f}',
-                    '预计': time_str
-                })
+    print(f"✓ 初始化完成，初始保证金: {config.initial_balance} USDT")
+
+    # 3. 主循环 (终端里显示进度条，无终端时输出 JSON-lines 进度事件)
+    if progress is None:
+        progress = make_progress_sink(backtest_params.get("progress_mode", "auto"),
+                                      backtest_params.get("progress_interval", 0.5))
+    loop_state = simulate_klines(exchange, strategy, timestamps, ohlc_data, progress,
+                                 checkpoints=open_checkpoint_session(config, timestamps, ohlc_data))
+    liquidated = loop_state["liquidated"]
+    stopped_by_risk = loop_state["stopped_by_risk"]
     
     # 4. 输出最终结果
     print("\n" + "="*70)
@@ -1659,61 +2504,25 @@ async def run_fast_perpetual_backtest(use_cache: bool = True):
             leverage_info = f" [杠杆: {trade.get('leverage', 'N/A')}x]" if 'leverage' in trade else ""
             print(f"  {i}. {side_cn} {trade['amount']:.4f} ETH @ {trade['price']:.2f} USDT (手续费: {trade['fee']:.4f}){leverage_info}")
     
-    # 5. 先计算胜率，然后绘制性能指标
-    # 计算胜率的代码移到这里，以便传递给性能分析函数
-    win_rate_temp = 0.0
-    profitable_trades_temp = 0
-    total_trade_pairs_temp = 0
-
-    if len(exchange.trade_history) > 1:
-        # 对于做市策略，分析开仓和平仓配对
-        long_positions = []  # 记录多头开仓
-        short_positions = []  # 记录空头开仓
-
-        for trade in exchange.trade_history:
-            side = trade['side'].upper()
-            price = trade['price']
-            amount = trade['amount']
-
-            if side == 'BUY_LONG':
-                # 开多仓
-                long_positions.append({'price': price, 'amount': amount})
-            elif side == 'SELL_LONG' and long_positions:
-                # 平多仓，计算盈亏
-                if long_positions:
-                    open_trade = long_positions.pop(0)  # FIFO
-                    pnl = (price - open_trade['price']) * min(amount, open_trade['amount'])
-                    if pnl > 0:
-                        profitable_trades_temp += 1
-                    total_trade_pairs_temp += 1
-            elif side == 'SELL_SHORT':
-                # 开空仓
-                short_positions.append({'price': price, 'amount': amount})
-            elif side == 'BUY_SHORT' and short_positions:
-                # 平空仓，计算盈亏
-                if short_positions:
-                    open_trade = short_positions.pop(0)  # FIFO
-                    pnl = (open_trade['price'] - price) * min(amount, open_trade['amount'])
-                    if pnl > 0:
-                        profitable_trades_temp += 1
-                    total_trade_pairs_temp += 1
-
-        # 计算胜率
-        if total_trade_pairs_temp > 0:
-            win_rate_temp = profitable_trades_temp / total_trade_pairs_temp
+    # 5. 胜率来自成交时在线维护的 FIFO 开平仓配对
+    pair_stats = exchange.pair_stats
+    win_rate_temp = pair_stats.win_rate if len(exchange.trade_history) > 1 else 0.0
+    profitable_trades_temp = pair_stats.profitable_pairs
+    total_trade_pairs_temp = pair_stats.total_pairs
 
     performance_metrics = analyze_and_plot_performance(
         exchange.equity_history,
-        Decimal(str(BACKTEST_CONFIG["initial_balance"])),
+        Decimal(str(config.initial_balance)),
         exchange.total_fees_paid,
         Decimal("0"),  # 没有资金费率
-        BACKTEST_CONFIG,
-        STRATEGY_CONFIG,  # 传递策略参数
+        backtest_params,
+        strategy_params,  # 传递策略参数
         win_rate_temp,  # 传递胜率
         profitable_trades_temp,  # 传递盈利交易数
         total_trade_pairs_temp,  # 传递总交易对数
         None,  # progress_reporter
-        exchange.trade_history  # 🚀 传递真实交易历史用于返佣计算
+        exchange.trade_history,  # 🚀 传递真实交易历史用于返佣计算
+        config.rebate,
     )
 
     if stopped_by_risk:
@@ -1721,58 +2530,17 @@ async def run_fast_perpetual_backtest(use_cache: bool = True):
 
     # 返回回测结果
     final_equity = exchange.get_equity()
-    total_return = (final_equity - Decimal(str(BACKTEST_CONFIG["initial_balance"]))) / Decimal(str(BACKTEST_CONFIG["initial_balance"]))
+    initial_balance = num.num(config.initial_balance)
+    total_return = (final_equity - initial_balance) / initial_balance
 
-    # 🚀 计算胜率 - 基于做市策略的交易对分析
+    # 🚀 胜率 / 盈亏因子 / 平均持仓时间 - 直接读取在线配对统计 (O(1))
+    profitable_trades = pair_stats.profitable_pairs
+    total_trade_pairs = pair_stats.total_pairs
     win_rate = 0.0
-    profitable_trades = 0
-    total_trade_pairs = 0
 
     if len(exchange.trade_history) > 1:
-        # 对于做市策略，分析开仓和平仓配对
-        long_positions = []  # 记录多头开仓
-        short_positions = []  # 记录空头开仓
-
-        for trade in exchange.trade_history:
-            side = trade['side'].upper()
-            price = trade['price']
-            amount = trade['amount']
-            timestamp = trade.get('timestamp', 0)
-
-            if side == 'BUY_LONG':
-                # 开多仓
-                long_positions.append({
-                    'price': price,
-                    'amount': amount,
-                    'timestamp': timestamp
-                })
-            elif side == 'SELL_LONG' and long_positions:
-                # 平多仓，计算盈亏
-                if long_positions:
-                    open_trade = long_positions.pop(0)  # FIFO
-                    pnl = (price - open_trade['price']) * min(amount, open_trade['amount'])
-                    if pnl > 0:
-                        profitable_trades += 1
-                    total_trade_pairs += 1
-            elif side == 'SELL_SHORT':
-                # 开空仓
-                short_positions.append({
-                    'price': price,
-                    'amount': amount,
-                    'timestamp': timestamp
-                })
-            elif side == 'BUY_SHORT' and short_positions:
-                # 平空仓，计算盈亏
-                if short_positions:
-                    open_trade = short_positions.pop(0)  # FIFO
-                    pnl = (open_trade['price'] - price) * min(amount, open_trade['amount'])
-                    if pnl > 0:
-                        profitable_trades += 1
-                    total_trade_pairs += 1
-
-        # 计算胜率
         if total_trade_pairs > 0:
-            win_rate = profitable_trades / total_trade_pairs
+            win_rate = pair_stats.win_rate
         else:
             # 如果没有完整的交易对，基于总收益率估算胜率
             if total_return > 0:
@@ -1800,17 +2568,10 @@ async def run_fast_perpetual_backtest(use_cache: bool = True):
             "leverage": trade.get('leverage', 'N/A')
         })
 
-    # 计算平均持仓时间（基于交易历史）
-    avg_holding_time = 0
-    if len(exchange.trade_history) > 1:
-        # 简化计算：基于交易历史的时间跨度
-        first_trade_time = exchange.trade_history[0].get('timestamp', 0)
-        last_trade_time = exchange.trade_history[-1].get('timestamp', 0)
-        if last_trade_time > first_trade_time and total_trade_pairs > 0:
-            total_hours = (last_trade_time - first_trade_time) / 3600
-            avg_holding_time = total_hours / total_trade_pairs
+    # 平均持仓时间：每个开平仓对从开仓到平仓的平均小时数
+    avg_holding_time = pair_stats.avg_holding_hours
 
-    return {
+    result = {
         "final_equity": float(final_equity),
         "total_return": float(total_return),
         "total_trades": len(exchange.trade_history),
@@ -1824,12 +2585,17 @@ async def run_fast_perpetual_backtest(use_cache: bool = True):
         "win_rate": float(win_rate),  # 🚀 添加胜率指标
         "profitable_trades": profitable_trades,  # 盈利交易数
         "total_trade_pairs": total_trade_pairs,  # 总交易对数
+        "profit_factor": float(pair_stats.profit_factor),  # 🚀 盈亏因子
         "max_drawdown": performance_metrics.get("max_drawdown", 0.0),  # 🚀 添加最大回撤
         "sharpe_ratio": performance_metrics.get("sharpe_ratio", 0.0),  # 🚀 添加夏普比率
         "avg_holding_time": float(avg_holding_time),  # 🚀 添加平均持仓时间（小时）
         "trades": trades_for_visualization,  # 🚀 添加交易数据供可视化使用
-        "equity_history": [(timestamp, float(equity)) for timestamp, equity in exchange.equity_history]  # 权益曲线
+        "equity_history": list(exchange.equity_history)  # 权益曲线 [(timestamp, equity), ...]
     }
+    if cache_key is not None:
+        result_cache.put(cache_key, result)
+    result["data_stage"] = data_stage  # 提供数据的阶段 (不写入结果缓存)
+    return result
 
 # =====================================================================================
 # 主函数入口移至文件末尾
@@ -1895,8 +2661,10 @@ def calculate_simple_performance_metrics(equity_history, initial_balance, total_
 # 支持进度回调的回测函数
 # =====================================================================================
 
-async def run_fast_perpetual_backtest_with_progress(progress_reporter=None):
-    """🎯 带进度报告的回测函数 - 直接调用主回测函数确保结果一致"""
+async def run_fast_perpetual_backtest_with_progress(progress_reporter=None, config: Optional[BacktestConfig] = None,
+                                                    use_result_cache: bool = True, loaded: Optional[tuple] = None,
+                                                    progress: Optional[ProgressSink] = None, data_stage: str = "preloaded"):
+    """🎯 带进度报告的回测函数 - 直接调用主回测函数确保结果一致 (默认启用回测结果缓存)"""
 
     if progress_reporter:
         progress_reporter.update(10, 100, "初始化回测环境...")
@@ -1908,7 +2676,11 @@ async def run_fast_perpetual_backtest_with_progress(progress_reporter=None):
             progress_reporter.update(30, 100, "开始执行回测...")
 
         # 🎯 关键改进：直接调用主回测函数，确保逻辑完全一致
-        result = await run_fast_perpetual_backtest(use_cache=True)
+        if config is None:
+            config = build_backtest_config()
+        result_cache = get_result_cache() if use_result_cache else None
+        result = await run_fast_perpetual_backtest(use_cache=True, config=config, result_cache=result_cache,
+                                                   loaded=loaded, progress=progress, data_stage=data_stage)
 
         if progress_reporter:
             progress_reporter.update(90, 100, "处理回测结果...")
@@ -1923,7 +2695,7 @@ async def run_fast_perpetual_backtest_with_progress(progress_reporter=None):
             "symbol": "ETHUSDT",
             "start_date": str(result.get("start_date", "")),
             "end_date": str(result.get("end_date", "")),
-            "initial_capital": float(BACKTEST_CONFIG["initial_balance"]),
+            "initial_capital": float(config.initial_balance),
             "final_equity": float(result.get("final_equity", 0)),
             "total_return": float(result.get("total_return", 0)),
             "total_trades": int(result.get("total_trades", 0)),
@@ -1932,6 +2704,7 @@ async def run_fast_perpetual_backtest_with_progress(progress_reporter=None):
             "sharpe_ratio": float(result.get("sharpe_ratio", 0)),
             "liquidated": bool(result.get("liquidated", False)),
             "avg_holding_time": float(result.get("avg_holding_time", 0)),
+            "data_stage": str(result.get("data_stage", "")),
             "trades": [
                 {k: (int(v) if isinstance(v, (int, np.integer)) else
                      float(v) if isinstance(v, (float, Decimal, np.floating)) else
@@ -0,0 +1,404 @@
+"""
+锁步批量回测引擎 - 一次遍历数据同时模拟多组参数
+
+只在 spread / leverage / position_size_ratio / atr_threshold 上不同的参数组合，
+重放的是完全相同的价格轨迹和 ATR 序列。BatchedBacktest 把 N 组参数的交易所状态
+(余额、多空仓位、开仓均价、挂单) 保存为长度 N 的 NumPy 向量，每个轨迹点对所有参数组
+一起做向量化的爆仓检查、下单、撮合、手续费/返佣和阶梯保证金计算。
+
+每一组 (lane) 的运算顺序与 FastPerpetualExchange / FastPerpetualStrategy 完全相同，
+因此单组结果与标量引擎 (float64 / ticks 后端、逐根模式) 逐位一致。
+
+适用范围 (不满足时抛出 ValueError):
+  - float 类数值后端 (float64 / ticks)
+  - 未启用单笔止损 (enable_position_stop_loss) 和风控退场 (RISK_CONFIG.enable_stop_loss)
+  - 参数组之间只允许 BATCH_PARAMS 中的策略参数不同
+"""
+
+import calendar
+import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backtest_config import BacktestConfig
+from feature_store import atr_ratios
+from trade_log import FifoPairStats
+
+BATCH_PARAMS = ("spread", "leverage", "position_size_ratio", "atr_threshold")
+MAX_TIMESTAMP = 2147483647
+
+# 订单槽位 (对冲开仓一次挂出的4个订单，按挂单顺序编号，同价位先挂先成交)
+SLOT_BUY_LONG, SLOT_SELL_SHORT, SLOT_SELL_LONG, SLOT_BUY_SHORT = range(4)
+SLOT_SIDES = ("buy_long", "sell_short", "sell_long", "buy_short")
+
+
+class _RebateCalendar:
+    """返佣发放日 (每月 payout_day 日 00:00 UTC)，按 year*12+month-1 的月序号缓存时间戳"""
+
+    def __init__(self, payout_day: int):
+        self.payout_day = payout_day
+        self._cache: Dict[int, int] = {}
+
+    def payout_timestamp(self, month_index: int) -> int:
+        ts = self._cache.get(month_index)
+        if ts is None:
+            year, month = divmod(month_index, 12)
+            ts = calendar.timegm((year, month + 1, self.payout_day, 0, 0, 0))
+            self._cache[month_index] = ts
+        return ts
+
+    def initial_month(self, timestamp: int) -> int:
+        """与 process_fee_rebate 首次调用一致：回测开始前最后一个发放日所在月"""
+        current = datetime.datetime.utcfromtimestamp(timestamp)
+        month_index = current.year * 12 + current.month - 1
+        return month_index - 1 if timestamp < self.payout_timestamp(month_index) else month_index
+
+
+class BatchedBacktest:
+    """N 组参数锁步回测"""
+
+    def __init__(self, base_config: BacktestConfig, lane_params: List[Dict], track_pairs: bool = True,
+                 keep_equity_curve: bool = False):
+        if not lane_params:
+            raise ValueError("至少需要一组参数")
+        if not isinstance(base_config.num.zero, float):
+            raise ValueError("批量引擎只支持 float 类数值后端 (float64 / ticks)")
+        if base_config.enable_position_stop_loss or base_config.enable_stop_loss:
+            raise ValueError("批量引擎不支持单笔止损和风控退场，请使用标量引擎")
+        for params in lane_params:
+            unknown = set(params) - set(BATCH_PARAMS)
+            if unknown:
+                raise ValueError(f"批量引擎只能在 {', '.join(BATCH_PARAMS)} 上变化，收到: {', '.join(sorted(unknown))}")
+
+        self.base_config = base_config
+        self.configs = [base_config.replace(strategy=params) for params in lane_params]
+        self.lane_params = [dict(params) for params in lane_params]
+        self.track_pairs = track_pairs
+        self.keep_equity_curve = keep_equity_curve
+        self.num = base_config.num
+
+        configs = self.configs
+        self.spread = np.array([c.spread for c in configs], dtype=np.float64)
+        self.leverage = np.array([c.leverage for c in configs], dtype=np.int64)
+        self.leverage_num = np.array([c.leverage_num for c in configs], dtype=np.float64)
+        self.position_size_ratio = np.array([c.position_size_ratio for c in configs], dtype=np.float64)
+        self.atr_threshold = np.array([c.atr_threshold for c in configs], dtype=np.float64)
+
+        tiers = base_config.leverage_tiers
+        self.tier_thresholds = np.array([float(t[0]) for t in tiers])
+        self.tier_max_leverage = np.array([t[1] for t in tiers], dtype=np.int64)
+        self.tier_mm_rate = np.array([float(t[2]) for t in tiers])
+        self.tier_mm_amount = np.array([float(t[3]) for t in tiers])
+        self.rebate_calendar = _RebateCalendar(base_config.rebate_payout_day)
+
+    # ------------------ 状态 ------------------
+    def _reset(self):
+        n = len(self.configs)
+        initial = self.num.num(self.base_config.initial_balance)
+        self.balance = np.full(n, initial, dtype=np.float64)
+        self.long_position = np.zeros(n)
+        self.short_position = np.zeros(n)
+        self.long_entry_price = np.zeros(n)
+        self.short_entry_price = np.zeros(n)
+        self.total_fees = np.zeros(n)
+        self.cycle_fees = np.zeros(n)
+        self.payout_month = np.full(n, -1, dtype=np.int64)     # -1: 尚未初始化返佣周期
+        self.next_payout = np.zeros(n, dtype=np.int64)
+        self.trade_count = np.zeros(n, dtype=np.int64)
+        self.last_order_time = np.zeros(n, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.liquidated = np.zeros(n, dtype=bool)
+        self.peak_equity = np.full(n, -np.inf)
+        self.max_drawdown = np.zeros(n)
+        self.current_price = np.zeros(n)
+        # 挂单: 每组4个槽位
+        self.order_price = np.zeros((n, 4))
+        self.order_amount = np.zeros((n, 4))
+        self.order_active = np.zeros((n, 4), dtype=bool)
+        self.pair_stats = [FifoPairStats() for _ in range(n)] if self.track_pairs else None
+        self.equity_curve: List[np.ndarray] = []
+
+    def _unrealized_pnl(self, price) -> np.ndarray:
+        long_pnl = np.where(self.long_position > 0, self.long_position * (price - self.long_entry_price), 0.0)
+        short_pnl = np.where(self.short_position > 0, self.short_position * (self.short_entry_price - price), 0.0)
+        return long_pnl + short_pnl
+
+    # ------------------ 主循环 ------------------
+    def run(self, timestamps: np.ndarray, ohlc_data: np.ndarray) -> List[Dict]:
+        """在整段数据上运行所有参数组，返回与 run_backtest_on_arrays 相同格式的结果列表"""
+        self._reset()
+        num = self.num
+        config = self.base_config
+
+        # ATR 只取决于数据，所有参数组共用：ratio_before[i] 为第 i 根K线内策略读到的 ATR/收盘价
+        closes = ohlc_data[:, 3]
+        ratio_before = np.zeros(len(closes))
+        if config.enable_volatility_adaptive and len(closes) > 1:
+            from backtest_kline_trajectory import VolatilityMonitor
+            monitor = VolatilityMonitor(config.atr_period)
+            atrs = monitor.preview_atr(ohlc_data[:, 1], ohlc_data[:, 2], closes)
+            ratio_before[1:] = atr_ratios(atrs, closes)[:-1]
+
+        prev_close = ohlc_data[0][3]
+        for i in range(len(timestamps)):
+            if not self.alive.any():
+                break
+            kline_timestamp = int(timestamps[i])
+            o, h, l, c = ohlc_data[i]
+            if c >= o:
+                trajectory = ((prev_close, prev_close, prev_close), (o, o, o), (l, o, l), (h, h, l), (c, h, l))
+            else:
+                trajectory = ((prev_close, prev_close, prev_close), (o, o, o), (h, h, o), (l, h, l), (c, h, l))
+
+            recording = self.alive.copy()
+            atr_ratio = ratio_before[i]
+            for j, (price, high_since_open, low_since_open) in enumerate(trajectory):
+                sub_timestamp = kline_timestamp + j * 12
+                if sub_timestamp > MAX_TIMESTAMP or sub_timestamp < 0:
+                    sub_timestamp = kline_timestamp
+                self._tick(num.price(price), num.price(high_since_open), num.price(low_since_open),
+                           sub_timestamp, atr_ratio)
+            prev_close = c
+
+            if 0 <= kline_timestamp <= MAX_TIMESTAMP:
+                equity = self.balance + self._unrealized_pnl(self.current_price)
+                self.peak_equity = np.where(recording, np.maximum(self.peak_equity, equity), self.peak_equity)
+                peak = self.peak_equity
+                drawdown = np.where(peak > 0, (peak - equity) / np.where(peak > 0, peak, 1), 0.0)
+                self.max_drawdown = np.where(recording, np.maximum(self.max_drawdown, drawdown), self.max_drawdown)
+                if self.keep_equity_curve:
+                    self.equity_curve.append(np.where(recording, equity, np.nan))
+        return self.results()
+
+    def _tick(self, price: float, high: float, low: float, timestamp: int, atr_ratio: float):
+        alive = self.alive
+        self.current_price = np.where(alive, price, self.current_price)
+
+        # 1. 爆仓检查 (每个价格点)
+        has_position = alive & ((self.long_position != 0) | (self.short_position != 0))
+        if has_position.any():
+            equity = self.balance + self._unrealized_pnl(price)
+            net_value = np.abs(self.long_position - self.short_position) * price
+            tier = np.minimum(np.searchsorted(self.tier_thresholds, net_value, side="left"),
+                              len(self.tier_thresholds) - 1)
+            maintenance = net_value * self.tier_mm_rate[tier] - self.tier_mm_amount[tier]
+            liquidate = has_position & (equity <= maintenance)
+            if liquidate.any():
+                self._liquidate(liquidate, price)
+                alive = self.alive
+
+        # 2. 生成订单
+        place = alive & ((timestamp - self.last_order_time) >= self.base_config.order_refresh_time)
+        if place.any():
+            balance_regime = atr_ratio >= self.atr_threshold
+            rebalance = place & balance_regime
+            if rebalance.any():
+                self._place_balance_orders(rebalance, price)
+            if self.base_config.hedge_mode:
+                hedge = place & ~balance_regime
+                if hedge.any():
+                    self._place_hedge_orders(hedge, price)
+            else:
+                self.last_order_time = np.where(place & ~balance_regime, timestamp, self.last_order_time)
+
+        # 3. 撮合
+        self._match(high, low, timestamp)
+
+    def _liquidate(self, mask: np.ndarray, price: float):
+        taker = self.base_config.taker_fee
+        long_mask = mask & (self.long_position > 0)
+        long_fee = self.long_position * price * taker
+        self.total_fees = np.where(long_mask, self.total_fees + long_fee, self.total_fees)
+        short_mask = mask & (self.short_position > 0)
+        short_fee = self.short_position * price * taker
+        self.total_fees = np.where(short_mask, self.total_fees + short_fee, self.total_fees)
+        # 强平后余额清零 (与标量引擎一致，强平盈亏与返佣不影响结果)
+        for array in (self.balance, self.long_position, self.short_position,
+                      self.long_entry_price, self.short_entry_price):
+            array[mask] = 0.0
+        self.order_active[mask] = False
+        self.alive = self.alive & ~mask
+        self.liquidated |= mask
+
+    def _place_balance_orders(self, mask: np.ndarray, price: float):
+        net_position = self.long_position - self.short_position
+        active = mask & ~(np.abs(net_position) < self.base_config.balance_epsilon)
+        if not active.any():
+            return
+        amount = np.abs(net_position) * self.base_config.balance_fraction
+        slot = np.where(net_position > 0, SLOT_SELL_LONG, SLOT_BUY_SHORT)
+        rows = np.flatnonzero(active)
+        self.order_active[rows] = False
+        self.order_active[rows, slot[rows]] = True
+        self.order_price[rows, slot[rows]] = price
+        self.order_amount[rows, slot[rows]] = amount[rows]
+
+    def _place_hedge_orders(self, mask: np.ndarray, price: float):
+        config = self.base_config
+        long_pos, short_pos = self.long_position, self.short_position
+        equity = self.balance + self._unrealized_pnl(price)
+
+        # 已用保证金: 总持仓价值所在档位的最高杠杆与设置杠杆取小
+        position_value = long_pos * price + short_pos * price
+        tier = np.minimum(np.searchsorted(self.tier_thresholds, position_value, side="left"),
+                          len(self.tier_thresholds) - 1)
+        effective_leverage = np.minimum(self.tier_max_leverage[tier], self.leverage)
+        entry_value = long_pos * self.long_entry_price + short_pos * self.short_entry_price
+        used_margin = np.where(effective_leverage == 0, 0.0,
+                               entry_value / np.where(effective_leverage == 0, 1, effective_leverage))
+        available = equity - used_margin
+
+        # calculate_dynamic_order_size
+        leverage = self.leverage_num
+        target = equity * self.position_size_ratio
+        required = target / leverage
+        target = np.where(required > available, available * leverage, target)
+        amount = target / price
+        amount = np.where(amount < config.max_order_amount, amount, config.max_order_amount)
+        amount = np.where(amount > config.min_order_amount, amount, config.min_order_amount)
+
+        # generate_hedge_orders: 保证金不足 (双向) 时不挂单
+        required_total = amount * price / leverage * config.hedge_side_count
+        active = mask & ~(available < required_total)
+        if not active.any():
+            return
+        rows = np.flatnonzero(active)
+        spread = self.spread[rows]
+        self.order_price[rows, SLOT_BUY_LONG] = price
+        self.order_price[rows, SLOT_SELL_SHORT] = price
+        self.order_price[rows, SLOT_SELL_LONG] = self.num.price_array(price * (1.0 + spread))
+        self.order_price[rows, SLOT_BUY_SHORT] = self.num.price_array(price * (1.0 - spread))
+        self.order_amount[rows] = amount[rows, None]
+        self.order_active[rows] = True
+
+    def _match(self, high: float, low: float, timestamp: int):
+        active, prices = self.order_active, self.order_price
+        fill_buy_long = active[:, SLOT_BUY_LONG] & (prices[:, SLOT_BUY_LONG] >= low)
+        fill_buy_short = active[:, SLOT_BUY_SHORT] & (prices[:, SLOT_BUY_SHORT] >= low)
+        fill_sell_short = active[:, SLOT_SELL_SHORT] & (prices[:, SLOT_SELL_SHORT] <= high)
+        fill_sell_long = active[:, SLOT_SELL_LONG] & (prices[:, SLOT_SELL_LONG] <= high)
+        if not (fill_buy_long.any() or fill_buy_short.any() or fill_sell_short.any() or fill_sell_long.any()):
+            return
+
+        amounts = self.order_amount.copy()
+        fill_prices = prices.copy()
+        active[:, SLOT_BUY_LONG] &= ~fill_buy_long
+        active[:, SLOT_BUY_SHORT] &= ~fill_buy_short
+        active[:, SLOT_SELL_SHORT] &= ~fill_sell_short
+        active[:, SLOT_SELL_LONG] &= ~fill_sell_long
+
+        # 成交顺序: 买单按价格从高到低，再卖单按价格从低到高；同价位按挂单顺序
+        buy_long_first = ~(fill_prices[:, SLOT_BUY_SHORT] > fill_prices[:, SLOT_BUY_LONG])
+        sell_short_first = ~(fill_prices[:, SLOT_SELL_LONG] < fill_prices[:, SLOT_SELL_SHORT])
+        steps = (
+            ((SLOT_BUY_LONG, fill_buy_long & buy_long_first), (SLOT_BUY_SHORT, fill_buy_short & ~buy_long_first)),
+            ((SLOT_BUY_SHORT, fill_buy_short & buy_long_first), (SLOT_BUY_LONG, fill_buy_long & ~buy_long_first)),
+            ((SLOT_SELL_SHORT, fill_sell_short & sell_short_first), (SLOT_SELL_LONG, fill_sell_long & ~sell_short_first)),
+            ((SLOT_SELL_LONG, fill_sell_long & sell_short_first), (SLOT_SELL_SHORT, fill_sell_short & ~sell_short_first)),
+        )
+        for step in steps:
+            for slot, mask in step:
+                if mask.any():
+                    rows = np.flatnonzero(mask)
+                    self._execute(slot, rows, amounts[rows, slot], fill_prices[rows, slot], timestamp)
+
+    def _execute(self, slot: int, rows: np.ndarray, amount: np.ndarray, price: np.ndarray, timestamp: int):
+        """execute_fast_trade 的向量版 (rows 中每组本步只成交一笔)"""
+        config = self.base_config
+        fee = amount * price * config.maker_fee
+        self.balance[rows] -= fee
+        self.total_fees[rows] += fee
+        self.trade_count[rows] += 1
+        if config.use_fee_rebate:
+            self.cycle_fees[rows] += fee
+            self._process_rebate(rows, timestamp)
+
+        if slot == SLOT_BUY_LONG or slot == SLOT_SELL_SHORT:
+            position, entry = ((self.long_position, self.long_entry_price) if slot == SLOT_BUY_LONG
+                               else (self.short_position, self.short_entry_price))
+            current, current_entry = position[rows], entry[rows]
+            first = current == 0
+            added = current + amount
+            entry[rows] = np.where(first, price, (current * current_entry + amount * price) / np.where(first, 1, added))
+            # 与标量实现一致: 加仓时持仓量会累加两次
+            position[rows] = np.where(first, added, added + amount)
+        else:
+            is_long = slot == SLOT_SELL_LONG
+            position, entry = ((self.long_position, self.long_entry_price) if is_long
+                               else (self.short_position, self.short_entry_price))
+            current, current_entry = position[rows], entry[rows]
+            open_rows = current > 0
+            trade_amount = np.where(amount <= current, amount, current)
+            pnl = trade_amount * (price - current_entry) if is_long else trade_amount * (current_entry - price)
+            self.balance[rows] += np.where(open_rows, pnl, 0.0)
+            remaining = np.where(open_rows, current - trade_amount, current)
+            position[rows] = remaining
+            entry[rows] = np.where(open_rows & (remaining == 0), 0.0, current_entry)
+
+        if self.pair_stats is not None:
+            side = SLOT_SIDES[slot]
+            for row, fill_amount, fill_price in zip(rows.tolist(), amount.tolist(), price.tolist()):
+                self.pair_stats[row].on_fill(side, fill_amount, fill_price, timestamp)
+
+    def _process_rebate(self, rows: np.ndarray, timestamp: int):
+        """process_fee_rebate 的向量版：发放日按月序号推进"""
+        if timestamp > MAX_TIMESTAMP:
+            return
+        payouts = self.rebate_calendar
+        months = self.payout_month[rows]
+        new = months < 0
+        if new.any():
+            month = payouts.initial_month(timestamp)
+            new_rows = rows[new]
+            self.payout_month[new_rows] = month
+            self.next_payout[new_rows] = payouts.payout_timestamp(month + 1)
+        due_rows = rows[~new][self.next_payout[rows[~new]] <= timestamp]
+        if len(due_rows) == 0:
+            return
+        rebate = self.cycle_fees[due_rows] * self.base_config.rebate_rate
+        paid = rebate > 0
+        self.balance[due_rows] += np.where(paid, rebate, 0.0)
+        self.cycle_fees[due_rows] = np.where(paid, 0.0, self.cycle_fees[due_rows])
+        self.payout_month[due_rows] += 1
+        for row in due_rows.tolist():
+            self.next_payout[row] = payouts.payout_timestamp(int(self.payout_month[row]) + 1)
+
+    # ------------------ 结果 ------------------
+    def results(self) -> List[Dict]:
+        initial_balance = float(self.base_config.initial_balance)
+        final_equity = self.balance + self._unrealized_pnl(self.current_price)
+        results = []
+        for lane, params in enumerate(self.lane_params):
+            equity = float(final_equity[lane])
+            pairs = self.pair_stats[lane] if self.pair_stats is not None else None
+            results.append({
+                "params": params,
+                "numeric_backend": self.num.name,
+                "final_equity": equity,
+                "total_return": (equity - initial_balance) / initial_balance if initial_balance else 0.0,
+                "max_drawdown": float(self.max_drawdown[lane]),
+                "total_fees": float(self.total_fees[lane]),
+                "total_trades": int(self.trade_count[lane]),
+                "win_rate": pairs.win_rate if pairs is not None else None,
+                "profit_factor": pairs.profit_factor if pairs is not None else None,
+                "liquidated": bool(self.liquidated[lane]),
+                "stopped_by_risk": False,
+            })
+        return results
+
+    def equity_matrix(self) -> np.ndarray:
+        """keep_equity_curve=True 时返回 (K线数, 参数组数) 的权益矩阵 (停止后为 nan)"""
+        if not self.keep_equity_curve:
+            raise ValueError("需要 keep_equity_curve=True")
+        return np.vstack(self.equity_curve) if self.equity_curve else np.empty((0, len(self.configs)))
+
+
+def run_batched_backtest(timestamps: np.ndarray, ohlc_data: np.ndarray, lane_params: List[Dict],
+                         config: Optional[BacktestConfig] = None, **kwargs) -> List[Dict]:
+    """用一次数据遍历评估多组参数 (config 默认按全局配置以 float64 后端编译)"""
+    if config is None:
+        from backtest_kline_trajectory import build_backtest_config
+        from numeric_backend import get_numeric_backend
+        config = build_backtest_config(get_numeric_backend("float64"))
+    return BatchedBacktest(config, lane_params, **kwargs).run(timestamps, ohlc_data)
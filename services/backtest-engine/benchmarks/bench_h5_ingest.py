@@ -0,0 +1,108 @@
+"""
+H5 读取基准：原 DataFrame 路径 vs 向量化分块读取 (kline_source.read_time_range)
+
+原路径: 整个数据集读入内存 -> DataFrame -> pd.to_datetime -> 按日期过滤并复制 -> 逐行 iloc 转换时间戳
+新路径: 二分定位起止行 -> 按 H5 分块只读取时间戳和 OHLC 列 -> 直接写入 int64 秒级时间戳 / float64 N×4 数组
+两条路径的结果逐位比较。默认读取完整的 ETHUSDT 1分钟文件；文件不可用 (如只有 Git LFS 指针) 时
+生成同样布局 (8 列 float64，gzip 4 + shuffle，自动分块) 的合成文件。
+
+用法: python benchmarks/bench_h5_ingest.py [--file path.h5] [--start 2024-01-01] [--end 2024-04-01] [--bars 3000000]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ENGINE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ENGINE_DIR))
+sys.path.insert(0, str(ENGINE_DIR / "tests"))
+
+from backtest_kline_trajectory import utc_timestamp  # noqa: E402
+from kline_source import DATASET_NAME, read_time_range  # noqa: E402
+
+DEFAULT_FILE = ENGINE_DIR.parents[1] / "apps" / "liangzhi-huice" / "api" / "ETHUSDT_1m_2019-11-27_to_2025-08-09.h5"
+
+
+def legacy_load(path, start_date, end_date):
+    """原 load_backtest_data + preprocess_kline_data 的读取与转换部分"""
+    import h5py
+    import pandas as pd
+
+    with h5py.File(path, 'r') as f:
+        data = f[DATASET_NAME][:]
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'amount', 'quote_volume',
+               'quoteVolume', 'quote_asset_volume']
+    df = pd.DataFrame(data, columns=columns[:data.shape[1]])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    test_data = df
+    if start_date:
+        test_data = test_data[test_data['timestamp'] >= pd.to_datetime(start_date)]
+    if end_date:
+        test_data = test_data[test_data['timestamp'] < pd.to_datetime(end_date)]
+    test_data = test_data.copy()
+    timestamps = []
+    for i in range(len(test_data)):
+        timestamps.append(int(test_data.iloc[i]['timestamp'].timestamp()))
+    return np.array(timestamps), test_data[['open', 'high', 'low', 'close']].values.astype(np.float64)
+
+
+def is_readable_h5(path: Path) -> bool:
+    import h5py
+
+    try:
+        with h5py.File(path, "r") as f:
+            return DATASET_NAME in f
+    except OSError:
+        return False
+
+
+def write_synthetic_h5(path: Path, bars: int):
+    import h5py
+    from conftest import make_synthetic_klines
+
+    timestamps, ohlc = make_synthetic_klines(bars, start_ts=1574812800)  # 2019-11-27
+    volume = np.round(np.random.default_rng(1).uniform(10, 1000, bars), 3)
+    rows = np.column_stack([timestamps * 1000, ohlc, volume, timestamps * 1000 + 59999, volume * ohlc[:, 3]])
+    with h5py.File(path, "w") as f:
+        f.create_dataset(DATASET_NAME, data=rows.astype(np.float64), compression="gzip", compression_opts=4,
+                         shuffle=True, chunks=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="H5 读取基准")
+    parser.add_argument("--file", default=str(DEFAULT_FILE))
+    parser.add_argument("--start", default=None, help="开始日期 (默认全量)")
+    parser.add_argument("--end", default=None, help="结束日期 (不含)")
+    parser.add_argument("--bars", type=int, default=3_000_000, help="文件不可用时合成数据的K线数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.file)
+        if not path.exists() or not is_readable_h5(path):
+            print(f"⚠️ {path.name} 不可用 (可能只有 Git LFS 指针)，使用 {args.bars:,} 根合成K线")
+            path = Path(tmp) / "synthetic.h5"
+            write_synthetic_h5(path, args.bars)
+
+        t0 = time.perf_counter()
+        new_ts, new_ohlc = read_time_range(path, utc_timestamp(args.start) if args.start else None,
+                                           utc_timestamp(args.end) if args.end else None)
+        vectorized_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        old_ts, old_ohlc = legacy_load(path, args.start, args.end)
+        legacy_time = time.perf_counter() - t0
+
+    np.testing.assert_array_equal(new_ts, old_ts)
+    np.testing.assert_array_equal(new_ohlc, old_ohlc)
+    print(f"📊 K线数量: {len(new_ts):,} ({args.start or '开头'} -> {args.end or '结尾'})，结果逐位一致")
+    print(f"{'路径':<12} {'耗时(s)':>10}")
+    print(f"{'DataFrame':<12} {legacy_time:>10.3f}")
+    print(f"{'向量化分块':<12} {vectorized_time:>10.3f}   {legacy_time / vectorized_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
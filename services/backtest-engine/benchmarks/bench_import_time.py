@@ -0,0 +1,63 @@
+"""
+冷启动导入时间基准：命令行入口 (backtest_kline_trajectory) 与 API 入口 (backtest_api.py + 引擎)
+
+每次在新的 Python 进程中导入，取中位数；超过时间预算或导入了 pandas/matplotlib/tqdm 时以非零状态退出。
+
+用法: python benchmarks/bench_import_time.py [--repeat 5] [--cli-budget 0.5] [--api-budget 0.6]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ENGINE_DIR = Path(__file__).resolve().parents[1]
+API_SCRIPTS_DIR = ENGINE_DIR.parents[1] / "apps" / "liangzhi-huice" / "api" / "scripts"
+HEAVY_MODULES = ("pandas", "matplotlib", "tqdm", "h5py")
+
+ENTRY_POINTS = {
+    "cli": (ENGINE_DIR, "import backtest_kline_trajectory"),
+    "api": (API_SCRIPTS_DIR, "import backtest_api; import backtest_kline_trajectory"),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(entry: str) -> dict:
+    """在新进程中导入一次入口模块，返回耗时和已导入的重量级模块"""
+    cwd, statement = ENTRY_POINTS[entry]
+    output = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                            cwd=cwd, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cli-budget", type=float, default=0.5, help="命令行入口导入时间预算 (秒)")
+    parser.add_argument("--api-budget", type=float, default=0.6, help="API 入口导入时间预算 (秒)")
+    args = parser.parse_args()
+
+    budgets = {"cli": args.cli_budget, "api": args.api_budget}
+    failed = False
+    for entry, budget in budgets.items():
+        runs = [measure(entry) for _ in range(args.repeat)]
+        median = statistics.median(run["seconds"] for run in runs)
+        heavy = sorted({module for run in runs for module in run["heavy"]})
+        ok = median <= budget and not heavy
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {entry:<4} 冷启动导入 {median * 1000:7.1f} ms (预算 {budget * 1000:.0f} ms)"
+              + (f"，导入了重量级模块: {', '.join(heavy)}" if heavy else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+预处理缓存基准：旧版 pickle 元组 vs 列式 .npy 内存映射
+
+冷读取前用 posix_fadvise(DONTNEED) 把缓存文件逐出页缓存 (不支持时只测热读取)。
+"时间段切片" 模拟从全量缓存提取约 3 个月的数据并读遍一次 (回测主循环的访问量)。
+
+用法: python benchmarks/bench_kline_cache.py [--bars 3000000] [--slice-bars 130000]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tests"))
+
+from conftest import make_synthetic_klines  # noqa: E402
+from kline_cache import KlineCache  # noqa: E402
+
+
+def drop_page_cache(paths) -> bool:
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def load_pickle(path: Path, start: int, end: int):
+    with path.open("rb") as f:
+        timestamps, ohlc_data, _, _, _ = pickle.load(f)
+    return timestamps[start:end], ohlc_data[start:end]
+
+
+def load_columnar(cache: KlineCache, start: int, end: int):
+    timestamps, ohlc_data, _ = cache.load("bench")
+    return timestamps[start:end], ohlc_data[start:end]
+
+
+def timed(load, files, cold: bool):
+    if cold and not drop_page_cache(files):
+        return None
+    t0 = time.perf_counter()
+    timestamps, ohlc_data = load()
+    load_time = time.perf_counter() - t0
+    float(ohlc_data[:, 3].sum()) + int(timestamps[-1])  # 访问切片的全部数据
+    return load_time, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预处理缓存基准")
+    parser.add_argument("--bars", type=int, default=3_000_000)
+    parser.add_argument("--slice-bars", type=int, default=130_000, help="时间段切片的K线数 (约 3 个月)")
+    args = parser.parse_args()
+
+    timestamps, ohlc_data = make_synthetic_klines(args.bars)
+    start = args.bars // 2
+    end = start + min(args.slice_bars, args.bars - start)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pickle_path = tmp / "preprocessed_data_bench.pkl"
+        with pickle_path.open("wb") as f:
+            pickle.dump((timestamps, ohlc_data, args.bars, "2020-01-01", "2025-12-31"), f)
+        cache = KlineCache(tmp)
+        entry_dir = cache.save("bench", timestamps, ohlc_data)
+        columnar_files = sorted(entry_dir.iterdir())
+
+        print(f"📊 K线数量: {args.bars:,}，切片: {end - start:,} 根")
+        print(f"{'格式':<8} {'读取':<6} {'打开(s)':>10} {'打开+读切片(s)':>16}")
+        for name, load, files in (
+            ("pickle", lambda: load_pickle(pickle_path, start, end), [pickle_path]),
+            ("columnar", lambda: load_columnar(cache, start, end), columnar_files),
+        ):
+            for mode, cold in (("冷", True), ("热", False)):
+                result = timed(load, files, cold)
+                if result is None:
+                    print(f"{name:<8} {mode:<6} {'(不支持 posix_fadvise)':>28}")
+                    continue
+                print(f"{name:<8} {mode:<6} {result[0]:>10.4f} {result[1]:>16.4f}")
+
+
+if __name__ == "__main__":
+    main()
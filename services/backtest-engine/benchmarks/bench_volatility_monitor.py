@@ -0,0 +1,83 @@
+"""
+VolatilityMonitor 微基准：环形缓冲区 O(1) 实现 vs 原 O(window) 实现
+
+用法: python benchmarks/bench_volatility_monitor.py [--bars 20000] [--periods 60,720,1440]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backtest_kline_trajectory import VolatilityMonitor  # noqa: E402
+
+
+class NaiveVolatilityMonitor:
+    """原实现：list.pop(0) + 每根K线重算整个窗口的真实波幅"""
+
+    def __init__(self, atr_period: int):
+        self.atr_period = atr_period
+        self.price_history = []
+        self.atr_values = []
+
+    def update_price(self, timestamp, high, low, close):
+        self.price_history.append((timestamp, high, low, close))
+        if len(self.price_history) > self.atr_period + 1:
+            self.price_history.pop(0)
+        if len(self.price_history) >= 2:
+            true_ranges = []
+            for i in range(1, len(self.price_history)):
+                current, previous = self.price_history[i], self.price_history[i - 1]
+                true_ranges.append(max(current[1] - current[2], abs(current[1] - previous[3]),
+                                       abs(current[2] - previous[3])))
+            self.atr_values.append(sum(true_ranges) / len(true_ranges))
+            if len(self.atr_values) > 100:
+                self.atr_values.pop(0)
+
+
+def make_bars(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    closes = 2000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    highs = closes * (1 + rng.uniform(0, 0.002, n))
+    lows = closes * (1 - rng.uniform(0, 0.002, n))
+    return np.arange(n, dtype=np.int64) * 60, highs.round(2), lows.round(2), closes.round(2)
+
+
+def time_per_bar(monitor, bars) -> float:
+    timestamps, highs, lows, closes = (a.tolist() for a in bars)
+    t0 = time.perf_counter()
+    for ts, h, l, c in zip(timestamps, highs, lows, closes):
+        monitor.update_price(ts, h, l, c)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VolatilityMonitor 微基准")
+    parser.add_argument("--bars", type=int, default=20000)
+    parser.add_argument("--periods", default="60,720,1440")
+    args = parser.parse_args()
+
+    bars = make_bars(args.bars)
+    print(f"📊 K线数量: {args.bars:,}")
+    print(f"{'atr_period':>10} {'原实现(s)':>12} {'环形缓冲(s)':>12} {'批量(s)':>10} {'加速比':>8} {'最大相对误差':>14}")
+    for period in (int(p) for p in args.periods.split(",")):
+        naive, ring, bulk = NaiveVolatilityMonitor(period), VolatilityMonitor(period), VolatilityMonitor(period)
+        naive_time = time_per_bar(naive, bars)
+        ring_time = time_per_bar(ring, bars)
+        t0 = time.perf_counter()
+        bulk.update_many(*bars)
+        bulk_time = time.perf_counter() - t0
+
+        expected = np.array(naive.atr_values)
+        rel_err = float(np.max(np.abs(np.array(ring.atr_values) - expected) / expected))
+        assert ring.atr_values == bulk.atr_values
+        print(f"{period:>10} {naive_time:>12.3f} {ring_time:>12.3f} {bulk_time:>10.4f} "
+              f"{naive_time / ring_time:>7.1f}x {rel_err:>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
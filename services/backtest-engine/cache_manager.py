@@ -0,0 +1,300 @@
+"""
+缓存目录管理 - K线缓存、特征库、回测结果共用的原子写入、写锁和总大小上限
+
+cache/ 下每个不同的时间段都会留下一份K线缓存，特征文件和回测结果也只增不减；
+扫参的多个工作进程和常驻回测服务同时写同一个键时，还可能互相覆盖出写了一半的文件。这里统一提供:
+  - atomic_write: 先写同目录的临时文件再 os.replace，读者只会看到完整的旧文件或新文件
+  - FileLock:     基于 fcntl.flock (Windows 上为 msvcrt.locking) 的跨进程锁，同一个键同一时间只有一个写者
+  - CacheManager: 统计各类缓存的条目数和占用空间，总大小超过上限时按最近使用时间 (LRU) 淘汰，
+                  并清理写到一半遗留的临时文件
+
+总大小上限默认 4 GiB，可用环境变量 BACKTEST_CACHE_MAX_BYTES 或命令行 --max-bytes 修改 (支持 K/M/G 后缀)。
+
+用法:
+  python cache_manager.py stats [--cache-dir cache] [--json]
+  python cache_manager.py gc [--max-bytes 2G] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_DIR = BASE_DIR / "cache"
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+MAX_BYTES_ENV = "BACKTEST_CACHE_MAX_BYTES"
+LOCK_DIR_NAME = ".locks"
+STALE_TEMP_SECONDS = 3600  # 超过该时间的临时文件视为写入中断的残留
+TEMP_SUFFIX = ".tmp"
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value: Union[str, int]) -> int:
+    """'512M' / '4G' / '1048576' -> 字节数"""
+    text = str(value).strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def atomic_write(path: Union[str, Path], write: Callable, mode: str = "wb") -> Path:
+    """write(f) 写入同目录的临时文件，完成后原子替换 path (失败时删除临时文件)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def touch(path: Union[str, Path]):
+    """刷新最近使用时间 (LRU 淘汰依据)，失败不影响读取"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class FileLock:
+    """跨进程排它锁 (锁文件本身不删除，只锁定其内容)"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.05)
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+
+
+class CacheManager:
+    """
+    一个缓存目录下所有缓存条目的统一视图:
+      klines   {cache_dir}/klines/{key}/          列式K线缓存 (kline_cache)
+      features {cache_dir}/features_*.npy         特征库 (feature_store)
+      results  {cache_dir}/results/*.pkl          回测结果 (result_cache)
+      legacy   {cache_dir}/preprocessed_data_*.pkl 旧版 pickle K线缓存
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir)
+        if max_bytes is None:
+            max_bytes = parse_size(os.environ.get(MAX_BYTES_ENV, DEFAULT_MAX_BYTES))
+        self.max_bytes = int(max_bytes)
+
+    def lock(self, name: str) -> FileLock:
+        """某个缓存键的写锁 (with manager.lock(name): ...)"""
+        return FileLock(self.cache_dir / LOCK_DIR_NAME / f"{name}.lock")
+
+    def _candidates(self) -> Iterable[tuple]:
+        """(类别, 路径, 锁名)"""
+        klines_dir = self.cache_dir / "klines"
+        if klines_dir.is_dir():
+            for path in klines_dir.iterdir():
+                yield ("temp" if path.name.startswith(".") else "klines"), path, f"klines-{path.name}"
+        for path in self.cache_dir.glob("features_*.npy"):
+            yield "features", path, None
+        for path in self.cache_dir.glob("preprocessed_data_*.pkl"):
+            yield "legacy", path, None
+        for path in self.cache_dir.glob(f".*{TEMP_SUFFIX}"):
+            yield "temp", path, None
+        results_dir = self.cache_dir / "results"
+        if results_dir.is_dir():
+            for path in results_dir.glob("*.pkl"):
+                yield "results", path, None
+            for path in results_dir.glob(f"*{TEMP_SUFFIX}"):
+                yield "temp", path, None
+
+    def entries(self) -> List[tuple]:
+        """(最近使用时间, 大小, 类别, 路径, 锁名)，从旧到新排列"""
+        entries = []
+        for kind, path, lock_name in self._candidates():
+            try:
+                entries.append((path.stat().st_mtime, _tree_size(path), kind, path, lock_name))
+            except FileNotFoundError:
+                continue  # 被其它进程删除
+        return sorted(entries, key=lambda entry: entry[0])
+
+    def stats(self) -> Dict:
+        """各类缓存的条目数、占用字节数和总占用"""
+        kinds = {}
+        for _, size, kind, _, _ in self.entries():
+            usage = kinds.setdefault(kind, {"entries": 0, "bytes": 0})
+            usage["entries"] += 1
+            usage["bytes"] += size
+        return {
+            "cache_dir": str(self.cache_dir),
+            "kinds": kinds,
+            "bytes": sum(usage["bytes"] for usage in kinds.values()),
+            "max_bytes": self.max_bytes,
+        }
+
+    def _remove(self, path: Path, lock_name: Optional[str]) -> bool:
+        """删除条目 (条目正被写入时跳过)"""
+        lock = self.lock(lock_name) if lock_name else None
+        if lock is not None and not lock.acquire(blocking=False):
+            return False
+        try:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+        finally:
+            if lock is not None:
+                lock.release()
+        return True
+
+    def gc(self, max_bytes: Optional[int] = None, keep: Iterable[Path] = (), dry_run: bool = False) -> List[tuple]:
+        """
+        清理中断写入的临时文件，再按 LRU 淘汰到总大小不超过 max_bytes (默认 self.max_bytes)
+        keep 中的路径 (刚写入的条目) 不会被淘汰；返回被删除的 (类别, 路径, 大小)
+        """
+        limit = self.max_bytes if max_bytes is None else int(max_bytes)
+        keep = {Path(path) for path in keep}
+        now = time.time()
+        entries = self.entries()
+        total = sum(size for _, size, _, _, _ in entries)
+        removed = []
+        for last_used, size, kind, path, lock_name in entries:
+            stale_temp = kind == "temp" and now - last_used > STALE_TEMP_SECONDS
+            if not stale_temp and (total <= limit or kind == "temp" or path in keep):
+                continue
+            if dry_run or self._remove(path, lock_name):
+                removed.append((kind, path, size))
+                total -= size
+        return removed
+
+    def enforce(self, keep: Iterable[Path] = ()) -> List[tuple]:
+        """写入新条目后调用：超过上限时淘汰 (其它进程正在清理时直接返回)"""
+        if sum(size for _, size, _, _, _ in self.entries()) <= self.max_bytes:
+            return []
+        lock = self.lock("gc")
+        if not lock.acquire(blocking=False):
+            return []
+        try:
+            removed = self.gc(keep=keep)
+        finally:
+            lock.release()
+        if removed:
+            print(f"🧹 缓存超过上限 {format_size(self.max_bytes)}，淘汰了 {len(removed)} 个最久未使用的条目")
+        return removed
+
+
+_default_managers: Dict[Path, CacheManager] = {}
+
+
+def get_cache_manager(cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR) -> CacheManager:
+    """每个缓存目录共用一个管理器实例"""
+    cache_dir = Path(cache_dir)
+    if cache_dir not in _default_managers:
+        _default_managers[cache_dir] = CacheManager(cache_dir)
+    return _default_managers[cache_dir]
+
+
+def print_stats(stats: Dict):
+    print(f"📁 缓存目录: {stats['cache_dir']}")
+    print(f"{'类别':<10} {'条目数':>8} {'占用':>10}")
+    for kind, usage in sorted(stats["kinds"].items()):
+        print(f"{kind:<10} {usage['entries']:>8} {format_size(usage['bytes']):>10}")
+    print(f"总计 {format_size(stats['bytes'])} / 上限 {format_size(stats['max_bytes'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回测缓存目录管理")
+    parser.add_argument("command", choices=("stats", "gc"))
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="缓存目录")
+    parser.add_argument("--max-bytes", help=f"总大小上限 (如 2G，默认 {MAX_BYTES_ENV} 或 4G)")
+    parser.add_argument("--dry-run", action="store_true", help="gc 只列出将被删除的条目")
+    parser.add_argument("--json", action="store_true", help="stats 输出 JSON")
+    args = parser.parse_args()
+
+    manager = CacheManager(args.cache_dir, parse_size(args.max_bytes) if args.max_bytes else None)
+    if args.command == "stats":
+        stats = manager.stats()
+        if args.json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            print_stats(stats)
+        return
+
+    with manager.lock("gc"):
+        removed = manager.gc(dry_run=args.dry_run)
+    action = "将删除" if args.dry_run else "已删除"
+    for kind, path, size in removed:
+        print(f"  {action} [{kind}] {path.name} ({format_size(size)})")
+    print(f"🧹 {action} {len(removed)} 个条目，共 {format_size(sum(size for _, _, size in removed))}")
+    print_stats(manager.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+回测状态快照 - 增量回测从最近的有效快照继续，只模拟新增的K线
+
+数据拉取程序每追加一段分钟线，原来都要把 2019-2025 的整段回测从头重跑一遍才能看到今天的权益。
+这里把 FastPerpetualExchange / FastPerpetualStrategy / VolatilityMonitor 的状态 (get_state)
+连同主循环状态序列化为带版本号的快照文件，每 N 根K线和回测结束时各保存一次。
+
+快照按 "配置键" 分目录保存：配置键是除 end_date 等不影响模拟结果的参数之外全部配置的指纹。
+新的回测 (同样的配置，更晚的 end_date) 启动时从最新的快照开始检查，满足以下条件即可恢复:
+  - 快照版本与 CHECKPOINT_VERSION 一致
+  - 快照覆盖的K线数不超过本次数据长度，且本次数据前 bar_index 根K线的内容指纹与快照一致
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from backtest_config import BacktestConfig
+from feature_store import dataset_fingerprint
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = ".ckpt"
+
+# 不影响模拟结果 (或已由数据前缀指纹覆盖) 的回测参数，不参与配置键
+NON_SIMULATION_KEYS = ("end_date", "data_file_path", "plot_equity_curve", "equity_curve_path",
+                       "equity_spill_dir", "checkpoint_dir", "checkpoint_every", "checkpoint_keep",
+                       "progress_mode", "progress_interval")
+
+
+def config_key(config: BacktestConfig) -> str:
+    """配置键：同一配置键下的快照可以互相接续"""
+    groups = {group: dict(getattr(config, group)) for group in ("strategy", "market", "atr", "rebate", "risk")}
+    groups["backtest"] = {key: value for key, value in config.backtest.items() if key not in NON_SIMULATION_KEYS}
+    groups["numeric_backend"] = config.numeric_backend_name
+    groups["leverage_tiers"] = [list(tier) for tier in config._source_tiers]
+    payload = json.dumps(groups, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()[:16]
+
+
+def prefix_fingerprint(timestamps: np.ndarray, ohlc_data: np.ndarray, bars: int) -> str:
+    """前 bars 根K线的内容指纹"""
+    return dataset_fingerprint(timestamps[:bars], ohlc_data[:bars])
+
+
+class CheckpointStore:
+    """快照目录：{directory}/{配置键}/{bar_index:012d}.ckpt，每个配置键只保留最新的 keep 个"""
+
+    def __init__(self, directory: Union[str, Path], keep: int = 3):
+        self.directory = Path(directory)
+        self.keep = max(int(keep), 1)
+
+    def _key_dir(self, key: str) -> Path:
+        return self.directory / key
+
+    def list(self, key: str) -> List[Path]:
+        """该配置键下的快照文件，按覆盖的K线数从新到旧排列"""
+        key_dir = self._key_dir(key)
+        if not key_dir.is_dir():
+            return []
+        return sorted(key_dir.glob(f"*{CHECKPOINT_SUFFIX}"), reverse=True)
+
+    def save(self, snapshot: Dict) -> Path:
+        """原子写入 (先写临时文件再改名)，然后清理多余的旧快照"""
+        key_dir = self._key_dir(snapshot["config_key"])
+        key_dir.mkdir(parents=True, exist_ok=True)
+        path = key_dir / f"{snapshot['bar_index']:012d}{CHECKPOINT_SUFFIX}"
+        fd, tmp_path = tempfile.mkstemp(dir=key_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        for stale in self.list(snapshot["config_key"])[self.keep:]:
+            stale.unlink(missing_ok=True)
+        return path
+
+    @staticmethod
+    def load(path: Path) -> Optional[Dict]:
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            return None  # 损坏或无法读取的快照视为无效
+        if not isinstance(snapshot, dict) or snapshot.get("version") != CHECKPOINT_VERSION:
+            return None
+        return snapshot
+
+    def latest_valid(self, key: str, timestamps: np.ndarray, ohlc_data: np.ndarray) -> Optional[Dict]:
+        """最新的、与本次数据前缀一致的快照"""
+        for path in self.list(key):
+            bars = int(path.stem)
+            if bars > len(timestamps) or bars <= 0:
+                continue
+            snapshot = self.load(path)
+            if snapshot is None or snapshot["config_key"] != key or snapshot["bar_index"] != bars:
+                continue
+            if int(timestamps[bars - 1]) != snapshot["last_timestamp"]:
+                continue
+            if prefix_fingerprint(timestamps, ohlc_data, bars) != snapshot["prefix_fingerprint"]:
+                continue
+            return snapshot
+        return None
+
+
+def restore_snapshot(snapshot: Dict, exchange, strategy) -> Dict:
+    """把快照恢复到交易所和策略，返回主循环状态"""
+    exchange.set_state(snapshot["exchange"])
+    strategy.set_state(snapshot["strategy"])
+    return dict(snapshot["loop"])
+
+
+class CheckpointSession:
+    """
+    一次回测中的快照：开始时尝试恢复，之后每 every 根K线和结束时保存
+    store 为 None 时不读写文件，只把最近一次快照保留在 last_snapshot (用于分叉回测的公共前缀)
+    """
+
+    def __init__(self, store: Optional[CheckpointStore], config: BacktestConfig, timestamps: np.ndarray,
+                 ohlc_data: np.ndarray, every: int = 0, verbose: bool = True):
+        self.store = store
+        self.key = config_key(config)
+        self.timestamps = timestamps
+        self.ohlc_data = ohlc_data
+        self.every = max(int(every or 0), 0)
+        self.verbose = verbose
+        self.resumed_from = 0
+        self.saved: List[int] = []
+        self.last_snapshot: Optional[Dict] = None
+        self._next_save = self.every or None
+
+    def resume(self, exchange, strategy) -> Optional[Dict]:
+        """恢复最新的有效快照，返回主循环状态 (没有可用快照时返回 None)"""
+        if self.store is None:
+            return None
+        snapshot = self.store.latest_valid(self.key, self.timestamps, self.ohlc_data)
+        if snapshot is None:
+            return None
+        loop = restore_snapshot(snapshot, exchange, strategy)
+        self.resumed_from = snapshot["bar_index"]
+        if self.every:
+            self._next_save = self.resumed_from + self.every
+        if self.verbose:
+            print(f"♻️ 从快照恢复: 已模拟 {self.resumed_from} 根K线，"
+                  f"只需模拟新增的 {len(self.timestamps) - self.resumed_from} 根")
+        return loop
+
+    def due(self, bar_index: int) -> bool:
+        return self._next_save is not None and bar_index >= self._next_save
+
+    def save(self, bar_index: int, exchange, strategy, loop: Dict) -> Optional[Path]:
+        """保存前 bar_index 根K线模拟完成后的状态"""
+        if self.every:
+            self._next_save = bar_index + self.every
+        if bar_index <= 0 or bar_index in self.saved or bar_index == self.resumed_from:
+            return None
+        snapshot = {
+            "version": CHECKPOINT_VERSION,
+            "config_key": self.key,
+            "bar_index": bar_index,
+            "last_timestamp": int(self.timestamps[bar_index - 1]),
+            "prefix_fingerprint": prefix_fingerprint(self.timestamps, self.ohlc_data, bar_index),
+            "created_at": time.time(),
+            "loop": dict(loop, bar_index=bar_index),
+            "exchange": exchange.get_state(),
+            "strategy": strategy.get_state(),
+        }
+        self.saved.append(bar_index)
+        if self.store is None:
+            self.last_snapshot = snapshot
+            return None
+        return self.store.save(snapshot)
+
+
+class ForkSession:
+    """
+    分叉回测：从公共前缀的内存快照继续模拟剩余K线 (不再保存快照)
+    分叉后的参数可以与前缀不同，因此不检查配置键，只检查数据前缀
+    """
+
+    def __init__(self, snapshot: Dict, timestamps: np.ndarray, ohlc_data: np.ndarray):
+        bars = snapshot["bar_index"]
+        if bars > len(timestamps) or prefix_fingerprint(timestamps, ohlc_data, bars) != snapshot["prefix_fingerprint"]:
+            raise ValueError("分叉快照与本次数据的前缀不一致")
+        self.snapshot = snapshot
+        self.resumed_from = 0
+
+    def resume(self, exchange, strategy) -> Dict:
+        self.resumed_from = self.snapshot["bar_index"]
+        return restore_snapshot(self.snapshot, exchange, strategy)
+
+    def due(self, bar_index: int) -> bool:
+        return False
+
+    def save(self, bar_index: int, exchange, strategy, loop: Dict) -> None:
+        return None
+
+
+def open_checkpoint_session(config: BacktestConfig, timestamps: np.ndarray, ohlc_data: np.ndarray,
+                            verbose: bool = True) -> Optional[CheckpointSession]:
+    """按配置创建快照会话 (checkpoint_dir 为 None 时不启用)"""
+    if not config.checkpoint_dir:
+        return None
+    store = CheckpointStore(config.checkpoint_dir, keep=config.checkpoint_keep)
+    return CheckpointSession(store, config, timestamps, ohlc_data, every=config.checkpoint_every, verbose=verbose)
@@ -0,0 +1,238 @@
+"""
+权益记录器 - 预分配 int64/float64 数组 + 可选采样模式 + 超过内存阈值后分块落盘
+
+全量 ETHUSDT 数据每分钟记录一个 (timestamp, Decimal) 元组，约 300 万个 Python 对象。
+EquityRecorder 只保存两列数组，分析时可以直接拿数组计算；读取时仍表现为 (timestamp, equity) 列表。
+
+采样模式:
+  - every_bar: 每根K线记录一次 (默认，与原实现一致)
+  - every_n:   每 N 根K线记录一次
+  - on_change: 权益变化时才记录
+  - daily_ohlc: 按 UTC 自然日记录权益的开高低收 (列表视图中为 (当日零点, 收盘权益))
+every_n / on_change 在读取时会补上最后一次观测，保证序列的终点与回测终点一致。
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+SAMPLING_MODES = ("every_bar", "every_n", "on_change", "daily_ohlc")
+SECONDS_PER_DAY = 86400
+
+
+class EquityRecorder:
+    """数组版权益记录器"""
+
+    def __init__(self, mode: str = "every_bar", every_n: int = 60, max_memory_points: int = 1_000_000,
+                 spill_dir: Optional[Union[str, Path]] = None, initial_capacity: int = 4096):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"未知的权益采样模式: {mode} (可选: {', '.join(SAMPLING_MODES)})")
+        if every_n < 1:
+            raise ValueError("every_n 必须 >= 1")
+        self.mode = mode
+        self.every_n = int(every_n)
+        self.max_memory_points = max(int(max_memory_points), 2)
+        self._spill_root = Path(spill_dir) if spill_dir is not None else None
+        self._spill_dir: Optional[Path] = None
+        self._chunks: List[Path] = []
+        self._spilled = 0
+
+        capacity = min(max(int(initial_capacity), 1), self.max_memory_points)
+        columns = 4 if mode == "daily_ohlc" else 1
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty((capacity, columns), dtype=np.float64)
+        self._size = 0
+
+        self.observed = 0                  # 观测到的K线数 (含未被采样的)
+        self._last_observed: Optional[Tuple[int, float]] = None
+        self._last_recorded_value: Optional[float] = None
+
+    # ------------------ 写入 ------------------
+    def record(self, timestamp: int, equity):
+        """记录一根K线收盘后的权益"""
+        equity = float(equity)
+        index = self.observed
+        self.observed += 1
+        self._last_observed = (timestamp, equity)
+
+        mode = self.mode
+        if mode == "every_bar":
+            self._append(timestamp, equity)
+        elif mode == "every_n":
+            if index % self.every_n == 0:
+                self._append(timestamp, equity)
+        elif mode == "on_change":
+            if equity != self._last_recorded_value:
+                self._append(timestamp, equity)
+                self._last_recorded_value = equity
+        else:
+            self._record_daily(timestamp, equity)
+
+    def record_many(self, timestamps: np.ndarray, equities: np.ndarray):
+        """批量记录 (与逐个调用 record 结果一致)"""
+        count = len(timestamps)
+        if count == 0:
+            return
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        equities = np.asarray(equities, dtype=np.float64)
+        start = self.observed
+        self.observed += count
+        self._last_observed = (int(timestamps[-1]), float(equities[-1]))
+
+        if self.mode == "every_bar":
+            self._extend(timestamps, equities[:, None])
+        elif self.mode == "every_n":
+            keep = (np.arange(start, start + count) % self.every_n) == 0
+            self._extend(timestamps[keep], equities[keep][:, None])
+        elif self.mode == "on_change":
+            previous = np.empty(count)
+            previous[0] = np.nan if self._last_recorded_value is None else self._last_recorded_value
+            previous[1:] = equities[:-1]
+            keep = equities != previous
+            if keep.any():
+                self._extend(timestamps[keep], equities[keep][:, None])
+                self._last_recorded_value = float(equities[keep][-1])
+        else:
+            for timestamp, equity in zip(timestamps.tolist(), equities.tolist()):
+                self._record_daily(timestamp, equity)
+
+    def _record_daily(self, timestamp: int, equity: float):
+        day = timestamp - timestamp % SECONDS_PER_DAY
+        size = self._size
+        if size and self._timestamps[size - 1] == day:
+            row = self._values[size - 1]
+            if equity > row[1]:
+                row[1] = equity
+            if equity < row[2]:
+                row[2] = equity
+            row[3] = equity
+        else:
+            self._append(day, equity, (equity, equity, equity, equity))
+
+    def _append(self, timestamp: int, equity: float, row=None):
+        if self._size == len(self._timestamps):
+            self._make_room(1)
+        self._timestamps[self._size] = timestamp
+        self._values[self._size] = equity if row is None else row
+        self._size += 1
+
+    def _extend(self, timestamps: np.ndarray, values: np.ndarray):
+        offset = 0
+        while offset < len(timestamps):
+            if self._size == len(self._timestamps):
+                self._make_room(len(timestamps) - offset)
+            take = min(len(timestamps) - offset, len(self._timestamps) - self._size)
+            self._timestamps[self._size:self._size + take] = timestamps[offset:offset + take]
+            self._values[self._size:self._size + take] = values[offset:offset + take]
+            self._size += take
+            offset += take
+
+    def _make_room(self, needed: int):
+        """扩容；达到内存阈值后把当前缓冲区整体落盘"""
+        capacity = len(self._timestamps)
+        if capacity < self.max_memory_points:
+            new_capacity = min(max(capacity * 2, self._size + needed), self.max_memory_points)
+            self._timestamps = np.resize(self._timestamps, new_capacity)
+            self._values = np.resize(self._values, (new_capacity, self._values.shape[1]))
+        else:
+            self._spill()
+
+    def _spill(self):
+        # 日线模式保留最后一行 (当日可能还在更新)
+        keep = 1 if self.mode == "daily_ohlc" else 0
+        flush = self._size - keep
+        if flush <= 0:
+            return
+        if self._spill_dir is None:
+            if self._spill_root is not None:
+                self._spill_root.mkdir(parents=True, exist_ok=True)
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="equity_spill_", dir=self._spill_root))
+        path = self._spill_dir / f"equity_chunk_{len(self._chunks):05d}.npz"
+        np.savez(path, timestamps=self._timestamps[:flush], values=self._values[:flush])
+        self._chunks.append(path)
+        self._spilled += flush
+        self._timestamps[:keep] = self._timestamps[flush:self._size]
+        self._values[:keep] = self._values[flush:self._size]
+        self._size = keep
+
+    # ------------------ 读取 ------------------
+    def _stored(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._chunks:
+            return self._timestamps[:self._size], self._values[:self._size]
+        timestamps, values = [], []
+        for path in self._chunks:
+            with np.load(path) as chunk:
+                timestamps.append(chunk["timestamps"])
+                values.append(chunk["values"])
+        timestamps.append(self._timestamps[:self._size])
+        values.append(self._values[:self._size])
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (timestamps int64, equity float64)，daily_ohlc 模式下 equity 为每日收盘权益"""
+        timestamps, values = self._stored()
+        equities = values[:, -1]
+        if self.mode in ("every_n", "on_change") and self._last_observed is not None:
+            last_ts, last_equity = self._last_observed
+            if not len(timestamps) or timestamps[-1] != last_ts:
+                timestamps = np.append(timestamps, np.int64(last_ts))
+                equities = np.append(equities, last_equity)
+        return timestamps, equities
+
+    def daily_ohlc(self) -> Tuple[np.ndarray, np.ndarray]:
+        """daily_ohlc 模式: (当日零点时间戳, N×4 开高低收)"""
+        if self.mode != "daily_ohlc":
+            raise ValueError("daily_ohlc 只在 daily_ohlc 采样模式下可用")
+        return self._stored()
+
+    # ------------------ 快照 ------------------
+    def get_state(self) -> dict:
+        """导出已记录的数据 (含落盘分块) 和采样游标"""
+        timestamps, values = self._stored()
+        return {"timestamps": timestamps.copy(), "values": values.copy(), "observed": self.observed,
+                "last_observed": self._last_observed, "last_recorded_value": self._last_recorded_value}
+
+    def set_state(self, state: dict):
+        self.close()
+        self._spilled = 0
+        self._size = 0
+        self._extend(state["timestamps"], state["values"])
+        self.observed = state["observed"]
+        self._last_observed = state["last_observed"]
+        self._last_recorded_value = state["last_recorded_value"]
+
+    @property
+    def spilled_points(self) -> int:
+        return self._spilled
+
+    def close(self):
+        """删除落盘的分块文件"""
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+            self._chunks = []
+
+    # ------------------ 兼容 (timestamp, equity) 列表 ------------------
+    def __len__(self) -> int:
+        return len(self.to_arrays()[0])
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        timestamps, equities = self.to_arrays()
+        return zip(timestamps.tolist(), equities.tolist())
+
+    def __getitem__(self, index: Union[int, slice]):
+        timestamps, equities = self.to_arrays()
+        if isinstance(index, slice):
+            return list(zip(timestamps[index].tolist(), equities[index].tolist()))
+        return int(timestamps[index]), float(equities[index])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, EquityRecorder):
+            mine, theirs = self.to_arrays(), other.to_arrays()
+            return np.array_equal(mine[0], theirs[0]) and np.array_equal(mine[1], theirs[1])
+        if isinstance(other, list):
+            return list(self) == [(int(t), float(e)) for t, e in other]
+        return NotImplemented
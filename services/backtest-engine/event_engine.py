@@ -0,0 +1,195 @@
+"""
+事件驱动回测引擎 - 跳过不可能产生任何事件的K线
+
+绝大多数分钟K线既不会触发挂单成交，也不会触及爆仓价，策略也因保证金不足不会下新单。
+BarSkipper 在每根K线开始前推导一个"静默价格区间"：
+  - 挂单: 最高买单价 < 价格 < 最低卖单价
+  - 爆仓: 交易所 liquidation_price_bounds 给出的安全区间
+  - 策略: hedge_idle_price_band / 平衡模式空仓 给出的不下单区间
+然后用 RangeExtremaIndex 在 O(log n) 内找到下一根价格越出区间的K线，中间的K线只做
+批量波动率更新和批量权益记录。所有区间都按相对误差向内收缩，无法证明静默时退回逐根处理，
+因此结果与逐根循环逐位一致。
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# 区间向内收缩的相对误差 (覆盖 float/Decimal 运算顺序不同带来的舍入差异)
+BAND_SAFETY_EPS = 1e-9
+
+
+class RangeExtremaIndex:
+    """分块稀疏表: 对 highs/lows 建立区间最值索引
+
+    直接对分钟数据建完整稀疏表需要 O(n log n) 内存 (全量数据约 1GB)，
+    这里先按 block_size 分块取块内最值，再对块建稀疏表，内存约为 O(n/B · log n)。
+    """
+
+    def __init__(self, highs: np.ndarray, lows: np.ndarray, block_size: int = 64):
+        self.highs = np.ascontiguousarray(highs, dtype=np.float64)
+        self.lows = np.ascontiguousarray(lows, dtype=np.float64)
+        self.n = len(self.highs)
+        self.block_size = block_size
+
+        n_blocks = (self.n + block_size - 1) // block_size
+        pad = n_blocks * block_size - self.n
+        block_highs = np.concatenate([self.highs, np.full(pad, -np.inf)]).reshape(n_blocks, block_size).max(axis=1)
+        block_lows = np.concatenate([self.lows, np.full(pad, np.inf)]).reshape(n_blocks, block_size).min(axis=1)
+
+        # level k: 从块 b 开始连续 2^k 个块的最值
+        self.max_levels = [block_highs]
+        self.min_levels = [block_lows]
+        span = 1
+        while span * 2 <= n_blocks:
+            prev_max, prev_min = self.max_levels[-1], self.min_levels[-1]
+            self.max_levels.append(np.maximum(prev_max[:-span], prev_max[span:]))
+            self.min_levels.append(np.minimum(prev_min[:-span], prev_min[span:]))
+            span *= 2
+        self.n_blocks = n_blocks
+
+    def range_max(self, start: int, end: int) -> float:
+        """区间 [start, end) 的最高价"""
+        return float(self.highs[start:end].max()) if end - start <= 2 * self.block_size else self._range_query(start, end, True)
+
+    def range_min(self, start: int, end: int) -> float:
+        """区间 [start, end) 的最低价"""
+        return float(self.lows[start:end].min()) if end - start <= 2 * self.block_size else self._range_query(start, end, False)
+
+    def _range_query(self, start: int, end: int, is_max: bool) -> float:
+        start, end = int(start), int(end)
+        values = self.highs if is_max else self.lows
+        levels = self.max_levels if is_max else self.min_levels
+        reduce = max if is_max else min
+        first_block = (start + self.block_size - 1) // self.block_size
+        last_block = end // self.block_size
+        parts = [values[start:first_block * self.block_size], values[last_block * self.block_size:end]]
+        result = reduce(float(p.max() if is_max else p.min()) for p in parts if len(p))
+        if last_block > first_block:
+            level = (last_block - first_block).bit_length() - 1
+            table = levels[level]
+            result = reduce(result, float(table[first_block]), float(table[last_block - (1 << level)]))
+        return result
+
+    def first_breach(self, start: int, lower: float, upper: float) -> int:
+        """返回 start 起第一根 low <= lower 或 high >= upper 的K线下标，全部在区间内时返回 n"""
+        start = int(start)
+        if start >= self.n:
+            return self.n
+        bs = self.block_size
+        block = start // bs
+        block_end = min((block + 1) * bs, self.n)
+
+        hit = self._scan(start, block_end, lower, upper)
+        if hit is not None:
+            return hit
+
+        # 在块级稀疏表上从大到小倍增跳跃
+        pos = block + 1
+        for level in range(len(self.max_levels) - 1, -1, -1):
+            width = 1 << level
+            if pos + width <= self.n_blocks and self.min_levels[level][pos] > lower and self.max_levels[level][pos] < upper:
+                pos += width
+        if pos >= self.n_blocks:
+            return self.n
+        hit = self._scan(pos * bs, min((pos + 1) * bs, self.n), lower, upper)
+        return hit if hit is not None else self.n
+
+    def _scan(self, start: int, end: int, lower: float, upper: float) -> Optional[int]:
+        mask = (self.lows[start:end] <= lower) | (self.highs[start:end] >= upper)
+        if mask.any():
+            return start + int(mask.argmax())
+        return None
+
+
+class BarSkipper:
+    """事件驱动跳跃器：由 simulate_klines 在每根K线开始前调用"""
+
+    def __init__(self, exchange, strategy, timestamps: np.ndarray, ohlc_data: np.ndarray,
+                 block_size: int = 64):
+        self.exchange = exchange
+        self.strategy = strategy
+        self.timestamps = timestamps
+        self.ohlc_data = ohlc_data
+        self.highs = np.ascontiguousarray(ohlc_data[:, 1], dtype=np.float64)
+        self.lows = np.ascontiguousarray(ohlc_data[:, 2], dtype=np.float64)
+        # 用整根K线四个价格的最值建索引，不依赖数据满足 low <= open/close <= high
+        self.index = RangeExtremaIndex(ohlc_data.max(axis=1), ohlc_data.min(axis=1), block_size)
+        self.stats: Dict[str, int] = {"skipped_bars": 0, "jumps": 0, "band_checks": 0, "regime_stops": 0}
+
+    def quiet_band(self) -> Optional[tuple]:
+        """当前状态下的静默价格开区间 (lo, hi, regime_sensitive)，无法证明时返回 None"""
+        exchange, strategy = self.exchange, self.strategy
+        center = float(exchange.current_price)
+        if center <= 0:
+            return None
+
+        lo, hi = 0.0, float("inf")
+        bid, ask = exchange.best_bid_price(), exchange.best_ask_price()
+        if bid is not None:
+            lo = max(lo, bid)
+        if ask is not None:
+            hi = min(hi, ask)
+
+        liquidation_band = exchange.liquidation_price_bounds()
+        if liquidation_band is None:
+            return None
+        lo, hi = max(lo, liquidation_band[0]), min(hi, liquidation_band[1])
+
+        # 策略静默: 当前ATR模式下必须不下单；若另一模式也必然不下单，则对ATR变化不敏感
+        balance_idle = strategy.is_balance_idle()
+        hedge_band = strategy.hedge_idle_price_band(center)
+        if strategy.in_balance_regime():
+            if not balance_idle:
+                return None
+            regime_sensitive = hedge_band is None
+            if hedge_band is not None:
+                lo, hi = max(lo, hedge_band[0]), min(hi, hedge_band[1])
+        else:
+            if hedge_band is None:
+                return None
+            lo, hi = max(lo, hedge_band[0]), min(hi, hedge_band[1])
+            regime_sensitive = not balance_idle
+
+        lo = lo + abs(lo) * BAND_SAFETY_EPS
+        hi = hi - abs(hi) * BAND_SAFETY_EPS
+        if not (lo < center < hi):
+            return None
+        return lo, hi, regime_sensitive
+
+    def skip(self, start: int) -> int:
+        """尝试从第 start 根K线开始跳过静默K线，返回跳过的根数 (0 表示需要逐根处理)"""
+        if start == 0:
+            return 0  # 第一根K线之前还没有当前价格
+        self.stats["band_checks"] += 1
+        band = self.quiet_band()
+        if band is None:
+            return 0
+        lo, hi, regime_sensitive = band
+        end = self.index.first_breach(start, lo, hi)
+        if end <= start:
+            return 0
+
+        exchange, strategy = self.exchange, self.strategy
+        timestamps, ohlc_data = self.timestamps, self.ohlc_data
+        regime = strategy.in_balance_regime()
+
+        # 波动率监控批量更新；ATR 模式切换后的K线交回逐根循环
+        stop = end
+        monitor = exchange.volatility_monitor
+        if regime_sensitive and monitor is not None:
+            closes = ohlc_data[start:end, 3]
+            atrs = monitor.preview_atr(self.highs[start:end], self.lows[start:end], closes)
+            flips = np.flatnonzero(strategy.balance_regime_flags(atrs, closes) != regime)
+            if len(flips):
+                stop = start + int(flips[0]) + 1
+                self.stats["regime_stops"] += 1
+        exchange.update_volatility_monitor_bulk(timestamps[start:stop], self.highs[start:stop],
+                                                self.lows[start:stop], ohlc_data[start:stop, 3])
+
+        strategy.on_bars_skipped(int(timestamps[stop - 1]), regime)
+        exchange.record_equity_bulk(timestamps[start:stop], ohlc_data[start:stop, 3])
+        skipped = stop - start
+        self.stats["skipped_bars"] += skipped
+        self.stats["jumps"] += 1
+        return skipped
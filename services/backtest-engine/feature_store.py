@@ -0,0 +1,145 @@
+"""
+指标特征库 - 对整段K线一次性向量化计算 ATR 及 ATR/收盘价 比例，并按数据指纹+周期持久化
+
+ATR 只取决于数据和 atr_period，没必要在每次回测/每个扫参组合里逐根重算。
+这里与 VolatilityMonitor 共用同一套定点真实波幅算法，查表得到的 ATR 与逐根更新逐位一致：
+  - 真实波幅按 1/TR_SCALE 定点取整为 int64
+  - 回测从第 s 根K线开始时，第 k 根K线的 ATR = 窗口 [max(s+1, k-period+1), k] 的定点和 / (宽度 · TR_SCALE)
+因此只要持久化真实波幅前缀和，任意时间段切片、任意周期的 ATR 都可以 O(n) 向量化得到。
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from cache_manager import atomic_write, get_cache_manager, touch
+
+TR_SCALE = 1 << 30  # 真实波幅定点精度 (约 1e-9 价格单位)
+
+
+def fixed_true_ranges(highs: np.ndarray, lows: np.ndarray, prev_closes: np.ndarray) -> np.ndarray:
+    """真实波幅 max(high-low, |high-prev_close|, |low-prev_close|) 的定点整数表示"""
+    true_ranges = np.maximum(np.maximum(highs - lows, np.abs(highs - prev_closes)),
+                             np.abs(lows - prev_closes))
+    return np.round(true_ranges * TR_SCALE).astype(np.int64)
+
+
+def true_range_prefix(ohlc_data: np.ndarray) -> np.ndarray:
+    """定点真实波幅前缀和 prefix[k] = Σ TR[1..k] (第0根K线没有前收盘价，TR 记为 0)"""
+    fixed = np.zeros(len(ohlc_data), dtype=np.int64)
+    if len(ohlc_data) > 1:
+        fixed[1:] = fixed_true_ranges(ohlc_data[1:, 1], ohlc_data[1:, 2], ohlc_data[:-1, 3])
+    return np.cumsum(fixed)
+
+
+def slice_atr(prefix: np.ndarray, start: int, end: int, period: int) -> np.ndarray:
+    """回测从第 start 根K线开始时 [start, end) 各根K线收盘后的 ATR (第一根为 nan)"""
+    atrs = np.full(end - start, np.nan)
+    if end - start < 2:
+        return atrs
+    k = np.arange(start + 1, end)
+    window_start = np.maximum(start + 1, k - period + 1)
+    widths = k - window_start + 1
+    # 窗口和 < 2^53 时 int64 -> float64 无损，除法与 Python 整数除法同为正确舍入
+    atrs[1:] = (prefix[k] - prefix[window_start - 1]) / (widths * TR_SCALE)
+    return atrs
+
+
+def atr_ratios(atrs: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """ATR / 收盘价 (与 FastPerpetualStrategy.get_current_atr 一致，无 ATR 或收盘价非正时为 0)"""
+    ratios = np.zeros(len(atrs))
+    valid = ~np.isnan(atrs) & (closes > 0)
+    ratios[valid] = atrs[valid] / closes[valid]
+    return ratios
+
+
+def dataset_fingerprint(timestamps: np.ndarray, ohlc_data: np.ndarray) -> str:
+    """按数据内容生成指纹 (同一份数据无论来自哪个文件/缓存都得到相同的指纹)"""
+    digest = hashlib.md5()
+    digest.update(str(ohlc_data.shape).encode())
+    digest.update(np.ascontiguousarray(timestamps, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(ohlc_data, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """按数据指纹和 ATR 周期持久化的特征库 (进程内还有一层内存缓存，扫参时不重复读盘)"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.manager = get_cache_manager(cache_dir)
+        self._memory: Dict[Tuple[str, str], np.ndarray] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "computed": 0}
+
+    def _path(self, fingerprint: str, name: str) -> Path:
+        return self.cache_dir / f"features_{fingerprint}_{name}.npy"
+
+    def _load_or_compute(self, fingerprint: str, name: str, compute) -> np.ndarray:
+        key = (fingerprint, name)
+        if key in self._memory:
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+
+        path = self._path(fingerprint, name)
+        value = None
+        if path.exists():
+            try:
+                value = np.load(path)
+                touch(path)
+                self.stats["disk_hits"] += 1
+            except Exception as e:
+                print(f"⚠️ 特征缓存加载失败: {e}")
+        if value is None:
+            value = compute()
+            self.stats["computed"] += 1
+            try:
+                atomic_write(path, lambda f: np.save(f, value))
+                self.manager.enforce(keep=[path])
+            except Exception as e:
+                print(f"⚠️ 特征缓存保存失败: {e}")
+        self._memory[key] = value
+        return value
+
+    def true_range_prefix(self, fingerprint: str, ohlc_data: np.ndarray) -> np.ndarray:
+        return self._load_or_compute(fingerprint, "tr_prefix", lambda: true_range_prefix(ohlc_data))
+
+    def atr_features(self, fingerprint: str, ohlc_data: np.ndarray, period: int) -> np.ndarray:
+        """整段数据的特征矩阵: 第0行 ATR，第1行 ATR/收盘价"""
+        def compute():
+            atrs = slice_atr(self.true_range_prefix(fingerprint, ohlc_data), 0, len(ohlc_data), period)
+            return np.vstack([atrs, atr_ratios(atrs, ohlc_data[:, 3])])
+        return self._load_or_compute(fingerprint, f"atr{period}", compute)
+
+    def precompute(self, fingerprint: str, ohlc_data: np.ndarray, periods: Iterable[int]) -> Dict[int, np.ndarray]:
+        """一次性计算多个周期 (共享同一个真实波幅前缀和)"""
+        return {period: self.atr_features(fingerprint, ohlc_data, period) for period in periods}
+
+    def extract_slice(self, parent_fingerprint: str, parent_ohlc: np.ndarray, start: int, end: int,
+                      child_fingerprint: str, periods: Iterable[int]):
+        """从整段数据的真实波幅前缀和切出时间段特征，并以时间段指纹持久化 (时间段从头开始计算 ATR)"""
+        prefix = self.true_range_prefix(parent_fingerprint, parent_ohlc)
+        closes = parent_ohlc[start:end, 3]
+        for period in periods:
+            def compute(period=period):
+                atrs = slice_atr(prefix, start, end, period)
+                return np.vstack([atrs, atr_ratios(atrs, closes)])
+            self._load_or_compute(child_fingerprint, f"atr{period}", compute)
+
+
+_default_stores: Dict[Path, FeatureStore] = {}
+
+
+def get_feature_store(cache_dir: Path) -> FeatureStore:
+    """每个缓存目录共用一个特征库实例"""
+    cache_dir = Path(cache_dir)
+    if cache_dir not in _default_stores:
+        _default_stores[cache_dir] = FeatureStore(cache_dir)
+    return _default_stores[cache_dir]
+
+
+def feature_periods(atr_period: int, extra_periods: Optional[Iterable[int]] = None) -> list:
+    """去重后的周期列表 (当前周期 + 预计算的其它周期)"""
+    periods = [atr_period] + [int(p) for p in (extra_periods or [])]
+    return sorted(set(periods))
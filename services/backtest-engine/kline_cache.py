@@ -0,0 +1,130 @@
+"""
+K线预处理缓存 - 列式 .npy 文件 + JSON 清单，按需内存映射
+
+原来的缓存把 (timestamps, ohlc_data, ...) 元组整体 pickle 到 preprocessed_data_<md5>.pkl，
+每次读取都要把整个文件反序列化到新内存里，哪怕回测只需要其中几个月。
+现在每个缓存条目是一个目录:
+  {cache_dir}/klines/{key}/timestamps.npy   int64 秒级时间戳
+  {cache_dir}/klines/{key}/ohlc.npy         float64 N×4 (open, high, low, close)
+  {cache_dir}/klines/{key}/manifest.json    行数、首尾时间戳、日期范围、数据内容指纹
+读取时用 np.load(mmap_mode='r') 打开，从全量缓存切出时间段是零拷贝的视图，只有实际访问的页会被读入。
+同一个键的替换由 cache_manager 的写锁串行化，写入后按缓存目录总大小上限淘汰最久未使用的条目。
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from cache_manager import atomic_write, get_cache_manager, touch
+
+KLINE_CACHE_VERSION = 1
+
+
+class KlineCache:
+    """按缓存键保存的列式K线数据"""
+
+    def __init__(self, cache_dir: Union[str, Path]):
+        self.root = Path(cache_dir) / "klines"
+        self.manager = get_cache_manager(cache_dir)
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return (self._entry_dir(key) / "manifest.json").exists()
+
+    def save(self, key: str, timestamps: np.ndarray, ohlc_data: np.ndarray, **metadata) -> Path:
+        """先写到临时目录再持写锁整体改名，读者不会看到写了一半的条目"""
+        timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        ohlc_data = np.ascontiguousarray(ohlc_data, dtype=np.float64)
+        if ohlc_data.shape != (len(timestamps), 4):
+            raise ValueError(f"OHLC 形状 {ohlc_data.shape} 与时间戳行数 {len(timestamps)} 不一致")
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{key}."))
+        try:
+            np.save(tmp_dir / "timestamps.npy", timestamps)
+            np.save(tmp_dir / "ohlc.npy", ohlc_data)
+            manifest = {
+                "version": KLINE_CACHE_VERSION,
+                "rows": int(len(timestamps)),
+                "first_timestamp": int(timestamps[0]) if len(timestamps) else None,
+                "last_timestamp": int(timestamps[-1]) if len(timestamps) else None,
+                "created_at": time.time(),
+                **metadata,
+            }
+            (tmp_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+            entry_dir = self._entry_dir(key)
+            with self.manager.lock(f"klines-{key}"):
+                # 旧条目先改名移开 (已打开的内存映射不受影响)，再把新条目改名到位
+                old_dir = None
+                if entry_dir.exists():
+                    old_dir = self.root / f".{key}.old.{os.getpid()}.{time.time_ns()}"
+                    os.replace(entry_dir, old_dir)
+                os.replace(tmp_dir, entry_dir)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.manager.enforce(keep=[entry_dir])
+        return entry_dir
+
+    def update_manifest(self, key: str, **fields):
+        """只更新清单中的元数据 (原子替换 manifest.json)"""
+        manifest = self.manifest(key)
+        if manifest is None:
+            raise KeyError(f"K线缓存不存在: {key}")
+        manifest.update(fields)
+        with self.manager.lock(f"klines-{key}"):
+            atomic_write(self._entry_dir(key) / "manifest.json",
+                         lambda f: f.write(json.dumps(manifest, ensure_ascii=False, indent=2)), mode="w")
+
+    def manifest(self, key: str) -> Optional[Dict]:
+        try:
+            manifest = json.loads((self._entry_dir(key) / "manifest.json").read_text())
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("version") == KLINE_CACHE_VERSION else None
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, Dict]]:
+        """
+        内存映射打开 (只读)，返回 (timestamps, ohlc_data, manifest)；不存在或损坏时返回 None
+        打开文件时持写锁，保证三个文件来自同一次写入 (映射建立后条目被替换或删除也不影响已打开的数据)
+        """
+        entry_dir = self._entry_dir(key)
+        with self.manager.lock(f"klines-{key}"):
+            manifest = self.manifest(key)
+            if manifest is None:
+                return None
+            try:
+                timestamps = np.load(entry_dir / "timestamps.npy", mmap_mode="r")
+                ohlc_data = np.load(entry_dir / "ohlc.npy", mmap_mode="r")
+            except (OSError, ValueError):
+                return None
+        rows = manifest["rows"]
+        if timestamps.shape != (rows,) or ohlc_data.shape != (rows, 4):
+            return None
+        touch(entry_dir)
+        # np.asarray 去掉 np.memmap 子类 (仍由映射文件支持，不复制)，主循环逐行索引时没有子类开销
+        return np.asarray(timestamps), np.asarray(ohlc_data), manifest
+
+    def remove(self, key: str):
+        with self.manager.lock(f"klines-{key}"):
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+
+_default_caches: Dict[Path, KlineCache] = {}
+
+
+def get_kline_cache(cache_dir: Union[str, Path]) -> KlineCache:
+    """每个缓存目录共用一个K线缓存实例"""
+    cache_dir = Path(cache_dir)
+    if cache_dir not in _default_caches:
+        _default_caches[cache_dir] = KlineCache(cache_dir)
+    return _default_caches[cache_dir]
@@ -0,0 +1,141 @@
+"""
+K线数据源 (H5 文件 'kline_data' 数据集) 的内容指纹与向量化读取
+
+原来的缓存键只是 md5(文件路径 + 起止日期)：fetch_binance_klines.py --mode daemon 往 H5 追加数据后，
+旧缓存仍会被当作有效数据使用。这里给数据源一个不用读全文件的内容指纹:
+  rows            总行数
+  first_timestamp 第一行的毫秒时间戳
+  last_timestamp  最后一行的毫秒时间戳
+  tail_hash       最后 TAIL_ROWS 行原始数据的 md5
+只比较指纹就能判断数据是否变化；比较旧指纹记录的行数处的尾部哈希，就能判断新文件是否只是在末尾追加了数据。
+
+读取 (read_time_range / read_rows) 不经过 DataFrame：数据集按 open_time_ms 升序，先二分查找时间段的起止行，
+再按 H5 分块大小逐块只读取 open_time_ms 和 OHLC 五列，直接写入预分配的 int64 秒级时间戳和连续 float64 N×4 数组。
+"""
+
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+DATASET_NAME = "kline_data"
+TAIL_ROWS = 1024
+CHUNK_ROWS = 1 << 18  # 每次读取的行数 (向上取整到 H5 分块行数的整数倍)
+FINGERPRINT_FIELDS = ("rows", "first_timestamp", "last_timestamp", "tail_hash")
+
+_fingerprints: Dict[tuple, Dict] = {}
+
+
+def source_stat(path) -> Optional[Dict]:
+    """文件大小与修改时间 (文件不存在时返回 None)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _tail_hash(dataset, rows: int) -> str:
+    """前 rows 行中最后 TAIL_ROWS 行的 md5"""
+    tail = np.ascontiguousarray(dataset[max(rows - TAIL_ROWS, 0):rows])
+    return hashlib.md5(tail.tobytes()).hexdigest()
+
+
+def source_fingerprint(path) -> Optional[Dict]:
+    """
+    数据源内容指纹 (附带文件大小与修改时间)，只读取首尾几行
+    同一进程内按 (路径, 大小, 修改时间) 复用；文件不存在时返回 None
+    """
+    stat = source_stat(path)
+    if stat is None:
+        return None
+    memo_key = (os.path.abspath(path), stat["size"], stat["mtime_ns"])
+    if memo_key not in _fingerprints:
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            dataset = f[DATASET_NAME]
+            rows = int(dataset.shape[0])
+            _fingerprints[memo_key] = {
+                "rows": rows,
+                "first_timestamp": int(dataset[0, 0]) if rows else None,
+                "last_timestamp": int(dataset[rows - 1, 0]) if rows else None,
+                "tail_hash": _tail_hash(dataset, rows),
+                **stat,
+            }
+    return dict(_fingerprints[memo_key])
+
+
+def fingerprint_digest(fingerprint: Dict) -> str:
+    """指纹的内容部分 (不含文件大小/修改时间) 的短哈希，用于缓存键"""
+    payload = "|".join(str(fingerprint[field]) for field in FINGERPRINT_FIELDS)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def same_content(old: Dict, new: Dict) -> bool:
+    return all(old.get(field) == new.get(field) for field in FINGERPRINT_FIELDS)
+
+
+def is_append_of(old: Dict, path, new: Dict) -> bool:
+    """新文件是否只在旧指纹描述的数据末尾追加了行 (前 old['rows'] 行的首行和尾部不变)"""
+    if new["rows"] <= old["rows"] or new["first_timestamp"] != old["first_timestamp"]:
+        return False
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        return _tail_hash(f[DATASET_NAME], old["rows"]) == old["tail_hash"]
+
+
+def _search_row(dataset, rows: int, timestamp_ms: float) -> int:
+    """第一个 open_time_ms >= timestamp_ms 的行号 (二分查找，只读取 log2(rows) 个元素)"""
+    low, high = 0, rows
+    while low < high:
+        mid = (low + high) // 2
+        if dataset[mid, 0] < timestamp_ms:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _read_block(dataset, start: int, stop: int, chunk_rows: int = CHUNK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """逐块读取 [start, stop) 行的时间戳和 OHLC 列，写入预分配的结果数组"""
+    count = max(stop - start, 0)
+    timestamps = np.empty(count, dtype=np.int64)
+    ohlc_data = np.empty((count, 4), dtype=np.float64)
+    if dataset.chunks:
+        chunk_rows = -(-chunk_rows // dataset.chunks[0]) * dataset.chunks[0]
+    for offset in range(start, stop, chunk_rows):
+        end = min(offset + chunk_rows, stop)
+        block = dataset[offset:end, 0:5]
+        out = slice(offset - start, end - start)
+        np.floor_divide(block[:, 0].astype(np.int64), 1000, out=timestamps[out])
+        ohlc_data[out] = block[:, 1:5]
+    return timestamps, ohlc_data
+
+
+def read_rows(path, start: int, stop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """读取 [start, stop) 行，返回 (int64 秒级时间戳, float64 N×4 OHLC)"""
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        dataset = f[DATASET_NAME]
+        rows = int(dataset.shape[0])
+        return _read_block(dataset, start, rows if stop is None else min(stop, rows))
+
+
+def read_time_range(path, start_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None,
+                    chunk_rows: int = CHUNK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取 start_timestamp <= 开盘时间 < end_timestamp (秒，None 表示不限) 的K线
+    返回 (int64 秒级时间戳, float64 N×4 OHLC)，与原 DataFrame 路径的过滤和取整结果一致
+    """
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        dataset = f[DATASET_NAME]
+        rows = int(dataset.shape[0])
+        start = _search_row(dataset, rows, start_timestamp * 1000) if start_timestamp is not None else 0
+        stop = _search_row(dataset, rows, end_timestamp * 1000) if end_timestamp is not None else rows
+        return _read_block(dataset, start, max(stop, start), chunk_rows)
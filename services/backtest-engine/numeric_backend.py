@@ -0,0 +1,93 @@
+"""
+数值后端 - 为回测引擎提供可切换的数值类型
+
+- decimal: 参考模式，所有余额/盈亏/保证金/手续费都使用 Decimal，与原始实现逐位一致
+- float64: 生产扫参模式，使用原生 float，避免每个子tick重复构造 Decimal
+- ticks:   在 float64 基础上把所有价格对齐到 int64 最小价格变动单位网格，
+           订单撮合的价格比较在网格上是精确的
+"""
+
+from decimal import Decimal
+from typing import Dict, Type
+
+import numpy as np
+
+
+class NumericBackend:
+    """数值后端基类：交易所与策略只通过这里构造数值"""
+    name = "base"
+
+    def __init__(self):
+        self.zero = self.num(0)
+        self.one = self.num(1)
+
+    def num(self, value):
+        """通用数值转换 (余额、数量、费率等)"""
+        raise NotImplementedError
+
+    def price(self, value):
+        """价格转换，ticks 模式会在这里对齐到最小价格变动单位"""
+        return self.num(value)
+
+    def price_array(self, values: np.ndarray) -> np.ndarray:
+        """批量价格转换 (仅 float 类后端使用)，结果与逐个调用 price 逐位一致"""
+        return np.asarray(values, dtype=np.float64)
+
+    @staticmethod
+    def to_float(value) -> float:
+        return float(value)
+
+
+class DecimalBackend(NumericBackend):
+    """Decimal 参考模式"""
+    name = "decimal"
+
+    def num(self, value):
+        if isinstance(value, Decimal):
+            return value
+        return Decimal(str(value))
+
+
+class Float64Backend(NumericBackend):
+    """float64 快速模式"""
+    name = "float64"
+
+    def num(self, value):
+        return float(value)
+
+
+class TickBackend(Float64Backend):
+    """int64 价格网格模式：价格先取整为 tick 数，再还原为 float64"""
+    name = "ticks"
+
+    def __init__(self, tick_size=Decimal("0.01")):
+        self.tick_size = Decimal(str(tick_size))
+        # 用整数的 "每单位tick数" 做除法，保证还原出的 float 是最接近网格点的值
+        self.ticks_per_unit = int(round(1 / self.tick_size))
+        super().__init__()
+
+    def to_ticks(self, value) -> int:
+        return int(round(float(value) * self.ticks_per_unit))
+
+    def price(self, value):
+        return self.to_ticks(value) / self.ticks_per_unit
+
+    def price_array(self, values: np.ndarray) -> np.ndarray:
+        # np.round 与内置 round 一样采用银行家舍入
+        return np.round(np.asarray(values, dtype=np.float64) * self.ticks_per_unit) / self.ticks_per_unit
+
+
+NUMERIC_BACKENDS: Dict[str, Type[NumericBackend]] = {
+    DecimalBackend.name: DecimalBackend,
+    Float64Backend.name: Float64Backend,
+    TickBackend.name: TickBackend,
+}
+
+
+def get_numeric_backend(name: str = "decimal", **kwargs) -> NumericBackend:
+    """按名称创建数值后端"""
+    try:
+        backend_cls = NUMERIC_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的数值后端: {name} (可选: {', '.join(NUMERIC_BACKENDS)})")
+    return backend_cls(**kwargs)
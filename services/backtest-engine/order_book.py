@@ -0,0 +1,174 @@
+"""
+持久化订单簿 - 按价格排序的价位数组 + 价位内 FIFO 队列
+
+- 价位键保存在有序列表中，bisect 定位，插入/撤单 O(log n) 查找
+- 撮合只检查最优价位，成交成本与成交笔数成正比，与订单簿深度无关
+- 支持按订单号增量改单/撤单，策略可以让多档网格跨K线挂着不动
+成交顺序与原 "清空-排序-过滤" 实现一致: 先买单 (价格从高到低)，再卖单 (价格从低到高)，同价位先到先成交。
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BUY_SIDES = ("buy_long", "buy_short")
+
+
+class BookSide:
+    """订单簿单边：键按"优先级从高到低"升序排列 (买单用 -price，卖单用 price)"""
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._keys: list = []
+        self._levels: Dict[object, deque] = {}
+        self._count = 0
+
+    def _key(self, price):
+        return -price if self.is_bid else price
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[list]:
+        """按撮合优先级遍历订单 [order_id, price, amount, side]"""
+        for key in self._keys:
+            yield from self._levels[key]
+
+    def add(self, order: list):
+        key = self._key(order[1])
+        level = self._levels.get(key)
+        if level is None:
+            self._keys.insert(bisect_left(self._keys, key), key)
+            level = self._levels[key] = deque()
+        level.append(order)
+        self._count += 1
+
+    def remove(self, order: list):
+        key = self._key(order[1])
+        level = self._levels[key]
+        level.remove(order)
+        self._count -= 1
+        if not level:
+            self._drop_level(key)
+
+    def _drop_level(self, key):
+        del self._levels[key]
+        del self._keys[bisect_left(self._keys, key)]
+
+    def best_price(self):
+        return self._levels[self._keys[0]][0][1] if self._keys else None
+
+    def pop_crossing(self, limit) -> List[list]:
+        """弹出所有可成交订单：买单价格 >= limit (最低价)，卖单价格 <= limit (最高价)"""
+        bound = -limit if self.is_bid else limit
+        keys = self._keys
+        if not keys or keys[0] > bound:
+            return []  # 最优价位未触及
+        cut = bisect_right(keys, bound)
+        filled = []
+        for key in keys[:cut]:
+            filled.extend(self._levels.pop(key))
+        del keys[:cut]
+        self._count -= len(filled)
+        return filled
+
+    def clear(self):
+        self._keys.clear()
+        self._levels.clear()
+        self._count = 0
+
+
+class OrderBook:
+    """买卖双边订单簿，订单以 [order_id, price, amount, side] 保存"""
+
+    def __init__(self):
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self._orders: Dict[int, list] = {}
+        self._next_order_id = 1
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def _side_of(self, side: str) -> BookSide:
+        return self.bids if side in BUY_SIDES else self.asks
+
+    def add(self, side: str, amount, price) -> int:
+        """挂单，返回订单号"""
+        order_id = self._next_order_id
+        self._next_order_id += 1
+        order = [order_id, price, amount, side]
+        self._side_of(side).add(order)
+        self._orders[order_id] = order
+        return order_id
+
+    def cancel(self, order_id: int) -> bool:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return False
+        self._side_of(order[3]).remove(order)
+        return True
+
+    def amend(self, order_id: int, price=None, amount=None) -> bool:
+        """改单：只改数量时保留队列位置，改价格时重新排队 (订单号不变)"""
+        order = self._orders.get(order_id)
+        if order is None:
+            return False
+        if price is not None and price != order[1]:
+            book_side = self._side_of(order[3])
+            book_side.remove(order)
+            order[1] = price
+            if amount is not None:
+                order[2] = amount
+            book_side.add(order)
+        elif amount is not None:
+            order[2] = amount
+        return True
+
+    def replace(self, orders: List[tuple]) -> List[int]:
+        """用一批 (side, amount, price) 替换整个订单簿"""
+        self.clear()
+        return [self.add(side, amount, price) for side, amount, price in orders]
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+        self._orders.clear()
+
+    def best_bid(self):
+        return self.bids.best_price()
+
+    def best_ask(self):
+        return self.asks.best_price()
+
+    def match(self, high, low) -> List[Tuple[object, object, str]]:
+        """返回本次价格区间内成交的 (price, amount, side)：买单在前，卖单在后"""
+        fills = []
+        for book_side, limit in ((self.bids, low), (self.asks, high)):
+            for order in book_side.pop_crossing(limit):
+                del self._orders[order[0]]
+                fills.append((order[1], order[2], order[3]))
+        return fills
+
+    def get(self, order_id: int) -> Optional[tuple]:
+        order = self._orders.get(order_id)
+        return None if order is None else (order[1], order[2], order[3])
+
+    def side_orders(self, is_bid: bool) -> List[tuple]:
+        """按撮合优先级列出单边订单 (price, amount, side)"""
+        book_side = self.bids if is_bid else self.asks
+        return [(order[1], order[2], order[3]) for order in book_side]
+
+    # ------------------ 快照 ------------------
+    def get_state(self) -> dict:
+        """按撮合优先级导出全部订单 (恢复后同价位的 FIFO 顺序和订单号不变)"""
+        orders = [tuple(order) for book_side in (self.bids, self.asks) for order in book_side]
+        return {"orders": orders, "next_order_id": self._next_order_id}
+
+    def set_state(self, state: dict):
+        self.clear()
+        for order_id, price, amount, side in state["orders"]:
+            order = [order_id, price, amount, side]
+            self._side_of(side).add(order)
+            self._orders[order_id] = order
+        self._next_order_id = state["next_order_id"]
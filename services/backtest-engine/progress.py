@@ -0,0 +1,157 @@
+"""
+回测进度事件 - 主循环把进度交给 ProgressSink，由它按墙钟时间节流后输出
+
+原来主循环只驱动 tqdm 进度条，API 只能看到 progress_reporter 在 10/30/90/100% 的粗粒度报告。
+ProgressSink 给出统一的事件 (已完成K线数、K线/秒、预计剩余时间、权益、多空仓位、成交笔数):
+  - JsonLinesProgress: 每行一个 JSON 事件 (无终端时的默认输出，供 API/前端解析)
+  - TqdmProgress:      终端里的进度条 (交互运行时的默认输出)
+  - ReporterProgress:  转发给 progress_reporter.update(current, total, message) (常驻回测服务)
+
+开销控制：主循环只在K线序号到达 update 返回的下一个检查点时才调用 update (一次整数比较)，
+检查间隔按实际速度自适应为约 interval/4 秒的K线数，事件最多每 interval 秒输出一次。
+"""
+
+import json
+import sys
+import time
+from typing import Dict, Optional, TextIO
+
+PROGRESS_MODES = ("auto", "tqdm", "jsonl", "none")
+PROGRESS_EVENT_TYPE = "backtest_progress"
+MIN_STRIDE = 100
+
+
+class ProgressSink:
+    """进度接收器基类：子类实现 emit(event)"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = float(interval)
+        self.total_bars = 0
+        self.start_bar = 0
+        self.started = 0.0
+        self._last_emit = 0.0
+        self._stride = MIN_STRIDE
+
+    def start(self, total_bars: int, bars_done: int = 0) -> int:
+        """回测开始 (bars_done 为从快照恢复的K线数)，返回下一个检查点"""
+        self.total_bars = int(total_bars)
+        self.start_bar = int(bars_done)
+        self.started = self._last_emit = time.perf_counter()
+        self.emit(self._event("start", bars_done))
+        return bars_done + self._stride
+
+    def update(self, bars_done: int, exchange) -> int:
+        """主循环到达检查点时调用，返回下一个检查点"""
+        now = time.perf_counter()
+        elapsed = now - self.started
+        if elapsed > 0:
+            rate = (bars_done - self.start_bar) / elapsed
+            self._stride = max(MIN_STRIDE, int(rate * self.interval / 4))
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.emit(self._event("progress", bars_done, exchange))
+        return bars_done + self._stride
+
+    def finish(self, bars_done: int, exchange, status: str = "completed"):
+        event = self._event("done", bars_done, exchange)
+        event["status"] = status
+        self.emit(event)
+
+    def _event(self, event: str, bars_done: int, exchange=None) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        simulated = bars_done - self.start_bar
+        rate = simulated / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_bars - bars_done, 0)
+        payload = {
+            "type": PROGRESS_EVENT_TYPE,
+            "event": event,
+            "bars_done": int(bars_done),
+            "total_bars": self.total_bars,
+            "percent": round(100.0 * bars_done / self.total_bars, 2) if self.total_bars else 100.0,
+            "elapsed_seconds": round(elapsed, 3),
+            "bars_per_sec": round(rate, 1),
+            "eta_seconds": round(remaining / rate, 1) if rate > 0 else None,
+        }
+        if exchange is not None:
+            payload.update(
+                equity=float(exchange.get_equity()),
+                long_position=float(exchange.long_position),
+                short_position=float(exchange.short_position),
+                trades=len(exchange.trade_history),
+            )
+        return payload
+
+    def emit(self, event: Dict):
+        raise NotImplementedError
+
+
+class JsonLinesProgress(ProgressSink):
+    """每个事件输出一行 JSON (默认写到标准输出，立即 flush)"""
+
+    def __init__(self, stream: Optional[TextIO] = None, interval: float = 0.5):
+        super().__init__(interval)
+        self.stream = stream
+
+    def emit(self, event: Dict):
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+        stream.flush()
+
+
+class TqdmProgress(ProgressSink):
+    """终端进度条"""
+
+    def __init__(self, desc: str = "回测进度", interval: float = 0.5):
+        super().__init__(interval)
+        self.desc = desc
+        self.bar = None
+
+    def emit(self, event: Dict):
+        if event["event"] == "start":
+            from tqdm import tqdm
+            self.bar = tqdm(total=event["total_bars"], initial=event["bars_done"], desc=self.desc, unit="K线")
+            return
+        self.bar.update(event["bars_done"] - self.bar.n)
+        eta = event["eta_seconds"]
+        self.bar.set_postfix({
+            '交易': event["trades"],
+            '权益': f'{event["equity"]:.2f}U',
+            '多仓': f'{event["long_position"]:.2f}',
+            '空仓': f'{event["short_position"]:.2f}',
+            '预计': f"还剩{int(eta // 60)}分{int(eta % 60)}秒" if eta is not None else "计算中...",
+        })
+        if event["event"] == "done":
+            self.bar.close()
+
+
+class ReporterProgress(ProgressSink):
+    """把主循环进度映射到 progress_reporter 的 [low, high] 百分比区间"""
+
+    def __init__(self, reporter, low: int = 30, high: int = 90, interval: float = 0.5):
+        super().__init__(interval)
+        self.reporter = reporter
+        self.low = low
+        self.high = high
+
+    def emit(self, event: Dict):
+        if event["event"] == "start":
+            return
+        current = self.low + (self.high - self.low) * event["percent"] / 100.0
+        eta = event["eta_seconds"]
+        message = f"已回测 {event['bars_done']}/{event['total_bars']} 根K线，{event['bars_per_sec']:,.0f} K线/秒"
+        if eta is not None and event["event"] == "progress":
+            message += f"，预计还剩 {eta:.0f} 秒"
+        self.reporter.update(current, 100, message)
+
+
+def make_progress_sink(mode: str = "auto", interval: float = 0.5) -> Optional[ProgressSink]:
+    """按模式创建进度输出：auto 在终端里用进度条，否则 (API/子进程) 输出 JSON-lines"""
+    if mode not in PROGRESS_MODES:
+        raise ValueError(f"未知的进度输出模式: {mode} (可选: {', '.join(PROGRESS_MODES)})")
+    if mode == "auto":
+        mode = "tqdm" if sys.stderr.isatty() else "jsonl"
+    if mode == "tqdm":
+        return TqdmProgress(interval=interval)
+    if mode == "jsonl":
+        return JsonLinesProgress(interval=interval)
+    return None
@@ -0,0 +1,186 @@
+"""
+回测结果缓存 - 按内容寻址，重复的回测请求直接返回上次的结果
+
+前端默认参数 (2020-01-01 -> 2020-05-20, 1000 USDT) 会被反复提交，每次都完整跑一遍回测。
+缓存键 = 标准化配置 (checkpoint.config_key，排除绘图/快照目录等不影响结果的参数)
+       + 数据内容指纹 (同一时间范围的数据被修正后自动失效)
+       + 引擎版本 (引擎及其导入的全部本地模块的源码指纹，改代码后旧结果自动失效)
+
+结果以 pickle 文件保存在 cache/results/ 下，总大小超过上限时按最近使用时间 (LRU) 淘汰；
+命中/未命中/淘汰次数写入 stats.json，跨进程累计 (backtest_api.py 每次请求都是一个新进程，
+计数的读-改-写由文件锁保护)。整个 cache/ 目录的总大小上限由 cache_manager 统一管理。
+"""
+
+import ast
+import hashlib
+import json
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from backtest_config import BacktestConfig
+from cache_manager import FileLock, atomic_write, touch
+from checkpoint import config_key
+
+RESULT_CACHE_VERSION = 1
+RESULT_SUFFIX = ".pkl"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+BASE_DIR = Path(__file__).resolve().parent
+RESULT_CACHE_DIR = BASE_DIR / "cache" / "results"
+
+# 引擎入口模块；它 (直接或间接、包括函数内) 导入的本地模块都计入引擎版本，任何一个改动都会让旧结果失效
+ENGINE_ENTRY = "backtest_kline_trajectory"
+
+_engine_version: Optional[str] = None
+
+
+def _local_imports(path: Path) -> List[str]:
+    """源码中导入的、位于引擎目录下的模块名"""
+    names = []
+    for node in ast.walk(ast.parse(path.read_bytes())):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return [name for name in names if (BASE_DIR / f"{name}.py").exists()]
+
+
+def engine_sources(entry: str = ENGINE_ENTRY) -> List[str]:
+    """引擎入口及其传递导入的全部本地模块文件名 (排序)"""
+    seen, pending = set(), [entry]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        pending.extend(_local_imports(BASE_DIR / f"{name}.py"))
+    return sorted(f"{name}.py" for name in seen)
+
+
+def engine_version() -> str:
+    """引擎版本：缓存格式版本 + 引擎源码指纹"""
+    global _engine_version
+    if _engine_version is None:
+        digest = hashlib.md5(f"v{RESULT_CACHE_VERSION}".encode())
+        for name in engine_sources():
+            digest.update(name.encode())
+            digest.update((BASE_DIR / name).read_bytes())
+        _engine_version = digest.hexdigest()[:16]
+    return _engine_version
+
+
+def result_cache_key(config: BacktestConfig, data_fingerprint: str) -> str:
+    """结果缓存键：标准化配置 + 数据指纹 + 引擎版本"""
+    payload = json.dumps({"config": config_key(config), "data": data_fingerprint, "engine": engine_version()},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """按缓存键保存回测结果的目录，总大小超过 max_bytes 时淘汰最久未使用的结果"""
+
+    def __init__(self, cache_dir: Union[str, Path] = RESULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self._stats_path = self.cache_dir / "stats.json"
+        self._stats_lock = FileLock(self.cache_dir / ".stats.lock")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{RESULT_SUFFIX}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取结果 (命中时刷新最近使用时间)，没有或已损坏时返回 None"""
+        path = self._path(key)
+        result = None
+        if path.exists():
+            try:
+                with path.open("rb") as f:
+                    result = pickle.load(f)
+                touch(path)
+            except Exception:
+                path.unlink(missing_ok=True)  # 损坏的结果直接丢弃
+                result = None
+        self._bump("hits" if result is not None else "misses")
+        return result
+
+    def put(self, key: str, result: Dict) -> Path:
+        """原子写入结果，然后按 LRU 淘汰超出上限的旧结果"""
+        path = atomic_write(self._path(key), lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self._evict(keep=path)
+        return path
+
+    def _entries(self) -> list:
+        """(最近使用时间, 大小, 路径)，从旧到新排列"""
+        if not self.cache_dir.is_dir():
+            return []
+        entries = []
+        for path in self.cache_dir.glob(f"*{RESULT_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # 被其它进程淘汰
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, keep: Optional[Path] = None):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue  # 刚写入的结果即使超过上限也保留
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            self._bump("evictions", evicted)
+
+    def _bump(self, counter: str, amount: int = 1):
+        """累加统计计数 (统计只是参考信息，写入失败不影响回测)"""
+        try:
+            with self._stats_lock:
+                stats = self._read_counters()
+                stats[counter] = stats.get(counter, 0) + amount
+                atomic_write(self._stats_path, lambda f: f.write(json.dumps(stats)), mode="w")
+        except OSError:
+            pass
+
+    def _read_counters(self) -> Dict[str, int]:
+        try:
+            return json.loads(self._stats_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def stats(self) -> Dict:
+        """命中/未命中/淘汰次数、命中率、条目数和占用字节数"""
+        counters = self._read_counters()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        entries = self._entries()
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+        self._stats_path.unlink(missing_ok=True)
+
+
+_default_caches: Dict[Path, ResultCache] = {}
+
+
+def get_result_cache(cache_dir: Union[str, Path] = RESULT_CACHE_DIR) -> ResultCache:
+    """每个缓存目录共用一个结果缓存实例"""
+    cache_dir = Path(cache_dir)
+    if cache_dir not in _default_caches:
+        _default_caches[cache_dir] = ResultCache(cache_dir)
+    return _default_caches[cache_dir]
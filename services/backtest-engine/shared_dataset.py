@@ -0,0 +1,138 @@
+"""
+共享内存K线数据集 - 预处理后的 timestamps/OHLC (及预计算特征) 只发布一次，工作进程零拷贝挂载
+
+原来每个回测进程都要自己读 H5、构建 DataFrame、转换时间戳再反序列化 (timestamps, ohlc_data)，
+16 个工作进程就是 16 份数据和 16 次冷加载。这里由主进程把数组写入 multiprocessing.shared_memory，
+工作进程拿到可 pickle 的 SharedDatasetHandle 后按数据指纹挂载 (每个进程只挂载一次)，
+得到直接指向共享内存的只读 ndarray。
+
+SharedDatasetManager 负责生命周期：with 块结束 (或 close / 进程退出) 时关闭并删除所有共享内存段。
+"""
+
+import atexit
+import os
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+FEATURE_PREFIX = "atr"  # 特征数组命名与 FeatureStore 一致: atr{period}
+
+
+class SharedArraySpec(NamedTuple):
+    segment: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class SharedDatasetHandle(NamedTuple):
+    """发布后的数据集描述 (传给工作进程，只包含共享内存段名和形状)"""
+    fingerprint: str
+    arrays: Dict[str, SharedArraySpec]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(np.prod(spec.shape)) * np.dtype(spec.dtype).itemsize for spec in self.arrays.values())
+
+
+class SharedDatasetManager:
+    """在主进程中发布数据集并负责清理共享内存段"""
+
+    def __init__(self):
+        self._published: Dict[str, SharedDatasetHandle] = {}
+        self._segments: list = []
+        atexit.register(self.close)
+
+    def publish(self, timestamps: np.ndarray, ohlc_data: np.ndarray,
+                features: Optional[Dict[int, np.ndarray]] = None,
+                fingerprint: Optional[str] = None) -> SharedDatasetHandle:
+        """发布数据集 (同一指纹只发布一次)；features 为 {atr_period: 特征矩阵}"""
+        if fingerprint is None:
+            from feature_store import dataset_fingerprint
+            fingerprint = dataset_fingerprint(timestamps, ohlc_data)
+        if fingerprint in self._published:
+            return self._published[fingerprint]
+
+        arrays = {"timestamps": np.ascontiguousarray(timestamps, dtype=np.int64),
+                  "ohlc": np.ascontiguousarray(ohlc_data, dtype=np.float64)}
+        for period, matrix in (features or {}).items():
+            arrays[f"{FEATURE_PREFIX}{int(period)}"] = np.ascontiguousarray(matrix, dtype=np.float64)
+
+        specs = {}
+        for index, (name, array) in enumerate(arrays.items()):
+            segment = shared_memory.SharedMemory(
+                create=True, size=max(array.nbytes, 1),
+                name=f"bt{os.getpid()}_{fingerprint[:10]}_{len(self._segments)}_{index}",
+            )
+            np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+            self._segments.append(segment)
+            specs[name] = SharedArraySpec(segment.name, array.shape, array.dtype.str)
+
+        handle = SharedDatasetHandle(fingerprint, specs)
+        self._published[fingerprint] = handle
+        return handle
+
+    def close(self):
+        """关闭并删除本管理器创建的所有共享内存段 (可重复调用)"""
+        detach()
+        while self._segments:
+            segment = self._segments.pop()
+            segment.close()
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._published.clear()
+
+    def __enter__(self) -> "SharedDatasetManager":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# =====================================================================================
+# 工作进程挂载
+# =====================================================================================
+_attached: Dict[str, Tuple[list, Dict[str, np.ndarray]]] = {}
+
+
+def attach(handle: SharedDatasetHandle) -> Dict[str, np.ndarray]:
+    """按指纹挂载数据集，返回 {名称: 只读 ndarray} (同一进程内重复调用直接返回已挂载的视图)"""
+    cached = _attached.get(handle.fingerprint)
+    if cached is not None:
+        return cached[1]
+
+    segments, arrays = [], {}
+    for name, spec in handle.arrays.items():
+        segment = shared_memory.SharedMemory(name=spec.segment)
+        segments.append(segment)
+        array = np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=segment.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+    _attached[handle.fingerprint] = (segments, arrays)
+    return arrays
+
+
+def attach_dataset(handle: SharedDatasetHandle) -> Tuple[np.ndarray, np.ndarray, Dict[int, np.ndarray]]:
+    """挂载并拆分为 (timestamps, ohlc_data, {atr_period: 特征矩阵})"""
+    arrays = attach(handle)
+    features = {int(name[len(FEATURE_PREFIX):]): array for name, array in arrays.items()
+                if name.startswith(FEATURE_PREFIX)}
+    return arrays["timestamps"], arrays["ohlc"], features
+
+
+def detach(fingerprint: Optional[str] = None):
+    """释放本进程对共享内存的挂载 (不删除共享内存段)"""
+    fingerprints = [fingerprint] if fingerprint is not None else list(_attached)
+    for fp in fingerprints:
+        entry = _attached.pop(fp, None)
+        if entry is None:
+            continue
+        segments, arrays = entry
+        arrays.clear()  # 先释放指向缓冲区的数组，否则 close 会报 BufferError
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                pass  # 调用方仍持有视图时保留映射，进程退出时释放
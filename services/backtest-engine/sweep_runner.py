@@ -0,0 +1,582 @@
+"""
+多核参数扫描 - 进程池并行运行参数组合，每个工作进程只加载一次数据
+
+- 参数可以是网格 {"leverage": [50, 125], "spread": [...]} 或参数字典列表
+  键默认属于策略参数；"atr.atr_period"、"market.maker_fee" 这类带分组前缀的键覆盖对应配置分组
+- 每个组合编译一份独立的 BacktestConfig，不修改全局配置
+- 数据 (及 feature_store 模式下的 ATR 特征) 由主进程加载一次并发布到共享内存，工作进程零拷贝挂载
+- 结果在完成时逐行追加到 CSV 结果表并立即落盘；再次运行同一个结果表会跳过已完成的组合 (断点续跑)
+- 汇报吞吐: 总体 runs/hour，以及每个工作进程的 bars/sec
+- 分叉模式 (fork_at): 公共前缀用基础参数只模拟一次并生成内存快照，各参数组合从快照分叉，
+  只模拟分叉点之后的K线 (例如 "2024 年起收紧价差" 这类只改变后半段参数的假设分析)
+- 剪枝:
+  - 提前终止: 运行中回撤超过上限 (固定值，或已完成最佳组合回撤的若干倍) 或权益跌破下限时立即停止
+  - 逐轮减半 (successive halving): 所有组合先跑较短的前缀窗口，只有排名靠前的一部分晋级到更长窗口；
+    晋级的组合从自己上一轮的快照继续，不重复模拟
+  每个剪枝决定都写入 <结果表>.prune.jsonl，汇总中给出节省的K线数
+
+用法:
+  python sweep_runner.py --grid '{"leverage": [50, 125], "spread": ["0.002", "0.004"]}' --workers 4 --out sweep.csv
+  python sweep_runner.py --grid '{"spread": ["0.001", "0.002"]}' --fork-at 2024-01-01 --out forks.csv
+  python sweep_runner.py --grid '{"leverage": [50, 125]}' --prune-drawdown 0.5 --halving-windows 0.1,0.3 --out sweep.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from shared_dataset import SharedDatasetHandle, SharedDatasetManager, attach_dataset
+
+CONFIG_GROUPS = ("strategy", "market", "atr", "rebate", "risk", "backtest")
+# 改变这些参数需要重新加载数据，不能放在扫描参数里 (数据在每个工作进程里只加载一次)
+DATA_KEYS = ("start_date", "end_date", "data_file_path")
+# 分叉后不能改变的参数 (会改变快照中状态的结构)
+FORK_FIXED_KEYS = ("atr.atr_period", "atr.enable_volatility_adaptive", "atr.atr_source")
+METRIC_COLUMNS = ("final_equity", "total_return", "max_drawdown", "total_fees", "total_trades",
+                  "win_rate", "profit_factor", "liquidated", "stopped_by_risk")
+RUN_COLUMNS = ("run_id", "worker_pid", "bars", "elapsed_seconds")
+PRUNE_COLUMNS = ("status", "prune_reason")
+RANK_METRICS = ("final_equity", "total_return", "profit_factor", "win_rate")  # 越大越好
+
+
+# =====================================================================================
+# 参数组合
+# =====================================================================================
+def expand_grid(grid: Dict[str, Iterable]) -> List[dict]:
+    """网格 -> 参数字典列表 (按键的给定顺序做笛卡尔积)"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(list(grid[key]) for key in keys))]
+
+
+def split_params(params: Optional[Dict], allow_data_keys: bool = False) -> Dict[str, dict]:
+    """
+    扁平参数 -> 按配置分组的覆盖字典 (无前缀的键属于 strategy)
+    allow_data_keys=True 时 (基础参数) 允许 start_date 等数据范围参数，并归入 backtest 分组
+    """
+    overrides: Dict[str, dict] = {}
+    for key, value in (params or {}).items():
+        group, _, name = key.rpartition(".")
+        if name in DATA_KEYS:
+            if not allow_data_keys:
+                raise ValueError(f"扫描参数不能包含数据范围参数 {name}，请通过 base_params 指定")
+            group = group or "backtest"
+        group = group or "strategy"
+        if group not in CONFIG_GROUPS:
+            raise ValueError(f"未知的配置分组: {group} (参数 {key})")
+        overrides.setdefault(group, {})[name] = value
+    return overrides
+
+
+def check_fork_params(params: Dict):
+    """分叉参数只能改变策略/行情/返佣/风控及 ATR 阈值类参数"""
+    for key in params:
+        if key in FORK_FIXED_KEYS or key.startswith("backtest."):
+            raise ValueError(f"分叉回测不能改变参数 {key} (与公共前缀的状态不兼容)")
+
+
+def resolve_fork_index(timestamps: np.ndarray, fork_at: Union[int, str]) -> int:
+    """分叉点 -> 公共前缀的K线数 (日期字符串按 UTC 取该时刻及之后的第一根K线)"""
+    if isinstance(fork_at, str):
+        import datetime
+        moment = datetime.datetime.fromisoformat(fork_at)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone.utc)
+        index = int(np.searchsorted(timestamps, int(moment.timestamp()), side="left"))
+    else:
+        index = int(fork_at)
+    if not 0 < index < len(timestamps):
+        raise ValueError(f"分叉点 {fork_at} 不在数据范围内 (需要在第一根和最后一根K线之间)")
+    return index
+
+
+def simulate_prefix(config, timestamps: np.ndarray, ohlc: np.ndarray, bars: int,
+                    atr_features: Optional[Dict[int, np.ndarray]] = None) -> Dict:
+    """用基础配置模拟前 bars 根K线，返回内存快照"""
+    import backtest_kline_trajectory as engine
+    from checkpoint import CheckpointSession
+
+    session = CheckpointSession(None, config, timestamps[:bars], ohlc[:bars], verbose=False)
+    engine.run_backtest_on_arrays(timestamps[:bars], ohlc[:bars], config=config, atr_features=atr_features,
+                                  checkpoints=session)
+    return session.last_snapshot
+
+
+def run_id_for(params: Dict) -> str:
+    """参数组合的稳定编号 (用于断点续跑)"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()[:12]
+
+
+# =====================================================================================
+# 剪枝
+# =====================================================================================
+class RunPruner:
+    """
+    单次回测的提前终止规则 (simulate_klines 每 check_every 根K线调用一次 check)
+      - max_drawdown: 运行中回撤达到该值
+      - min_equity_ratio: 权益跌破初始资金的该比例
+      - shared_bound: 主进程按已完成的最佳组合实时更新的回撤上限 (multiprocessing.Value)
+    回撤按检查点上的权益计算；从快照恢复时峰值由已记录的权益曲线初始化
+    """
+
+    def __init__(self, initial_balance, max_drawdown: Optional[float] = None,
+                 min_equity_ratio: Optional[float] = None, shared_bound=None, check_every: int = 60):
+        self.initial_balance = float(initial_balance)
+        self.max_drawdown = max_drawdown
+        self.min_equity_ratio = min_equity_ratio
+        self.shared_bound = shared_bound
+        self.check_every = max(int(check_every), 1)
+        self.peak: Optional[float] = None
+        self.reason: Optional[str] = None
+        self.pruned_at: Optional[int] = None
+
+    def check(self, bar_index: int, exchange) -> bool:
+        equity = float(exchange.get_equity())
+        if self.peak is None:
+            _, equities = exchange.equity_history.to_arrays()
+            self.peak = max(self.initial_balance, float(equities.max())) if len(equities) else self.initial_balance
+        self.peak = max(self.peak, equity)
+        drawdown = (self.peak - equity) / self.peak if self.peak > 0 else 0.0
+
+        bound = self.max_drawdown if self.max_drawdown is not None else math.inf
+        if self.shared_bound is not None:
+            bound = min(bound, self.shared_bound.value)
+        if drawdown >= bound:
+            self.reason = f"回撤 {drawdown:.2%} >= 上限 {bound:.2%}"
+        elif self.min_equity_ratio is not None and equity <= self.initial_balance * self.min_equity_ratio:
+            self.reason = f"权益 {equity:.2f} <= 初始资金的 {self.min_equity_ratio:.0%}"
+        else:
+            return False
+        self.pruned_at = bar_index
+        return True
+
+
+# =====================================================================================
+# 工作进程
+# =====================================================================================
+_worker_state: Dict[str, object] = {}
+
+
+def _build_base_config(base_params: Dict, numeric_backend: Optional[str]):
+    import backtest_kline_trajectory as engine
+    from numeric_backend import get_numeric_backend
+
+    backend = get_numeric_backend(numeric_backend) if numeric_backend else None
+    return engine.build_backtest_config(backend, **split_params(base_params, allow_data_keys=True))
+
+
+def _init_worker(base_params: Dict, numeric_backend: Optional[str], handle: SharedDatasetHandle,
+                 fork_snapshot: Optional[Dict] = None, prune: Optional[Dict] = None,
+                 snapshot_dir: Optional[str] = None):
+    """
+    工作进程初始化：编译基础配置并挂载共享内存数据集 (不复制数据)
+    fork_snapshot: 分叉模式的公共前缀快照；prune: RunPruner 参数；snapshot_dir: 逐轮减半的快照目录
+    """
+    import backtest_kline_trajectory as engine
+
+    timestamps, ohlc, features = attach_dataset(handle)
+    _worker_state.update(engine=engine, base_config=_build_base_config(base_params, numeric_backend),
+                         timestamps=timestamps, ohlc=ohlc, features=features, fork_snapshot=fork_snapshot,
+                         prune=prune, snapshot_dir=snapshot_dir)
+
+
+def _run_one(run_id: str, params: Dict, bars: Optional[int] = None) -> Dict:
+    """运行一个组合；bars 不为 None 时只跑前 bars 根K线 (逐轮减半的短窗口)"""
+    engine = _worker_state["engine"]
+    config = _worker_state["base_config"].replace(**split_params(params))
+    timestamps, ohlc = _worker_state["timestamps"], _worker_state["ohlc"]
+    if bars is not None:
+        timestamps, ohlc = timestamps[:bars], ohlc[:bars]
+    snapshot = _worker_state["fork_snapshot"]
+    started = time.perf_counter()
+    checkpoints = None
+    if snapshot is not None:
+        from checkpoint import ForkSession
+        checkpoints = ForkSession(snapshot, timestamps, ohlc)
+    elif _worker_state["snapshot_dir"] is not None:
+        from checkpoint import CheckpointSession, CheckpointStore
+        checkpoints = CheckpointSession(CheckpointStore(_worker_state["snapshot_dir"], keep=1), config,
+                                        timestamps, ohlc, verbose=False)
+    prune = _worker_state["prune"]
+    pruner = RunPruner(config.initial_balance, **prune) if prune else None
+    stats = engine.run_backtest_on_arrays(timestamps, ohlc, config=config, atr_features=_worker_state["features"],
+                                          checkpoints=checkpoints, pruner=pruner)
+    pruned = pruner is not None and pruner.reason is not None
+    end_bar = pruner.pruned_at if pruned else len(timestamps)
+    return {
+        "run_id": run_id,
+        "worker_pid": os.getpid(),
+        "bars": end_bar - (checkpoints.resumed_from if checkpoints is not None else 0),
+        "elapsed_seconds": time.perf_counter() - started,
+        "status": "pruned" if pruned else "completed",
+        "prune_reason": pruner.reason if pruned else "",
+        "end_bar": end_bar,
+        **{key: stats[key] for key in METRIC_COLUMNS},
+    }
+
+
+# =====================================================================================
+# 结果表
+# =====================================================================================
+class ResultTable:
+    """CSV 结果表：每完成一个组合追加一行并 flush，已完成的 run_id 在续跑时跳过"""
+
+    def __init__(self, path: Union[str, Path], param_keys: List[str], extra_columns: Iterable[str] = ()):
+        self.path = Path(path)
+        self.param_keys = list(param_keys)
+        self.columns = list(RUN_COLUMNS) + list(extra_columns) + self.param_keys + list(METRIC_COLUMNS)
+        self.completed = set()
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with self.path.open(newline="") as f:
+                reader = csv.DictReader(f)
+                if reader.fieldnames != self.columns:
+                    raise ValueError(f"结果表 {self.path} 的列与本次扫描参数不一致，无法续跑")
+                self.completed = {row["run_id"] for row in reader}
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("w", newline="") as f:
+                csv.writer(f).writerow(self.columns)
+
+    def append(self, params: Dict, result: Dict):
+        row = dict(result)
+        row.update(params)
+        with self.path.open("a", newline="") as f:
+            csv.writer(f).writerow([row.get(column, "") for column in self.columns])
+        self.completed.add(result["run_id"])
+
+    def read(self):
+        """读取结果表为 DataFrame"""
+        import pandas as pd
+        return pd.read_csv(self.path)
+
+
+# =====================================================================================
+# 扫描
+# =====================================================================================
+class SweepRunner:
+    """进程池参数扫描"""
+
+    def __init__(self, params: Union[Dict[str, Iterable], List[Dict]], out_path: Union[str, Path],
+                 workers: Optional[int] = None, base_params: Optional[Dict] = None,
+                 numeric_backend: Optional[str] = "float64", data: Optional[tuple] = None,
+                 use_cache: bool = True, verbose: bool = True, fork_at: Optional[Union[int, str]] = None,
+                 prune_drawdown: Optional[float] = None, prune_min_equity_ratio: Optional[float] = None,
+                 prune_relative_drawdown: Optional[float] = None, prune_check_every: int = 60,
+                 halving_windows: Optional[Iterable[Union[int, float]]] = None, halving_keep: float = 0.5,
+                 rank_by: str = "final_equity"):
+        """
+        剪枝参数:
+          prune_drawdown: 运行中回撤上限；prune_min_equity_ratio: 权益下限 (初始资金的比例)
+          prune_relative_drawdown: 回撤超过已完成最佳组合 (按 rank_by) 最大回撤的该倍数时终止
+          halving_windows: 逐轮减半的前缀窗口 (小数为数据比例，整数为K线数)，最后一轮总是全量数据
+          halving_keep: 每轮晋级的比例；rank_by: 排名指标 (爆仓的组合总是排在最后)
+        """
+        if rank_by not in RANK_METRICS:
+            raise ValueError(f"不支持的排名指标: {rank_by} (可选: {', '.join(RANK_METRICS)})")
+        if halving_windows and fork_at is not None:
+            raise ValueError("逐轮减半不能与分叉模式同时使用")
+        if not 0 < halving_keep <= 1:
+            raise ValueError("halving_keep 需要在 (0, 1] 之间")
+        self.runs = expand_grid(params) if isinstance(params, dict) else [dict(p) for p in params]
+        for run in self.runs:
+            split_params(run)  # 提前校验参数
+            if fork_at is not None:
+                check_fork_params(run)
+        param_keys: List[str] = []
+        for run in self.runs:
+            for key in run:
+                if key not in param_keys:
+                    param_keys.append(key)
+        self.prune_drawdown = prune_drawdown
+        self.prune_min_equity_ratio = prune_min_equity_ratio
+        self.prune_relative_drawdown = prune_relative_drawdown
+        self.prune_check_every = prune_check_every
+        self.halving_windows = list(halving_windows or [])
+        self.halving_keep = halving_keep
+        self.rank_by = rank_by
+        self.pruning = bool(self.halving_windows) or any(
+            value is not None for value in (prune_drawdown, prune_min_equity_ratio, prune_relative_drawdown))
+        self.table = ResultTable(out_path, param_keys, PRUNE_COLUMNS if self.pruning else ())
+        self.prune_log_path = self.table.path.with_name(self.table.path.stem + ".prune.jsonl")
+        self.prune_stats = {"early_stopped": 0, "demoted": 0, "bars_simulated": 0, "bars_saved": 0}
+        self._shared_bound = None
+        self._best_result: Optional[Dict] = None
+        self._done = 0
+        self.total_bars = 0
+        self.workers = workers or os.cpu_count() or 1
+        self.base_params = dict(base_params or {})
+        self.numeric_backend = numeric_backend
+        self.data = None if data is None else (np.asarray(data[0]), np.asarray(data[1]))
+        self.use_cache = use_cache
+        self.verbose = verbose
+        self.fork_at = fork_at
+        self.worker_stats: Dict[int, Dict[str, float]] = {}
+
+    def run_id(self, params: Dict) -> str:
+        """分叉模式下编号包含分叉点，不同分叉点的结果不会互相当作已完成"""
+        return run_id_for(params if self.fork_at is None else dict(params, __fork_at__=self.fork_at))
+
+    def pending(self) -> List[tuple]:
+        pending = []
+        for params in self.runs:
+            run_id = self.run_id(params)
+            if run_id not in self.table.completed:
+                pending.append((run_id, params))
+        return pending
+
+    def run(self) -> Dict:
+        pending = self.pending()
+        skipped = len(self.runs) - len(pending)
+        if self.verbose:
+            print(f"🚀 参数扫描: 共 {len(self.runs)} 组，已完成 {skipped} 组，待运行 {len(pending)} 组，"
+                  f"{self.workers} 个工作进程")
+        started = time.perf_counter()
+        self._done = 0
+        if pending:
+            with SharedDatasetManager() as shared, tempfile.TemporaryDirectory(prefix="sweep_halving_") as tmp:
+                handle = self._publish_dataset(shared)
+                initargs = (self.base_params, self.numeric_backend, handle, self._fork_snapshot(handle),
+                            self._prune_args(), tmp if self.halving_windows else None)
+                self._run_pool(pending, initargs, started)
+        return self.summary(self._done, skipped, time.perf_counter() - started)
+
+    def _publish_dataset(self, shared: SharedDatasetManager) -> SharedDatasetHandle:
+        """主进程加载一次数据 (及需要的 ATR 特征) 并发布到共享内存"""
+        import backtest_kline_trajectory as engine
+
+        base_config = _build_base_config(self.base_params, self.numeric_backend)
+        if self.data is None:
+            loaded = engine.load_backtest_data(self.use_cache, base_config)
+            if loaded is None:
+                raise RuntimeError("扫描数据加载失败")
+            self.data = (loaded[0], loaded[1])
+        timestamps, ohlc = self.data
+        self.total_bars = len(timestamps)
+
+        features = {}
+        if base_config.atr_source == "feature_store":
+            periods = {base_config.atr_period}
+            periods.update(int(run["atr.atr_period"]) for run in self.runs if "atr.atr_period" in run)
+            features = {period: engine.load_atr_features(timestamps, ohlc, period) for period in sorted(periods)}
+        handle = shared.publish(timestamps, ohlc, features)
+        if self.verbose:
+            print(f"📦 数据集已发布到共享内存: {len(timestamps)} 根K线，{handle.nbytes / 1e6:.1f} MB")
+        return handle
+
+    def _fork_snapshot(self, handle: SharedDatasetHandle) -> Optional[Dict]:
+        """分叉模式：公共前缀在主进程用基础参数只模拟一次"""
+        if self.fork_at is None:
+            return None
+        timestamps, ohlc, features = attach_dataset(handle)
+        bars = resolve_fork_index(timestamps, self.fork_at)
+        started = time.perf_counter()
+        snapshot = simulate_prefix(_build_base_config(self.base_params, self.numeric_backend),
+                                   timestamps, ohlc, bars, features)
+        if self.verbose:
+            print(f"🌿 公共前缀 {bars} 根K线已模拟一次 ({time.perf_counter() - started:.1f}s)，"
+                  f"各分叉只模拟剩余的 {len(timestamps) - bars} 根")
+        return snapshot
+
+    def _prune_args(self) -> Optional[Dict]:
+        """工作进程的 RunPruner 参数 (相对回撤上限通过共享内存中的 double 实时下发)"""
+        if self.prune_relative_drawdown is not None:
+            self._shared_bound = multiprocessing.Value("d", math.inf)
+        if self.prune_drawdown is None and self.prune_min_equity_ratio is None and self._shared_bound is None:
+            return None
+        return {"max_drawdown": self.prune_drawdown, "min_equity_ratio": self.prune_min_equity_ratio,
+                "shared_bound": self._shared_bound, "check_every": self.prune_check_every}
+
+    def _run_pool(self, pending: List[tuple], initargs: tuple, started: float):
+        self._pending_total = len(pending)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)), initializer=_init_worker,
+                                 initargs=initargs) as pool:
+            if self.halving_windows:
+                self._successive_halving(pool, pending, started)
+            else:
+                self._run_batch(pool, pending, None, started, final=True)
+
+    def _run_batch(self, pool: ProcessPoolExecutor, jobs: List[tuple], bars: Optional[int], started: float,
+                   final: bool) -> List[tuple]:
+        """并行运行一批组合；提前终止的组合和最后一轮的结果写入结果表"""
+        futures = {pool.submit(_run_one, run_id, params, bars): params for run_id, params in jobs}
+        results = []
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                params = futures.pop(future)
+                result = future.result()
+                self._record_worker(result)
+                self.prune_stats["bars_simulated"] += result["bars"]
+                if result["status"] == "pruned":
+                    self.prune_stats["early_stopped"] += 1
+                    self._log_prune(params, result, "early_stop", self.total_bars - result["end_bar"])
+                    self._finish(params, result, started)
+                elif final:
+                    self._update_bound(result)
+                    self._finish(params, result, started)
+                results.append((result["run_id"], params, result))
+        return results
+
+    def _successive_halving(self, pool: ProcessPoolExecutor, pending: List[tuple], started: float):
+        """逐轮减半：短窗口排名靠前的组合才晋级到更长的窗口"""
+        windows = self._halving_bars()
+        candidates = list(pending)
+        for rung, bars in enumerate(windows):
+            final = rung == len(windows) - 1
+            results = self._run_batch(pool, candidates, None if final else bars, started, final)
+            if final:
+                return
+            survivors = sorted((item for item in results if item[2]["status"] == "completed"),
+                               key=lambda item: self._rank_key(item[2]), reverse=True)
+            keep = max(1, math.ceil(len(survivors) * self.halving_keep))
+            for position, (run_id, params, result) in enumerate(survivors[keep:], start=keep + 1):
+                result = dict(result, status="pruned",
+                              prune_reason=f"逐轮减半第 {rung + 1} 轮排名 {position}/{len(survivors)}")
+                self.prune_stats["demoted"] += 1
+                self._log_prune(params, result, "halving", self.total_bars - bars)
+                self._finish(params, result, started)
+            if self.verbose:
+                print(f"🪜 第 {rung + 1} 轮 ({bars} 根K线): {len(survivors)} 组中 {keep} 组晋级")
+            candidates = [(run_id, params) for run_id, params, _ in survivors[:keep]]
+
+    def _halving_bars(self) -> List[int]:
+        """窗口 -> 递增的K线数，最后一轮为全量数据"""
+        bars = set()
+        for window in self.halving_windows:
+            count = int(window * self.total_bars) if isinstance(window, float) else int(window)
+            if 0 < count < self.total_bars:
+                bars.add(count)
+        return sorted(bars) + [self.total_bars]
+
+    def _rank_key(self, result: Dict) -> tuple:
+        return (not result["liquidated"], result[self.rank_by])
+
+    def _update_bound(self, result: Dict):
+        """已完成的最佳组合更新后，收紧相对回撤上限"""
+        if self._shared_bound is None or result["liquidated"]:
+            return
+        if self._best_result is None or self._rank_key(result) > self._rank_key(self._best_result):
+            self._best_result = result
+            if result["max_drawdown"] > 0:
+                self._shared_bound.value = result["max_drawdown"] * self.prune_relative_drawdown
+
+    def _finish(self, params: Dict, result: Dict, started: float):
+        self.table.append(params, result)
+        self._done += 1
+        if self.verbose:
+            self._print_progress(self._done, self._pending_total, result, time.perf_counter() - started)
+
+    def _log_prune(self, params: Dict, result: Dict, stage: str, bars_saved: int):
+        """剪枝决定追加到 <结果表>.prune.jsonl"""
+        self.prune_stats["bars_saved"] += bars_saved
+        entry = {"run_id": result["run_id"], "stage": stage, "reason": result["prune_reason"],
+                 "end_bar": result["end_bar"], "bars_saved": bars_saved, "params": params}
+        with self.prune_log_path.open("a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        if self.verbose:
+            print(f"✂️ 剪枝 {result['run_id']} ({stage}): {result['prune_reason']}，节省 {bars_saved} 根K线")
+
+    def _record_worker(self, result: Dict):
+        stats = self.worker_stats.setdefault(result["worker_pid"], {"runs": 0, "bars": 0, "busy_seconds": 0.0})
+        stats["runs"] += 1
+        stats["bars"] += result["bars"]
+        stats["busy_seconds"] += result["elapsed_seconds"]
+
+    def _print_progress(self, done: int, total: int, result: Dict, elapsed: float):
+        runs_per_hour = done / elapsed * 3600 if elapsed > 0 else 0.0
+        marker = "✂️" if result.get("status") == "pruned" else "✅"
+        print(f"{marker} [{done}/{total}] {result['run_id']} 收益 {result['total_return']:.2%} "
+              f"回撤 {result['max_drawdown']:.2%} 交易 {result['total_trades']} | {runs_per_hour:.0f} runs/h")
+
+    def summary(self, done: int, skipped: int, elapsed: float) -> Dict:
+        workers = {
+            pid: {**stats, "bars_per_sec": stats["bars"] / stats["busy_seconds"] if stats["busy_seconds"] else 0.0}
+            for pid, stats in self.worker_stats.items()
+        }
+        summary = {
+            "completed": done,
+            "skipped": skipped,
+            "elapsed_seconds": elapsed,
+            "runs_per_hour": done / elapsed * 3600 if elapsed > 0 else 0.0,
+            "workers": workers,
+            "results_path": str(self.table.path),
+        }
+        if self.pruning:
+            stats = dict(self.prune_stats)
+            total = stats["bars_simulated"] + stats["bars_saved"]
+            stats["saved_fraction"] = stats["bars_saved"] / total if total else 0.0
+            stats["log_path"] = str(self.prune_log_path)
+            summary["pruning"] = stats
+        if self.verbose and done:
+            print(f"📊 扫描完成: {done} 组，用时 {elapsed:.1f}s，{summary['runs_per_hour']:.0f} runs/h")
+            for pid, stats in workers.items():
+                print(f"   - 进程 {pid}: {stats['runs']} 组，{stats['bars_per_sec']:,.0f} bars/sec")
+            if self.pruning:
+                stats = summary["pruning"]
+                print(f"✂️ 剪枝: 提前终止 {stats['early_stopped']} 组，逐轮淘汰 {stats['demoted']} 组，"
+                      f"模拟 {stats['bars_simulated']:,} 根K线，节省 {stats['bars_saved']:,} 根 "
+                      f"({stats['saved_fraction']:.1%})")
+        return summary
+
+
+def run_sweep(params: Union[Dict[str, Iterable], List[Dict]], out_path: Union[str, Path], **kwargs) -> Dict:
+    """运行参数扫描，返回吞吐汇总 (结果在 out_path 的 CSV 表中)"""
+    return SweepRunner(params, out_path, **kwargs).run()
+
+
+def run_forks(variants: Union[Dict[str, Iterable], List[Dict]], fork_at: Union[int, str],
+              out_path: Union[str, Path], **kwargs) -> Dict:
+    """公共前缀只模拟一次，各参数变体从分叉点开始并行模拟剩余K线"""
+    return SweepRunner(variants, out_path, fork_at=fork_at, **kwargs).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多核参数扫描")
+    parser.add_argument("--grid", help="参数网格 JSON，例如 '{\"leverage\": [50, 125]}'")
+    parser.add_argument("--params-file", help="参数字典列表 JSON 文件")
+    parser.add_argument("--base", default="{}", help="所有组合共用的基础参数 JSON (可包含 start_date/end_date)")
+    parser.add_argument("--out", default="sweep_results.csv", help="结果表 CSV 路径 (已存在时断点续跑)")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数 (默认 CPU 核数)")
+    parser.add_argument("--numeric-backend", default="float64", help="数值后端 (decimal / float64 / ticks)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用数据缓存")
+    parser.add_argument("--fork-at", help="分叉点 (日期如 2024-01-01，或K线序号)：之前用基础参数，之后用各组参数")
+    parser.add_argument("--prune-drawdown", type=float, help="运行中回撤达到该值时提前终止")
+    parser.add_argument("--prune-min-equity", type=float, help="权益跌破初始资金的该比例时提前终止")
+    parser.add_argument("--prune-relative-drawdown", type=float,
+                        help="回撤超过已完成最佳组合最大回撤的该倍数时提前终止")
+    parser.add_argument("--halving-windows", help="逐轮减半的窗口，逗号分隔 (小数为数据比例，整数为K线数)")
+    parser.add_argument("--halving-keep", type=float, default=0.5, help="每轮晋级的比例")
+    parser.add_argument("--rank-by", default="final_equity", choices=RANK_METRICS, help="排名指标")
+    args = parser.parse_args()
+
+    if args.params_file:
+        params = json.loads(Path(args.params_file).read_text())
+    elif args.grid:
+        params = json.loads(args.grid)
+    else:
+        parser.error("需要 --grid 或 --params-file")
+    fork_at = args.fork_at
+    if fork_at is not None and fork_at.isdigit():
+        fork_at = int(fork_at)
+    run_sweep(params, args.out, workers=args.workers, base_params=json.loads(args.base),
+              numeric_backend=args.numeric_backend, use_cache=not args.no_cache, fork_at=fork_at,
+              prune_drawdown=args.prune_drawdown, prune_min_equity_ratio=args.prune_min_equity,
+              prune_relative_drawdown=args.prune_relative_drawdown, halving_keep=args.halving_keep,
+              halving_windows=[float(w) if "." in w else int(w) for w in args.halving_windows.split(",")]
+              if args.halving_windows else None, rank_by=args.rank_by)
+
+
+if __name__ == "__main__":
+    main()
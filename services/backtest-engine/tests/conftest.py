@@ -0,0 +1,32 @@
+"""
+测试公共设施：把回测引擎目录加入 sys.path，并提供确定性的合成K线数据。
+"""
+
+import sys
+import pathlib
+
+import pytest
+
+ENGINE_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(ENGINE_DIR) not in sys.path:
+    sys.path.insert(0, str(ENGINE_DIR))
+
+
+def make_synthetic_klines(n: int = 2000, seed: int = 0, start_ts: int = 1577836800,
+                          start_price: float = 130.0, volatility: float = 0.002):
+    """生成随机游走的1分钟K线: 返回 (timestamps[int64 秒], ohlc[float64 N×4])"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n)))
+    ohlc = np.round(np.column_stack([open_, high, low, close]), 2)
+    timestamps = (start_ts + 60 * np.arange(n)).astype(np.int64)
+    return timestamps, ohlc
+
+
+@pytest.fixture
+def synthetic_klines():
+    return make_synthetic_klines
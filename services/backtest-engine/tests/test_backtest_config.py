@@ -0,0 +1,55 @@
+"""
+BacktestConfig 测试：编译后不可变、不修改全局配置，不同参数的回测可以在同一进程内并发运行。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+import backtest_kline_trajectory as engine
+from numeric_backend import get_numeric_backend
+
+
+def test_config_is_frozen_and_preconverted():
+    config = engine.build_backtest_config(get_numeric_backend("float64"), strategy={"spread": Decimal("0.003")})
+    assert config.spread == 0.003 and isinstance(config.spread, float)
+    assert config.leverage_num == float(engine.STRATEGY_CONFIG["leverage"])
+    assert engine.STRATEGY_CONFIG["spread"] == Decimal("0.004")  # 全局字典未被修改
+
+    with pytest.raises(AttributeError):
+        config.spread = 0.01
+    with pytest.raises(TypeError):
+        config.strategy["spread"] = 0.01
+
+    replaced = config.replace(strategy={"atr_threshold": Decimal("0.001")})
+    assert replaced.atr_threshold == 0.001 and config.atr_threshold == 0.3
+    assert replaced.num is config.num
+
+
+def test_exchange_and_strategy_read_injected_config():
+    config = engine.build_backtest_config(get_numeric_backend("decimal"), market={"maker_fee": Decimal("0.0001")})
+    exchange = engine.FastPerpetualExchange(config.initial_balance, config=config)
+    strategy = engine.FastPerpetualStrategy(exchange)
+    assert exchange.maker_fee == Decimal("0.0001")
+    assert strategy.config is config
+
+    with pytest.raises(ValueError):
+        engine.FastPerpetualExchange(1000, get_numeric_backend("float64"), config=config)
+
+
+def test_concurrent_runs_with_different_configs(synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1500, seed=3)
+    base = engine.build_backtest_config(get_numeric_backend("float64"))
+    configs = [base.replace(strategy={"atr_threshold": Decimal(threshold), "spread": Decimal(spread)})
+               for threshold, spread in (("0.001", "0.004"), ("0.30", "0.002"), ("0.002", "0.003"))]
+    snapshot = dict(engine.STRATEGY_CONFIG)
+
+    sequential = [engine.run_backtest_on_arrays(timestamps, ohlc, config=config) for config in configs]
+    with ThreadPoolExecutor(max_workers=len(configs)) as pool:
+        concurrent = list(pool.map(lambda config: engine.run_backtest_on_arrays(timestamps, ohlc, config=config),
+                                   configs))
+
+    assert concurrent == sequential
+    assert len({result["total_trades"] for result in sequential}) > 1  # 参数确实生效
+    assert engine.STRATEGY_CONFIG == snapshot
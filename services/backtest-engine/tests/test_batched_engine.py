@@ -0,0 +1,56 @@
+"""
+锁步批量引擎测试：每一组参数的结果与标量引擎单独回测逐位一致 (包括爆仓)。
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+import backtest_kline_trajectory as engine
+from batched_engine import BatchedBacktest
+from numeric_backend import get_numeric_backend
+
+LANES = [
+    {"spread": Decimal(spread), "leverage": leverage, "position_size_ratio": Decimal(ratio), "atr_threshold": Decimal(threshold)}
+    for spread, leverage, ratio, threshold in [
+        ("0.002", 125, "0.02", "0.3"),
+        ("0.004", 20, "0.3", "0.3"),
+        ("0.001", 125, "0.3", "0.001"),   # 高波动切换到平衡仓位
+        ("0.004", 125, "0.3", "0.3"),
+    ]
+]
+
+
+@pytest.mark.parametrize("backend", ["float64", "ticks"])
+def test_lanes_match_scalar_engine(synthetic_klines, backend):
+    timestamps, ohlc = synthetic_klines(2000, seed=3, volatility=0.01)
+    base = engine.build_backtest_config(get_numeric_backend(backend))
+
+    batch = BatchedBacktest(base, LANES, keep_equity_curve=True)
+    results = batch.run(timestamps, ohlc)
+    assert any(result["liquidated"] for result in results)
+    assert not all(result["liquidated"] for result in results)
+
+    equity_matrix = batch.equity_matrix()
+    assert equity_matrix.shape[1] == len(LANES)
+    for lane, (params, result) in enumerate(zip(LANES, results)):
+        config = base.replace(strategy=params)
+        expected = engine.run_backtest_on_arrays(timestamps, ohlc, config=config)
+        assert {key: result[key] for key in expected} == expected
+
+        exchange = engine.FastPerpetualExchange(config.initial_balance, config=config)
+        engine.simulate_klines(exchange, engine.FastPerpetualStrategy(exchange, config), timestamps, ohlc)
+        _, equities = exchange.equity_history.to_arrays()
+        curve = equity_matrix[:, lane]
+        np.testing.assert_array_equal(curve[~np.isnan(curve)], equities)
+
+
+def test_rejects_unsupported_configs():
+    base = engine.build_backtest_config(get_numeric_backend("float64"))
+    with pytest.raises(ValueError):
+        BatchedBacktest(base, [{"atr_period": 60}])
+    with pytest.raises(ValueError):
+        BatchedBacktest(base.replace(strategy={"enable_position_stop_loss": True}), [{}])
+    with pytest.raises(ValueError):
+        BatchedBacktest(engine.build_backtest_config(get_numeric_backend("decimal")), [{}])
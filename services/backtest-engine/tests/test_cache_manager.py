@@ -0,0 +1,86 @@
+"""
+缓存目录管理测试：按 LRU 淘汰各类缓存、跳过正在写入的条目、多进程并发写同一个键。
+"""
+
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from cache_manager import CacheManager, FileLock
+from kline_cache import KlineCache
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _age(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_gc_evicts_least_recently_used_across_kinds(synthetic_klines, tmp_path):
+    timestamps, ohlc = synthetic_klines(1000)
+    klines = KlineCache(tmp_path)
+    old_entry = klines.save("old", timestamps, ohlc)
+    new_entry = klines.save("new", timestamps, ohlc)
+    feature = tmp_path / "features_abc_atr30.npy"
+    np.save(feature, np.zeros(1000))
+    (tmp_path / "results").mkdir()
+    result = tmp_path / "results" / "r.pkl"
+    result.write_bytes(b"x" * 100)
+    stale_temp = tmp_path / ".features_x.npy.abc.tmp"
+    stale_temp.write_bytes(b"x")
+    for path, age in ((old_entry, 400), (feature, 300), (result, 200), (new_entry, 100), (stale_temp, 7200)):
+        _age(path, age)
+
+    manager = CacheManager(tmp_path)
+    stats = manager.stats()
+    assert stats["kinds"]["klines"]["entries"] == 2 and stats["kinds"]["results"]["bytes"] == 100
+    new_bytes = next(size for _, size, _, path, _ in manager.entries() if path == new_entry)
+
+    removed = manager.gc(max_bytes=new_bytes + 100, keep=[result])
+    assert [(kind, path) for kind, path, _ in removed] == [("temp", stale_temp), ("klines", old_entry),
+                                                           ("features", feature)]
+    assert klines.load("new") is not None and klines.load("old") is None and result.exists()
+
+
+def test_gc_skips_entry_being_written(synthetic_klines, tmp_path):
+    timestamps, ohlc = synthetic_klines(100)
+    KlineCache(tmp_path).save("busy", timestamps, ohlc)
+    manager = CacheManager(tmp_path)
+    with manager.lock("klines-busy"):
+        assert not FileLock(tmp_path / ".locks" / "klines-busy.lock").acquire(blocking=False)
+        assert manager.gc(max_bytes=0) == []
+    assert len(manager.gc(max_bytes=0)) == 1
+
+
+def _write_repeatedly(cache_dir, seed):
+    from conftest import make_synthetic_klines
+
+    timestamps, ohlc = make_synthetic_klines(500 + seed, seed=seed)
+    cache = KlineCache(cache_dir)
+    for _ in range(10):
+        cache.save("shared", timestamps, ohlc, seed=seed)
+        loaded = cache.load("shared")
+        assert loaded is not None and len(loaded[0]) == 500 + loaded[2]["seed"]
+
+
+def test_concurrent_writers_never_leave_partial_entries(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_write_repeatedly, args=(tmp_path, seed)) for seed in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+
+    timestamps, ohlc, manifest = KlineCache(tmp_path).load("shared")
+    assert len(timestamps) == 500 + manifest["seed"]
+    assert [path.name for path in (tmp_path / "klines").iterdir()] == ["shared"]
+
+    output = subprocess.run([sys.executable, "cache_manager.py", "stats", "--json", "--cache-dir", str(tmp_path)],
+                            cwd=ENGINE_DIR, capture_output=True, text=True, check=True).stdout
+    assert json.loads(output)["kinds"]["klines"]["entries"] == 1
@@ -0,0 +1,65 @@
+"""
+状态快照测试：更晚 end_date 的回测从快照恢复后与从头回测逐位一致；数据前缀变化或版本不符的快照不会被使用。
+"""
+
+import pickle
+
+import pytest
+
+import backtest_kline_trajectory as engine
+from checkpoint import CheckpointStore, config_key, open_checkpoint_session
+from numeric_backend import get_numeric_backend
+
+
+def _run(config, timestamps, ohlc):
+    exchange = engine.FastPerpetualExchange(config.initial_balance, config=config)
+    strategy = engine.FastPerpetualStrategy(exchange, config)
+    loop_state = engine.simulate_klines(exchange, strategy, timestamps, ohlc,
+                                        checkpoints=open_checkpoint_session(config, timestamps, ohlc, verbose=False))
+    return exchange, strategy, loop_state
+
+
+@pytest.mark.parametrize("engine_mode", ["bar", "event"])
+def test_resume_matches_full_run(tmp_path, synthetic_klines, engine_mode):
+    timestamps, ohlc = synthetic_klines(1500, seed=4, volatility=0.004)
+    base = engine.build_backtest_config(get_numeric_backend("float64"), backtest={"engine_mode": engine_mode})
+    reference, reference_strategy, _ = _run(base, timestamps, ohlc)
+
+    config = base.replace(backtest={"checkpoint_dir": str(tmp_path), "checkpoint_every": 400, "checkpoint_keep": 2})
+    _run(config.replace(backtest={"end_date": "2020-01-01"}), timestamps[:1000], ohlc[:1000])
+    store = CheckpointStore(tmp_path)
+    saved = [int(path.stem) for path in store.list(config_key(config))]
+    assert saved[0] == 1000 and len(saved) <= 2  # 事件模式可能整段跳过某个保存点
+
+    exchange, strategy, loop_state = _run(config.replace(backtest={"end_date": "2020-01-02"}), timestamps, ohlc)
+    assert loop_state["engine_stats"]["resumed_from_bar"] == 1000
+    assert exchange.get_equity() == reference.get_equity()
+    assert exchange.trade_history == reference.trade_history
+    assert exchange.equity_history == reference.equity_history
+    assert exchange.pair_stats.get_state() == reference.pair_stats.get_state()
+    assert exchange.order_book.get_state() == reference.order_book.get_state()
+    assert strategy.last_order_time == reference_strategy.last_order_time
+
+
+def test_invalid_snapshots_are_ignored(tmp_path, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(600, seed=8)
+    config = engine.build_backtest_config(get_numeric_backend("float64"),
+                                          backtest={"checkpoint_dir": str(tmp_path), "checkpoint_every": 0})
+    _run(config, timestamps[:400], ohlc[:400])
+    key = config_key(config)
+    assert key != config_key(config.replace(strategy={"spread": 0.003}))
+
+    # 历史数据被修正后，前缀指纹不一致，必须从头回测
+    changed = ohlc.copy()
+    changed[10, 3] += 0.01
+    assert _run(config, timestamps, changed)[2]["engine_stats"]["resumed_from_bar"] == 0
+
+    # 旧版本的快照不会被加载
+    store = CheckpointStore(tmp_path)
+    for path in store.list(key):
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        snapshot["version"] = -1
+        with open(path, "wb") as f:
+            pickle.dump(snapshot, f)
+    assert store.latest_valid(key, timestamps, ohlc) is None
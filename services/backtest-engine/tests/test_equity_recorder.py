@@ -0,0 +1,60 @@
+"""
+权益记录器测试：各采样模式、批量与逐个记录一致、超过内存阈值后落盘。
+"""
+
+import numpy as np
+import pytest
+
+from equity_recorder import EquityRecorder
+
+
+def _series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = 1577836800 + np.arange(n, dtype=np.int64) * 3600
+    equities = 1000 + np.round(np.cumsum(rng.normal(0, 1, n) * (rng.random(n) < 0.3)), 2)
+    return timestamps, equities
+
+
+@pytest.mark.parametrize("mode", ["every_bar", "every_n", "on_change", "daily_ohlc"])
+def test_record_many_matches_record(mode):
+    timestamps, equities = _series()
+    scalar = EquityRecorder(mode=mode, every_n=7, max_memory_points=8)
+    bulk = EquityRecorder(mode=mode, every_n=7, max_memory_points=8)
+    for ts, eq in zip(timestamps.tolist(), equities.tolist()):
+        scalar.record(ts, eq)
+    for start in range(0, len(timestamps), 93):
+        bulk.record_many(timestamps[start:start + 93], equities[start:start + 93])
+
+    assert scalar == bulk
+    assert bulk.spilled_points > 0
+    # 序列终点总是最后一次观测 (日线模式的时间戳为当日零点)
+    assert list(bulk)[-1][1] == float(equities[-1])
+    scalar.close()
+    bulk.close()
+
+
+def test_sampling_modes():
+    timestamps, equities = _series(48)
+    every_bar = EquityRecorder()
+    every_bar.record_many(timestamps, equities)
+    assert list(every_bar) == list(zip(timestamps.tolist(), equities.tolist()))
+    assert every_bar[3] == (int(timestamps[3]), float(equities[3]))
+
+    every_n = EquityRecorder(mode="every_n", every_n=10)
+    every_n.record_many(timestamps, equities)
+    assert [ts for ts, _ in every_n] == timestamps[[0, 10, 20, 30, 40, 47]].tolist()
+
+    on_change = EquityRecorder(mode="on_change")
+    on_change.record_many(timestamps, equities)
+    recorded = [eq for _, eq in on_change]
+    assert all(a != b for a, b in zip(recorded[:-2], recorded[1:-1]))
+
+    daily = EquityRecorder(mode="daily_ohlc")
+    daily.record_many(timestamps, equities)
+    days, ohlc = daily.daily_ohlc()
+    assert len(days) == 2
+    first_day = equities[:24]
+    assert ohlc[0].tolist() == [first_day[0], first_day.max(), first_day.min(), first_day[-1]]
+
+    with pytest.raises(ValueError):
+        EquityRecorder(mode="hourly")
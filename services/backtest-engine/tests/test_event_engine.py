@@ -0,0 +1,65 @@
+"""
+事件驱动引擎测试：跳过静默K线后的结果必须与逐根循环逐位一致。
+"""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from event_engine import RangeExtremaIndex
+from numeric_backend import get_numeric_backend
+
+
+def test_range_extrema_index_matches_brute_force():
+    rng = np.random.default_rng(7)
+    highs = 100 + np.cumsum(rng.normal(0, 0.3, 1500))
+    lows = highs - rng.uniform(0, 0.5, 1500)
+    index = RangeExtremaIndex(highs, lows, block_size=16)
+
+    for _ in range(200):
+        start, end = sorted(rng.integers(0, 1500, 2))
+        if start == end:
+            continue
+        assert index.range_max(start, end) == highs[start:end].max()
+        assert index.range_min(start, end) == lows[start:end].min()
+
+    for _ in range(200):
+        start = int(rng.integers(0, 1500))
+        lower = lows[start] - rng.uniform(0, 5)
+        upper = highs[start] + rng.uniform(0, 5)
+        hits = np.nonzero((lows[start:] <= lower) | (highs[start:] >= upper))[0]
+        expected = start + int(hits[0]) if len(hits) else len(highs)
+        assert index.first_breach(start, lower, upper) == expected
+
+
+def _run(engine, timestamps, ohlc, backend, mode):
+    exchange = engine.FastPerpetualExchange(1000, get_numeric_backend(backend))
+    strategy = engine.FastPerpetualStrategy(exchange)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = engine.simulate_klines(exchange, strategy, timestamps, ohlc, engine_mode=mode)
+    return exchange, stats
+
+
+@pytest.mark.parametrize("backend", ["decimal", "float64"])
+def test_event_mode_is_bit_identical_to_bar_mode(synthetic_klines, backend):
+    import backtest_kline_trajectory as engine
+
+    timestamps, ohlc = synthetic_klines(2000, seed=0, volatility=0.003)
+    bar_exchange, bar_stats = _run(engine, timestamps, ohlc, backend, "bar")
+    event_exchange, event_stats = _run(engine, timestamps, ohlc, backend, "event")
+
+    assert event_exchange.equity_history == bar_exchange.equity_history
+    assert event_exchange.trade_history == bar_exchange.trade_history
+    assert event_exchange.balance == bar_exchange.balance
+    assert event_stats["liquidated"] == bar_stats["liquidated"]
+    assert event_stats["engine_stats"]["skipped_bars"] > 0
+
+
+def test_unknown_engine_mode_rejected(synthetic_klines):
+    import backtest_kline_trajectory as engine
+
+    timestamps, ohlc = synthetic_klines(10)
+    with pytest.raises(ValueError):
+        _run(engine, timestamps, ohlc, "float64", "tick")
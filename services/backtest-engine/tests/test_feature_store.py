@@ -0,0 +1,59 @@
+"""
+特征库测试：预计算 ATR 与 VolatilityMonitor 逐根结果逐位一致，并能按时间段切片。
+"""
+
+import contextlib
+import io
+
+import numpy as np
+
+from feature_store import FeatureStore, dataset_fingerprint, slice_atr, true_range_prefix
+from numeric_backend import get_numeric_backend
+
+
+def _monitor_atrs(engine, timestamps, ohlc, period):
+    monitor = engine.VolatilityMonitor(period)
+    return monitor.update_many(timestamps, ohlc[:, 1], ohlc[:, 2], ohlc[:, 3])
+
+
+def test_precomputed_atr_matches_monitor_and_slices(synthetic_klines, tmp_path):
+    import backtest_kline_trajectory as engine
+
+    timestamps, ohlc = synthetic_klines(1500, seed=2)
+    store = FeatureStore(tmp_path)
+    fingerprint = dataset_fingerprint(timestamps, ohlc)
+    features = store.precompute(fingerprint, ohlc, [30, 120])
+
+    for period in (30, 120):
+        np.testing.assert_array_equal(features[period][0], _monitor_atrs(engine, timestamps, ohlc, period))
+
+    # 时间段切片：ATR 从切片起点重新累计，与单独对切片逐根计算一致
+    prefix = true_range_prefix(ohlc)
+    np.testing.assert_array_equal(slice_atr(prefix, 400, 900, 120),
+                                  _monitor_atrs(engine, timestamps[400:900], ohlc[400:900], 120))
+
+    # 新实例从磁盘读取
+    reloaded = FeatureStore(tmp_path)
+    np.testing.assert_array_equal(reloaded.atr_features(fingerprint, ohlc, 30), features[30])
+    assert reloaded.stats["disk_hits"] == 1
+
+
+def test_feature_store_source_matches_monitor_backtest(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    monkeypatch.setitem(engine.STRATEGY_CONFIG, "atr_threshold", 0.004)
+    timestamps, ohlc = synthetic_klines(1500, seed=1, volatility=0.003)
+
+    results = {}
+    for source in ("monitor", "feature_store"):
+        monkeypatch.setitem(engine.ATR_CONFIG, "atr_source", source)
+        exchange = engine.FastPerpetualExchange(1000, get_numeric_backend("float64"))
+        strategy = engine.FastPerpetualStrategy(exchange)
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.simulate_klines(exchange, strategy, timestamps, ohlc, engine_mode="bar")
+        results[source] = exchange
+
+    assert isinstance(results["feature_store"].volatility_monitor, engine.PrecomputedVolatilityMonitor)
+    assert results["feature_store"].trade_history == results["monitor"].trade_history
+    assert results["feature_store"].equity_history == results["monitor"].equity_history
@@ -0,0 +1,20 @@
+"""
+导入预算测试：命令行和 API 入口冷启动时不导入 pandas/matplotlib/tqdm/h5py，且导入时间在预算之内。
+"""
+
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "benchmarks"))
+from bench_import_time import measure  # noqa: E402
+
+IMPORT_BUDGET_SECONDS = 2.0  # CI 机器上的宽松上限；benchmarks/bench_import_time.py 使用更严格的预算
+
+
+@pytest.mark.parametrize("entry", ["cli", "api"])
+def test_cold_import_is_light(entry):
+    run = measure(entry)
+    assert run["heavy"] == []
+    assert run["seconds"] < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,108 @@
+"""
+列式预处理缓存测试：往返一致、只读内存映射、零拷贝切片、旧版 pickle 缓存转换。
+"""
+
+import contextlib
+import io
+import json
+import pickle
+
+import numpy as np
+
+from kline_cache import KlineCache
+from numeric_backend import get_numeric_backend
+
+
+def test_round_trip_is_read_only_memmap(synthetic_klines, tmp_path):
+    timestamps, ohlc = synthetic_klines(500)
+    cache = KlineCache(tmp_path)
+    cache.save("key", timestamps, ohlc, start_date="2020-01-01")
+
+    loaded_ts, loaded_ohlc, manifest = cache.load("key")
+    np.testing.assert_array_equal(loaded_ts, timestamps)
+    np.testing.assert_array_equal(loaded_ohlc, ohlc)
+    assert loaded_ts.dtype == np.int64 and loaded_ohlc.dtype == np.float64
+    assert not loaded_ohlc.flags.writeable
+    assert manifest["rows"] == 500 and manifest["start_date"] == "2020-01-01"
+    assert manifest["last_timestamp"] == int(timestamps[-1])
+
+
+def test_missing_or_mismatched_entry_is_rejected(synthetic_klines, tmp_path):
+    timestamps, ohlc = synthetic_klines(100)
+    cache = KlineCache(tmp_path)
+    assert cache.load("missing") is None
+
+    entry_dir = cache.save("key", timestamps, ohlc)
+    manifest = json.loads((entry_dir / "manifest.json").read_text())
+    manifest["rows"] = 99
+    (entry_dir / "manifest.json").write_text(json.dumps(manifest))
+    assert cache.load("key") is None
+
+    (entry_dir / "manifest.json").write_text("{")
+    assert cache.load("key") is None
+
+
+def test_engine_slices_are_views_and_backtest_matches(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    timestamps, ohlc = synthetic_klines(3000, seed=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.save_preprocessed_data("full", (timestamps, ohlc, len(timestamps), "2020-01-01", "2020-01-03"))
+        full_ts, full_ohlc, rows, start_str, end_str = engine.load_preprocessed_data("full")
+        config = engine.build_backtest_config()
+        sub_ts, sub_ohlc, _, _, _ = engine.extract_time_range_from_cache(
+            full_ts, full_ohlc, "2020-01-01", "2020-01-02", config)
+    assert (rows, start_str, end_str) == (3000, "2020-01-01", "2020-01-03")
+    assert np.shares_memory(sub_ohlc, full_ohlc)
+
+    results = []
+    for ts, bars in ((full_ts, full_ohlc), (timestamps, ohlc)):
+        exchange = engine.FastPerpetualExchange(1000, get_numeric_backend("float64"))
+        strategy = engine.FastPerpetualStrategy(exchange)
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.simulate_klines(exchange, strategy, ts, bars, engine_mode="bar")
+        results.append((exchange.trade_history, exchange.equity_history))
+    assert results[0] == results[1]
+
+
+def test_legacy_pickle_cache_is_converted(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    timestamps, ohlc = synthetic_klines(200)
+    data = (timestamps, ohlc, 200, "2020-01-01", "2020-01-01")
+    with (tmp_path / "preprocessed_data_old.pkl").open("wb") as f:
+        pickle.dump(data, f)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert engine.load_preprocessed_data("old")[2] == 200
+    assert engine.get_kline_cache(tmp_path).exists("old")
+
+
+def test_full_cache_serves_time_range_without_h5(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    h5_calls = []
+
+    def load_h5(use_cache, config):
+        h5_calls.append(config)
+        return None
+
+    monkeypatch.setattr(engine, "_load_h5_time_range", load_h5)
+    timestamps, ohlc = synthetic_klines(3000)
+    config = engine.build_backtest_config(backtest={"data_file_path": "data.h5", "start_date": "2020-01-02",
+                                                    "end_date": "2020-01-02 12:00:00"})
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert engine.load_backtest_data_staged(True, config) == (None, "h5")  # 没有全量缓存
+        engine.save_full_dataset_cache((timestamps, ohlc, 3000, "2020-01-01", "2020-01-03"), "data.h5")
+        loaded, stage = engine.load_backtest_data_staged(True, config)
+        # 缓存中没有的时间段回退到 H5
+        missing = config.replace(backtest={**config.backtest, "start_date": "2021-01-01", "end_date": None})
+        assert engine.load_backtest_data_staged(True, missing) == (None, "h5")
+
+    assert stage == "full_cache" and len(h5_calls) == 2
+    start, end = engine.utc_timestamp("2020-01-02"), engine.utc_timestamp("2020-01-02 12:00:00")
+    np.testing.assert_array_equal(loaded[0], timestamps[(timestamps >= start) & (timestamps <= end)])
+    assert loaded[3:] == ("2020-01-02", "2020-01-02")
@@ -0,0 +1,91 @@
+"""
+数据源指纹测试：H5 只追加时增量扩展全量缓存，内容被改写时缓存失效。
+"""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from kline_source import read_rows, read_time_range, source_fingerprint
+
+h5py = pytest.importorskip("h5py")
+
+
+def _write_h5(path, timestamps, ohlc):
+    rows = np.column_stack([timestamps * 1000, ohlc, np.ones(len(timestamps))]).astype(np.float64)
+    with h5py.File(path, "w") as f:
+        f.create_dataset("kline_data", data=rows, chunks=True)
+
+
+def _bump_mtime(path):
+    import os
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_appended_rows_extend_full_cache(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    timestamps, ohlc = synthetic_klines(3000, seed=4)
+    data_file = str(tmp_path / "klines.h5")
+    _write_h5(data_file, timestamps[:2000], ohlc[:2000])
+    first = source_fingerprint(data_file)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.save_full_dataset_cache((*read_rows(data_file, 0), 2000, "2020-01-01", "2020-01-02"), data_file)
+        range_key = engine.get_data_cache_key(data_file, "2020-01-01", "2020-01-02")
+        assert engine.load_full_dataset_cache(data_file)[2] == 2000
+
+        _write_h5(data_file, timestamps, ohlc)
+        _bump_mtime(data_file)
+        extended = engine.load_full_dataset_cache(data_file)
+
+    np.testing.assert_array_equal(extended[0], timestamps)
+    np.testing.assert_array_equal(extended[1], ohlc)
+    assert extended[2:] == (3000, "2020-01-01", "2020-01-03")
+    manifest = engine.get_kline_cache(tmp_path).manifest(engine.get_data_cache_key(data_file))
+    assert manifest["rows"] == 3000 and manifest["source"]["rows"] == 3000
+    assert manifest["source"]["tail_hash"] != first["tail_hash"]
+    # 时间段缓存键包含内容指纹，追加后旧的时间段缓存不再命中
+    assert engine.get_data_cache_key(data_file, "2020-01-01", "2020-01-02") != range_key
+
+
+def test_rewritten_history_invalidates_full_cache(synthetic_klines, tmp_path, monkeypatch):
+    import backtest_kline_trajectory as engine
+
+    monkeypatch.setattr(engine, "CACHE_DIR", tmp_path)
+    timestamps, ohlc = synthetic_klines(3000, seed=5)
+    data_file = str(tmp_path / "klines.h5")
+    _write_h5(data_file, timestamps[:2000], ohlc[:2000])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.save_full_dataset_cache((*read_rows(data_file, 0), 2000, "2020-01-01", "2020-01-02"), data_file)
+        changed = ohlc.copy()
+        changed[1990, 3] += 1.0  # 修正了已缓存部分的一根K线
+        _write_h5(data_file, timestamps, changed)
+        _bump_mtime(data_file)
+        assert engine.load_full_dataset_cache(data_file) is None
+
+    assert not engine.get_kline_cache(tmp_path).exists(engine.get_data_cache_key(data_file))
+
+
+def test_read_time_range_matches_mask_filter(synthetic_klines, tmp_path):
+    timestamps, ohlc = synthetic_klines(5000, seed=6)
+    data_file = tmp_path / "klines.h5"
+    _write_h5(data_file, timestamps, ohlc)
+
+    for start, end in ((None, None), (timestamps[100], timestamps[4321]), (timestamps[0] - 30, timestamps[10] + 30),
+                       (timestamps[-1] + 60, None)):
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps < end
+        loaded_ts, loaded_ohlc = read_time_range(data_file, start, end, chunk_rows=700)
+        np.testing.assert_array_equal(loaded_ts, timestamps[mask])
+        np.testing.assert_array_equal(loaded_ohlc, ohlc[mask])
+        assert loaded_ts.dtype == np.int64 and loaded_ohlc.flags.c_contiguous
@@ -0,0 +1,39 @@
+"""
+数值后端测试：float64 / ticks 快速模式与 Decimal 参考模式的一致性。
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from numeric_backend import get_numeric_backend
+
+
+def test_backend_conversions():
+    decimal_backend = get_numeric_backend("decimal")
+    assert decimal_backend.num(0.1) == Decimal("0.1")
+    assert decimal_backend.num(Decimal("0.004")) == Decimal("0.004")
+
+    float_backend = get_numeric_backend("float64")
+    assert float_backend.num(Decimal("0.0002")) == 0.0002
+
+    tick_backend = get_numeric_backend("ticks", tick_size="0.01")
+    assert tick_backend.price(2001.23456) == 2001.23
+    assert tick_backend.to_ticks(2001.235001) == 200124
+
+    with pytest.raises(ValueError):
+        get_numeric_backend("float16")
+
+
+def test_float64_matches_decimal_reference(synthetic_klines):
+    import backtest_kline_trajectory as engine
+
+    timestamps, ohlc = synthetic_klines(2000, seed=3)
+    report = engine.compare_numeric_backends(timestamps, ohlc, ("decimal", "float64", "ticks"))
+
+    float_dev = report["deviations"]["float64"]
+    assert float_dev["trade_count_diff"] == 0
+    assert float_dev["final_equity_rel"] < 1e-9
+    assert float_dev["total_fees_abs"] < 1e-9
+    assert report["deviations"]["decimal"]["final_equity_abs"] == 0
+    assert set(report["results"]) == {"decimal", "float64", "ticks"}
@@ -0,0 +1,55 @@
+"""
+订单簿测试：成交顺序与原 "清空-排序-过滤" 实现一致，支持增量改单/撤单。
+"""
+
+import random
+
+from order_book import OrderBook
+
+
+def _reference_match(orders, high, low):
+    """原实现: 买单按价格从高到低稳定排序，卖单从低到高，逐个过滤"""
+    buys = sorted([o for o in orders if o[0] in ("buy_long", "buy_short")], key=lambda o: o[2], reverse=True)
+    sells = sorted([o for o in orders if o[0] not in ("buy_long", "buy_short")], key=lambda o: o[2])
+    filled = [(p, a, s) for s, a, p in buys if low <= p] + [(p, a, s) for s, a, p in sells if high >= p]
+    remaining = [o for o in buys if not low <= o[2]] + [o for o in sells if not high >= o[2]]
+    return filled, remaining
+
+
+def test_match_order_equals_reference():
+    rng = random.Random(11)
+    sides = ["buy_long", "buy_short", "sell_long", "sell_short"]
+    for _ in range(200):
+        orders = [(rng.choice(sides), rng.randint(1, 5), rng.randint(95, 105)) for _ in range(rng.randint(0, 12))]
+        book = OrderBook()
+        book.replace(orders)
+        low, high = rng.randint(93, 101), rng.randint(99, 107)
+
+        expected, remaining = _reference_match(orders, high, low)
+        assert book.match(high, low) == expected
+        assert len(book) == len(remaining)
+        assert book.match(high, low) == []
+
+
+def test_amend_and_cancel():
+    book = OrderBook()
+    first = book.add("buy_long", 1, 100)
+    second = book.add("buy_short", 2, 100)
+    ask = book.add("sell_long", 1, 105)
+    assert book.best_bid() == 100 and book.best_ask() == 105
+
+    # 只改数量保留排队位置
+    assert book.amend(first, amount=3)
+    assert book.side_orders(is_bid=True) == [(100, 3, "buy_long"), (100, 2, "buy_short")]
+
+    # 改价格重新排队
+    assert book.amend(first, price=101)
+    assert book.side_orders(is_bid=True) == [(101, 3, "buy_long"), (100, 2, "buy_short")]
+    assert book.amend(first, price=100)
+    assert book.side_orders(is_bid=True) == [(100, 2, "buy_short"), (100, 3, "buy_long")]
+
+    assert book.cancel(second)
+    assert not book.cancel(second)
+    assert book.cancel(ask) and book.best_ask() is None
+    assert book.match(high=200, low=100) == [(100, 3, "buy_long")]
+    assert len(book) == 0 and book.best_bid() is None
@@ -0,0 +1,54 @@
+"""
+进度事件测试：JSON-lines 事件从 start 到 done 单调推进，包含权益/仓位/成交笔数，且不影响回测结果。
+"""
+
+import io
+import json
+
+import backtest_kline_trajectory as engine
+from numeric_backend import get_numeric_backend
+from progress import JsonLinesProgress, ReporterProgress
+
+
+def _simulate(config, timestamps, ohlc, progress=None):
+    exchange = engine.FastPerpetualExchange(config.initial_balance, config=config)
+    strategy = engine.FastPerpetualStrategy(exchange, config)
+    engine.simulate_klines(exchange, strategy, timestamps, ohlc, progress)
+    return exchange
+
+
+def test_jsonl_events_track_the_loop(synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1500, seed=6)
+    config = engine.build_backtest_config(get_numeric_backend("float64"))
+    stream = io.StringIO()
+    exchange = _simulate(config, timestamps, ohlc, JsonLinesProgress(stream, interval=0))
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert events[0]["event"] == "start" and events[-1]["event"] == "done"
+    assert events[-1]["status"] == "completed" and events[-1]["bars_done"] == len(timestamps)
+    assert events[-1]["trades"] == len(exchange.trade_history)
+    assert events[-1]["equity"] == float(exchange.get_equity())
+    progress = [event for event in events if event["event"] == "progress"]
+    assert progress and all(event["type"] == "backtest_progress" for event in events)
+    assert [event["bars_done"] for event in progress] == sorted(event["bars_done"] for event in progress)
+    assert {"bars_per_sec", "eta_seconds", "long_position", "short_position"} <= set(progress[0])
+
+    reference = _simulate(config, timestamps, ohlc)
+    assert exchange.trade_history == reference.trade_history
+    assert exchange.equity_history == reference.equity_history
+
+
+def test_reporter_progress_maps_into_range(synthetic_klines):
+    class Reporter:
+        def __init__(self):
+            self.calls = []
+
+        def update(self, current, total, message):
+            self.calls.append(current)
+
+    timestamps, ohlc = synthetic_klines(600, seed=1)
+    reporter = Reporter()
+    _simulate(engine.build_backtest_config(get_numeric_backend("float64")), timestamps, ohlc,
+              ReporterProgress(reporter, low=30, high=90, interval=0))
+    assert reporter.calls and all(30 <= current <= 90 for current in reporter.calls)
+    assert reporter.calls[-1] == 90
@@ -0,0 +1,66 @@
+"""
+回测结果缓存测试：缓存键只随影响结果的配置和数据变化，超过上限按 LRU 淘汰，重复回测直接返回缓存结果。
+"""
+
+import asyncio
+import os
+
+import backtest_kline_trajectory as engine
+from numeric_backend import get_numeric_backend
+from result_cache import ResultCache, engine_sources, result_cache_key
+
+
+def test_cache_key_and_lru_eviction(tmp_path):
+    config = engine.build_backtest_config(get_numeric_backend("float64"))
+    key = result_cache_key(config, "data-a")
+    assert key == result_cache_key(config.replace(backtest={"plot_equity_curve": False}), "data-a")
+    assert key != result_cache_key(config.replace(strategy={"leverage": 50}), "data-a")
+    assert key != result_cache_key(config, "data-b")
+
+    cache = ResultCache(tmp_path, max_bytes=2500)
+    payload = {"blob": "x" * 1000}
+    for index, name in enumerate(["a", "b"]):
+        path = cache.put(name, payload)
+        os.utime(path, (index, index))
+    assert cache.get("a") == payload      # 命中后 a 成为最近使用
+    assert cache.get("missing") is None
+    cache.put("c", payload)               # 超过上限，淘汰最久未使用的 b
+    assert cache.get("b") is None and cache.get("c") == payload
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (2, 2, 1, 2)
+    assert stats["bytes"] <= 2500 and stats["hit_rate"] == 0.5
+
+
+def test_engine_version_covers_imported_modules():
+    sources = engine_sources()
+    # 检查点 (顶层导入) 和事件引擎 (函数内导入) 都决定回测结果
+    assert {"backtest_kline_trajectory.py", "checkpoint.py", "event_engine.py", "order_book.py"} <= set(sources)
+    assert "sweep_runner.py" not in sources  # 引擎不导入的本地模块不影响结果
+
+
+def test_repeated_backtest_served_from_cache(tmp_path, monkeypatch, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(800, seed=2)
+    calls = []
+
+    def load(use_cache=True, config=None):
+        calls.append(1)
+        return (timestamps, ohlc, len(timestamps), "2020-01-01", "2020-01-02"), "h5"
+
+    monkeypatch.setattr(engine, "load_backtest_data_staged", load)
+    monkeypatch.setattr(engine, "simulate_klines", _counting(engine.simulate_klines, calls))
+    config = engine.build_backtest_config(get_numeric_backend("float64"), backtest={"plot_equity_curve": False})
+    cache = ResultCache(tmp_path)
+
+    first = asyncio.run(engine.run_fast_perpetual_backtest(config=config, result_cache=cache))
+    second = asyncio.run(engine.run_fast_perpetual_backtest(config=config, result_cache=cache))
+    assert second == first
+    assert len(calls) == 3  # 两次加载数据，只模拟一次
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def _counting(function, calls):
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        return function(*args, **kwargs)
+    return wrapper
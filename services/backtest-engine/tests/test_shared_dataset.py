@@ -0,0 +1,44 @@
+"""
+共享内存数据集测试：工作进程挂载到的数组与发布的数据一致且只读，管理器关闭后共享内存段被删除。
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from shared_dataset import SharedDatasetManager, attach, attach_dataset, detach
+
+
+def _worker_checksum(handle):
+    timestamps, ohlc, features = attach_dataset(handle)
+    assert attach(handle)["ohlc"] is ohlc  # 同一进程重复挂载不复制
+    return int(timestamps.sum()), float(ohlc.sum()), sorted(features), ohlc.flags.writeable
+
+
+def test_workers_attach_published_arrays(synthetic_klines):
+    timestamps, ohlc = synthetic_klines(500, seed=2)
+    features = {60: np.vstack([ohlc[:, 3], ohlc[:, 3] / 2])}
+
+    with SharedDatasetManager() as shared:
+        handle = shared.publish(timestamps, ohlc, features)
+        assert shared.publish(timestamps, ohlc, features) is handle  # 同一指纹只发布一次
+        assert handle.nbytes == timestamps.nbytes + ohlc.nbytes + features[60].nbytes
+
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(_worker_checksum, [handle] * 2))
+        assert results == [(int(timestamps.sum()), float(ohlc.sum()), [60], False)] * 2
+
+        local_ts, local_ohlc, local_features = attach_dataset(handle)
+        np.testing.assert_array_equal(local_ohlc, ohlc)
+        np.testing.assert_array_equal(local_features[60], features[60])
+        with pytest.raises(ValueError):
+            local_ohlc[0, 0] = 0.0
+        del local_ts, local_ohlc, local_features
+        detach(handle.fingerprint)
+        segment_names = [spec.segment for spec in handle.arrays.values()]
+
+    for name in segment_names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,137 @@
+"""
+参数扫描测试：进程池结果与单进程回测一致，结果表支持断点续跑，分叉回测从公共前缀快照继续。
+"""
+
+import csv
+import json
+from decimal import Decimal
+
+import pytest
+
+import backtest_kline_trajectory as engine
+from checkpoint import ForkSession
+from numeric_backend import get_numeric_backend
+from sweep_runner import (SweepRunner, check_fork_params, expand_grid, resolve_fork_index, run_forks, run_id_for,
+                          simulate_prefix, split_params)
+
+
+def test_expand_grid_and_split_params():
+    runs = expand_grid({"leverage": [50, 125], "atr.atr_period": [60]})
+    assert runs == [{"leverage": 50, "atr.atr_period": 60}, {"leverage": 125, "atr.atr_period": 60}]
+    assert split_params(runs[0]) == {"strategy": {"leverage": 50}, "atr": {"atr_period": 60}}
+    assert run_id_for({"a": 1, "b": 2}) == run_id_for({"b": 2, "a": 1})
+
+    with pytest.raises(ValueError):
+        split_params({"start_date": "2020-01-01"})
+    assert split_params({"start_date": "2020-01-01"}, allow_data_keys=True) == {"backtest": {"start_date": "2020-01-01"}}
+    with pytest.raises(ValueError):
+        split_params({"unknown.key": 1})
+
+
+def test_sweep_matches_single_runs_and_resumes(tmp_path, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1200, seed=5)
+    grid = {"atr_threshold": [Decimal("0.001"), Decimal("0.30")], "spread": [Decimal("0.002"), Decimal("0.004")]}
+    out = tmp_path / "sweep.csv"
+
+    summary = SweepRunner(grid, out, workers=2, data=(timestamps, ohlc), verbose=False).run()
+    assert summary["completed"] == 4 and summary["skipped"] == 0
+    assert sum(stats["runs"] for stats in summary["workers"].values()) == 4
+    assert all(stats["bars_per_sec"] > 0 for stats in summary["workers"].values())
+
+    with out.open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4
+    base = engine.build_backtest_config(get_numeric_backend("float64"))
+    for row in rows:
+        params = {"atr_threshold": Decimal(row["atr_threshold"]), "spread": Decimal(row["spread"])}
+        expected = engine.run_backtest_on_arrays(timestamps, ohlc, config=base.replace(**split_params(params)))
+        assert row["run_id"] == run_id_for(params)
+        assert float(row["final_equity"]) == pytest.approx(expected["final_equity"], rel=1e-12)
+        assert int(row["total_trades"]) == expected["total_trades"]
+
+    # 模拟中断：删掉最后一行后重新运行，只补跑缺失的组合
+    with out.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows[:-1])
+    resumed = SweepRunner(grid, out, workers=2, data=(timestamps, ohlc), verbose=False).run()
+    assert resumed["completed"] == 1 and resumed["skipped"] == 3
+    with out.open(newline="") as f:
+        assert sorted(row["run_id"] for row in csv.DictReader(f)) == sorted(row["run_id"] for row in rows)
+
+
+def test_forks_share_simulated_prefix(tmp_path, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1500, seed=3, volatility=0.003)
+    variants = [{}, {"spread": Decimal("0.004"), "leverage": 50}]
+    out = tmp_path / "forks.csv"
+
+    summary = run_forks(variants, 700, out, workers=2, data=(timestamps, ohlc), verbose=False)
+    assert summary["completed"] == 2
+    with out.open(newline="") as f:
+        rows = {row["spread"]: row for row in csv.DictReader(f)}
+    assert all(int(row["bars"]) == 800 for row in rows.values())
+
+    # 不改参数的分叉与从头回测一致
+    base = engine.build_backtest_config(get_numeric_backend("float64"))
+    full = engine.run_backtest_on_arrays(timestamps, ohlc, config=base)
+    assert float(rows[""]["final_equity"]) == pytest.approx(full["final_equity"], rel=1e-12)
+    assert int(rows[""]["total_trades"]) == full["total_trades"]
+
+    # 改参数的分叉 = 前缀用基础参数 + 分叉后用新参数
+    snapshot = simulate_prefix(base, timestamps, ohlc, 700)
+    expected = engine.run_backtest_on_arrays(timestamps, ohlc, config=base.replace(**split_params(variants[1])),
+                                             checkpoints=ForkSession(snapshot, timestamps, ohlc))
+    assert float(rows["0.004"]["final_equity"]) == pytest.approx(expected["final_equity"], rel=1e-12)
+    assert expected["final_equity"] != full["final_equity"]
+
+    assert resolve_fork_index(timestamps, "2020-01-01T10:00:00") == 600
+    with pytest.raises(ValueError):
+        check_fork_params({"atr.atr_period": 60})
+
+
+def test_early_stop_prunes_deep_drawdowns(tmp_path, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1200, seed=3, volatility=0.003)
+    grid = {"leverage": [20, 125], "spread": [Decimal("0.002"), Decimal("0.004")]}
+    out = tmp_path / "sweep.csv"
+
+    summary = SweepRunner(grid, out, workers=2, data=(timestamps, ohlc), verbose=False,
+                          prune_drawdown=0.002, prune_check_every=20).run()
+    pruning = summary["pruning"]
+    assert summary["completed"] == 4 and pruning["early_stopped"] > 0
+    assert pruning["bars_saved"] > 0 and 0 < pruning["saved_fraction"] < 1
+
+    with out.open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    pruned = [row for row in rows if row["status"] == "pruned"]
+    assert len(pruned) == pruning["early_stopped"]
+    assert all(int(row["bars"]) < len(timestamps) and row["prune_reason"] for row in pruned)
+    with open(pruning["log_path"]) as f:
+        log = [json.loads(line) for line in f]
+    assert sorted(entry["run_id"] for entry in log) == sorted(row["run_id"] for row in pruned)
+    assert sum(entry["bars_saved"] for entry in log) == pruning["bars_saved"]
+
+
+def test_successive_halving_promotes_top_fraction(tmp_path, synthetic_klines):
+    timestamps, ohlc = synthetic_klines(1200, seed=5)
+    grid = {"atr_threshold": [Decimal("0.001"), Decimal("0.30")], "spread": [Decimal("0.002"), Decimal("0.004")]}
+    out = tmp_path / "halving.csv"
+
+    summary = SweepRunner(grid, out, workers=2, data=(timestamps, ohlc), verbose=False,
+                          halving_windows=[0.25], halving_keep=0.5).run()
+    assert summary["completed"] == 4 and summary["pruning"]["demoted"] == 2
+    assert summary["pruning"]["bars_saved"] == 2 * (1200 - 300)
+
+    with out.open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    promoted = [row for row in rows if row["status"] == "completed"]
+    assert len(promoted) == 2
+    base = engine.build_backtest_config(get_numeric_backend("float64"))
+    for row in promoted:
+        # 晋级的组合从第一轮的快照继续，结果与从头全量回测一致
+        assert int(row["bars"]) == 900
+        params = {"atr_threshold": Decimal(row["atr_threshold"]), "spread": Decimal(row["spread"])}
+        expected = engine.run_backtest_on_arrays(timestamps, ohlc, config=base.replace(**split_params(params)))
+        assert float(row["final_equity"]) == pytest.approx(expected["final_equity"], rel=1e-12)
+
+    with pytest.raises(ValueError):
+        SweepRunner(grid, out, data=(timestamps, ohlc), halving_windows=[0.5], fork_at=100)
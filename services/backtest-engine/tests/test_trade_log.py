@@ -0,0 +1,104 @@
+"""
+列式成交记录测试：自动扩容、字典视图兼容、.npy 导出往返。
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from trade_log import TradeLog
+
+
+def _fill(log, n):
+    sides = ["buy_long", "sell_short", "sell_long", "buy_short"]
+    for k in range(n):
+        log.append(1577836800 + k * 60, sides[k % 4], Decimal("0.5"), Decimal("130.25") + k,
+                   Decimal("0.013"), Decimal(k) / 10, 125)
+
+
+def test_growth_and_dict_view():
+    log = TradeLog(capacity=2)
+    assert not log and len(log) == 0
+    _fill(log, 9)
+
+    assert len(log) == 9
+    assert log[0] == {"timestamp": 1577836800, "side": "buy_long", "amount": 0.5, "price": 130.25,
+                      "fee": 0.013, "pnl": 0.0, "leverage": 125}
+    assert log[-1]["side"] == "buy_long" and log[-1]["price"] == 138.25
+    assert [t["side"] for t in log[-3:]] == ["sell_long", "buy_short", "buy_long"]
+    assert [t["timestamp"] for t in log] == list(log.column("timestamp"))
+    assert list(log.sides[:2]) == ["buy_long", "sell_short"]
+    with pytest.raises(IndexError):
+        log[9]
+
+
+def test_npy_roundtrip_and_arrow(tmp_path):
+    log = TradeLog()
+    _fill(log, 5)
+    loaded = TradeLog.load_npy(log.save_npy(tmp_path / "trades.npy"))
+    assert loaded == log
+    assert loaded.to_records() == log.to_records()
+    assert np.shares_memory(log.array, log._data)
+
+    pa = pytest.importorskip("pyarrow")
+    table = log.to_arrow()
+    assert isinstance(table, pa.Table)
+    assert table.column("side").to_pylist() == [t["side"] for t in log]
+
+
+def _reference_pairs(trades):
+    """原实现: 运行结束后用 list.pop(0) 扫描成交记录配对"""
+    long_lots, short_lots, profitable, total = [], [], 0, 0
+    for trade in trades:
+        side, price, amount = trade["side"].upper(), trade["price"], trade["amount"]
+        if side == "BUY_LONG":
+            long_lots.append((price, amount))
+        elif side == "SELL_LONG" and long_lots:
+            open_price, open_amount = long_lots.pop(0)
+            profitable += (price - open_price) * min(amount, open_amount) > 0
+            total += 1
+        elif side == "SELL_SHORT":
+            short_lots.append((price, amount))
+        elif side == "BUY_SHORT" and short_lots:
+            open_price, open_amount = short_lots.pop(0)
+            profitable += (open_price - price) * min(amount, open_amount) > 0
+            total += 1
+    return profitable, total
+
+
+def test_online_pair_stats_match_post_run_scan(synthetic_klines):
+    import contextlib
+    import io
+
+    import backtest_kline_trajectory as engine
+    from numeric_backend import get_numeric_backend
+
+    timestamps, ohlc = synthetic_klines(2000, seed=3, volatility=0.003)
+    exchange = engine.FastPerpetualExchange(1000, get_numeric_backend("decimal"))
+    strategy = engine.FastPerpetualStrategy(exchange)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.simulate_klines(exchange, strategy, timestamps, ohlc)
+
+    stats = exchange.pair_stats
+    assert stats.total_pairs > 0
+    assert (stats.profitable_pairs, stats.total_pairs) == _reference_pairs(exchange.trade_history)
+    assert stats.avg_holding_hours > 0
+    assert stats.profit_factor > 0
+
+
+def test_pair_stats_profit_factor_and_holding_time():
+    from trade_log import FifoPairStats
+
+    stats = FifoPairStats()
+    stats.on_fill("buy_long", 1.0, 100.0, 0)
+    stats.on_fill("buy_long", 1.0, 110.0, 3600)
+    stats.on_fill("sell_long", 1.0, 105.0, 7200)    # +5, 持仓2小时
+    stats.on_fill("sell_long", 1.0, 108.0, 10800)   # -2, 持仓2小时
+    stats.on_fill("buy_short", 1.0, 90.0, 10800)    # 没有空头开仓，不配对
+
+    assert (stats.profitable_pairs, stats.total_pairs) == (1, 2)
+    assert stats.win_rate == 0.5
+    assert stats.profit_factor == 2.5
+    assert stats.avg_holding_hours == 2.0
+    assert stats.open_lots == 0
@@ -0,0 +1,78 @@
+"""
+VolatilityMonitor 测试：环形缓冲区 ATR 与原窗口重算结果一致，批量更新与逐根更新逐位一致。
+"""
+
+import numpy as np
+
+from backtest_kline_trajectory import VolatilityMonitor
+
+
+def _bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = (2000 + np.cumsum(rng.normal(0, 2, n))).round(2)
+    highs = (closes + rng.uniform(0, 3, n)).round(2)
+    lows = (closes - rng.uniform(0, 3, n)).round(2)
+    return np.arange(n, dtype=np.int64) * 60, highs, lows, closes
+
+
+def _naive_atr(highs, lows, closes, period):
+    true_ranges = [max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]), abs(lows[i] - closes[i - 1]))
+                   for i in range(max(1, len(closes) - period), len(closes))]
+    return sum(true_ranges) / len(true_ranges)
+
+
+def test_ring_buffer_atr_matches_window_recompute():
+    timestamps, highs, lows, closes = _bars(500)
+    monitor = VolatilityMonitor(atr_period=50)
+    assert monitor.get_current_atr_percentage() == 0.0
+
+    for k in range(len(closes)):
+        monitor.update_price(timestamps[k], highs[k], lows[k], closes[k])
+        if k >= 1:
+            expected = _naive_atr(highs[:k + 1], lows[:k + 1], closes[:k + 1], 50)
+            assert abs(monitor.current_atr - expected) <= 1e-9 * expected
+
+    assert len(monitor.atr_values) == VolatilityMonitor.ATR_HISTORY_SIZE
+    assert monitor.atr_values[-1] == monitor.current_atr
+    assert monitor.get_current_atr_percentage() == monitor.current_atr / closes[-1] * 100
+
+
+def test_update_many_is_bit_identical_to_update_price():
+    timestamps, highs, lows, closes = _bars(1200, seed=1)
+    scalar, bulk = VolatilityMonitor(atr_period=120), VolatilityMonitor(atr_period=120)
+
+    for k in range(len(closes)):
+        scalar.update_price(timestamps[k], highs[k], lows[k], closes[k])
+    for start, end in [(0, 1), (1, 70), (70, 71), (71, 600), (600, 1200)]:
+        preview = bulk.preview_atr(highs[start:end], lows[start:end], closes[start:end])
+        atrs = bulk.update_many(timestamps[start:end], highs[start:end], lows[start:end], closes[start:end])
+        np.testing.assert_array_equal(preview, atrs)
+
+    assert bulk.current_atr == scalar.current_atr
+    assert bulk.atr_values == scalar.atr_values
+    assert bulk._tr_sum == scalar._tr_sum
+
+
+def test_volatility_snapshot_matches_monitor_and_counts_reads():
+    import backtest_kline_trajectory as engine
+    from numeric_backend import get_numeric_backend
+
+    timestamps, highs, lows, closes = _bars(200, seed=3)
+    exchange = engine.FastPerpetualExchange(1000, get_numeric_backend("decimal"))
+    assert exchange.get_volatility_info() == {"level": "NORMAL", "atr_percentage": 0.0, "should_reduce_exposure": False}
+
+    for k in range(len(closes)):
+        exchange.update_volatility_monitor(timestamps[k], highs[k], lows[k], closes[k])
+    monitor = exchange.volatility_monitor
+    state = exchange.get_volatility_state()
+    assert state.level == monitor.get_volatility_level()
+    assert state.atr_percentage == monitor.get_current_atr_percentage()
+    assert state.should_reduce_exposure == monitor.should_reduce_exposure()
+    assert state.atr_ratio == exchange.num.num(monitor.current_atr / monitor.current_close)
+
+    strategy = engine.FastPerpetualStrategy(exchange)
+    for _ in range(5):
+        strategy.get_current_atr()
+    stats = exchange.get_volatility_stats()
+    assert stats["snapshot_builds"] == len(closes) + 1
+    assert stats["snapshot_reads"] == 7
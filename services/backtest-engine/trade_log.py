@@ -0,0 +1,213 @@
+"""
+列式成交记录 - 用可增长的 NumPy 结构化数组代替 "每笔成交一个 Decimal 字典"
+
+高频配置会产生数百万笔成交，字典列表要占用数 GB 内存，胜率/返佣/可视化等后处理也很慢。
+TradeLog 按列存储成交，容量不够时倍增；同时保留 "字典列表" 的读取方式 (下标、切片、遍历)，
+原有的 trades_for_visualization / calculate_monthly_rebates_from_trades 无需修改即可使用。
+"""
+
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+# 成交方向编码 (uint8)
+TRADE_SIDES = ("buy_long", "sell_short", "sell_long", "buy_short")
+SIDE_CODES: Dict[str, int] = {side: code for code, side in enumerate(TRADE_SIDES)}
+
+TRADE_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("side", np.uint8),
+    ("amount", np.float64),
+    ("price", np.float64),
+    ("fee", np.float64),
+    ("pnl", np.float64),
+    ("leverage", np.int16),
+])
+
+
+class TradeLog:
+    """可增长的列式成交记录，读取时表现为字典列表"""
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty(max(int(capacity), 1), dtype=TRADE_DTYPE)
+        self._size = 0
+
+    # ------------------ 写入 ------------------
+    def append(self, timestamp: int, side: str, amount, price, fee, pnl, leverage: int):
+        if self._size == len(self._data):
+            self._grow(2 * len(self._data))
+        self._data[self._size] = (timestamp, SIDE_CODES[side], amount, price, fee, pnl, leverage)
+        self._size += 1
+
+    def _grow(self, capacity: int):
+        data = np.empty(capacity, dtype=TRADE_DTYPE)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def clear(self):
+        self._size = 0
+
+    # ------------------ 列式访问 ------------------
+    @property
+    def array(self) -> np.ndarray:
+        """已记录成交的结构化数组视图 (零拷贝)"""
+        return self._data[:self._size]
+
+    def column(self, name: str) -> np.ndarray:
+        return self.array[name]
+
+    @property
+    def sides(self) -> np.ndarray:
+        """成交方向字符串数组"""
+        return np.asarray(TRADE_SIDES, dtype=object)[self.array["side"]]
+
+    # ------------------ 兼容字典列表 ------------------
+    def __len__(self) -> int:
+        return self._size
+
+    def _record(self, row) -> dict:
+        return {
+            "timestamp": int(row["timestamp"]),
+            "side": TRADE_SIDES[row["side"]],
+            "amount": float(row["amount"]),
+            "price": float(row["price"]),
+            "fee": float(row["fee"]),
+            "pnl": float(row["pnl"]),
+            "leverage": int(row["leverage"]),
+        }
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict, List[dict]]:
+        if isinstance(index, slice):
+            return [self._record(row) for row in self.array[index]]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("trade index out of range")
+        return self._record(self._data[index])
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self.array:
+            yield self._record(row)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TradeLog):
+            return np.array_equal(self.array, other.array)
+        if isinstance(other, list):
+            return self.to_records() == other
+        return NotImplemented
+
+    def to_records(self) -> List[dict]:
+        return list(self)
+
+    # ------------------ 导出 ------------------
+    def save_npy(self, path: Union[str, Path]) -> Path:
+        """保存为 .npy (直接写出底层缓冲区，不复制)"""
+        path = Path(path)
+        np.save(path, self.array)
+        return path
+
+    @classmethod
+    def load_npy(cls, path: Union[str, Path]) -> "TradeLog":
+        data = np.load(path)
+        log = cls(capacity=len(data))
+        log._data[:len(data)] = data
+        log._size = len(data)
+        return log
+
+    # ------------------ 快照 ------------------
+    def get_state(self) -> np.ndarray:
+        return self.array.copy()
+
+    def set_state(self, state: np.ndarray):
+        self._data = np.empty(max(2 * len(state), 1024), dtype=TRADE_DTYPE)
+        self._data[:len(state)] = state
+        self._size = len(state)
+
+    def to_arrow(self):
+        """导出为 pyarrow.Table (可选依赖；结构化数组的列是跨步的，这里按列复制一次)"""
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("导出 Arrow 需要安装 pyarrow") from e
+        data = self.array
+        columns = {name: np.ascontiguousarray(data[name]) for name in TRADE_DTYPE.names if name != "side"}
+        columns["side"] = pa.DictionaryArray.from_arrays(np.ascontiguousarray(data["side"]).astype(np.int8),
+                                                         list(TRADE_SIDES))
+        return pa.table({name: columns[name] for name in TRADE_DTYPE.names})
+
+
+class FifoPairStats:
+    """
+    成交时在线配对开平仓 (FIFO)，实时累计胜率、盈亏因子和持仓时间
+
+    配对规则与原来运行结束后的两遍扫描一致：每笔平仓与最早一笔同方向开仓配成一对，
+    盈亏 = 价差 × min(平仓量, 开仓量)。开仓批次用 deque 保存，出队 O(1)。
+    """
+
+    def __init__(self):
+        self._long_lots: deque = deque()   # (price, amount, timestamp)
+        self._short_lots: deque = deque()
+        self.total_pairs = 0
+        self.profitable_pairs = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.total_holding_seconds = 0
+
+    def on_fill(self, side: str, amount, price, timestamp: int):
+        if side == "buy_long":
+            self._long_lots.append((price, amount, timestamp))
+        elif side == "sell_short":
+            self._short_lots.append((price, amount, timestamp))
+        elif side == "sell_long":
+            if self._long_lots:
+                open_price, open_amount, open_time = self._long_lots.popleft()
+                self._close_pair((price - open_price) * min(amount, open_amount), timestamp - open_time)
+        elif side == "buy_short":
+            if self._short_lots:
+                open_price, open_amount, open_time = self._short_lots.popleft()
+                self._close_pair((open_price - price) * min(amount, open_amount), timestamp - open_time)
+
+    def _close_pair(self, pnl, holding_seconds: int):
+        self.total_pairs += 1
+        if pnl > 0:
+            self.profitable_pairs += 1
+            self.gross_profit += float(pnl)
+        elif pnl < 0:
+            self.gross_loss -= float(pnl)
+        self.total_holding_seconds += holding_seconds
+
+    def get_state(self) -> dict:
+        return {
+            "long_lots": list(self._long_lots),
+            "short_lots": list(self._short_lots),
+            "counters": (self.total_pairs, self.profitable_pairs, self.gross_profit, self.gross_loss,
+                         self.total_holding_seconds),
+        }
+
+    def set_state(self, state: dict):
+        self._long_lots = deque(state["long_lots"])
+        self._short_lots = deque(state["short_lots"])
+        (self.total_pairs, self.profitable_pairs, self.gross_profit, self.gross_loss,
+         self.total_holding_seconds) = state["counters"]
+
+    @property
+    def open_lots(self) -> int:
+        return len(self._long_lots) + len(self._short_lots)
+
+    @property
+    def win_rate(self) -> float:
+        return self.profitable_pairs / self.total_pairs if self.total_pairs else 0.0
+
+    @property
+    def profit_factor(self) -> float:
+        """总盈利 / 总亏损 (没有亏损对时: 有盈利为 inf，否则为 0)"""
+        if self.gross_loss > 0:
+            return self.gross_profit / self.gross_loss
+        return float("inf") if self.gross_profit > 0 else 0.0
+
+    @property
+    def avg_holding_hours(self) -> float:
+        """每个开平仓对的平均持仓时间 (小时)"""
+        return self.total_holding_seconds / self.total_pairs / 3600 if self.total_pairs else 0.0